@@ -1,17 +1,61 @@
+import bisect
+import collections
+import concurrent.futures
+import dataclasses
 import datetime
-import gzip
+import email.utils
+import functools
+import hashlib
 import json
 import logging
+import math
+import os
 import random
+import shutil
+import signal
+import socket
+import sys
+import tempfile
+import threading
+import time
+import zlib
 
 from pathlib import Path
 
 # https://www.tornadoweb.org/
 # python -m pip install --upgrade tornado
 import tornado.httpserver
+import tornado.httputil
 import tornado.gen
+import tornado.ioloop
+import tornado.iostream
+import tornado.netutil
+import tornado.process
+import tornado.util
 import tornado.web
 
+# Optional content encodings used when the modules are installed
+# python -m pip install brotli zstandard
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
 # Silly f-string support
 # Fixed in Python 3.12, HURRAY!
 NL = "\n"
@@ -24,36 +68,1875 @@ FOOTBALL_SVG = Path(f"{Path(__file__).parent}/football.svg").read_text()
 # Help file content
 HELP = Path(f"{Path(__file__).parent}/help.txt").read_text()
 
+# Help file content with each line prepended with a comment mark for /help
+HELP_COMMENTED = "".join([f"# {line}{NL}" for line in HELP.strip().split(NL)]) + NL
+
+# Fill pattern used with generating content: [a-zA-Z0-9 ]
+DEFAULT_FILL_PATTERN = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789 "
+
+# Maximum generated content length allowed unless set otherwise, 10MiB
+MAX_CONTENT_LENGTH = 10485760
+
+# Byte budget of the generated content cache unless set otherwise, 64MiB
+CONTENT_CACHE_SIZE = 67108864
+
+# gzip compression level unless set otherwise (zlib's default)
+GZIP_LEVEL = 6
+
+# gzip compression strategy used unless ?gzip_strategy= says otherwise
+GZIP_STRATEGY = "default"
+
+# gzip compression strategies allowed by name
+# https://docs.python.org/3/library/zlib.html#zlib.compressobj
+GZIP_STRATEGIES = {
+    "default": zlib.Z_DEFAULT_STRATEGY,
+    "filtered": zlib.Z_FILTERED,
+    "huffman": zlib.Z_HUFFMAN_ONLY,
+    "rle": zlib.Z_RLE,
+    "fixed": zlib.Z_FIXED,
+}
+
+# brotli quality used for the `br' content encoding (0 to 11)
+BROTLI_QUALITY = 4
+
+# zstd level used for the `zstd' content encoding (1 to 22)
+ZSTD_LEVEL = 3
+
+# Threads used for CPU heavy generation and compression unless set otherwise
+OFFLOAD_WORKERS = 4
+
+# Bytes of content generated or compressed on the event loop itself, larger
+# bodies are handed to the offload threads unless set otherwise
+OFFLOAD_THRESHOLD = 262144
+
+# Bytes generated per slice off the event loop, the GIL is released between
+# slices so the event loop keeps running while large content is generated
+OFFLOAD_SLICE_SIZE = 1048576
+
+# Seconds of ?rate= bytes allowed in one burst unless ?burst= is set, the
+# body is written in pieces of at most this many bytes to keep pacing smooth
+RATE_BURST_SECONDS = 0.1
+
+# Seconds a ?chunked&no_end_of_content connection is held open waiting for
+# the client to give up on the missing terminating chunk
+NO_END_OF_CONTENT_HOLD = 300
+
+# Bytes in each independently seeded block of ?seed= content
+SEED_BLOCK_SIZE = 65536
+
+# Byte ranges allowed in a single Range request header, more are ignored
+MAX_BYTE_RANGES = 32
+
+# Maximum bytes of a ?upload request body unless set otherwise
+MAX_UPLOAD_SIZE = 1 << 40
+
+# Histogram bucket upper bounds in seconds for the /metrics latencies
+METRICS_BUCKETS = (
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+# Seconds between each worker saving its metrics for /metrics with --workers
+METRICS_SNAPSHOT_INTERVAL = 1.0
+
+# Seconds between each IOLoop lag sample unless set otherwise
+LOOP_MONITOR_INTERVAL = 0.1
+
+# Seconds of IOLoop lag reported as a slow callback unless set otherwise
+SLOW_CALLBACK_THRESHOLD = 0.1
+
+# Number of the slowest callbacks kept for /metrics/loop
+SLOW_CALLBACKS_KEPT = 20
+
+# Number of distinct query strings kept parsed unless set otherwise
+OPTIONS_CACHE_SIZE = 1024
+
+# Size of each write when streaming a response body, 64KiB
+STREAM_CHUNK_SIZE = 65536
+
+# Largest ?chunk_size=, a whole chunk is held in memory while it is written
+MAX_CHUNK_SIZE = 16777216
+
+# Binary multipliers allowed as a suffix of a size value: ?content=5G
+SIZE_SUFFIXES = {
+    "K": 1024,
+    "M": 1024**2,
+    "G": 1024**3,
+    "T": 1024**4,
+}
+
+
+def gzip_compressobj(level: int = GZIP_LEVEL, strategy: str = GZIP_STRATEGY):
+    """Return a zlib compression object producing gzip formatted output
+
+    The gzip header written by zlib has a zero mtime so the compressed bytes
+    are repeatable for the same input.
+
+    level <int>: Compression level 0 (none) to 9 (best).
+
+    strategy <str>: A name in GZIP_STRATEGIES.
+    """
+    # A wbits value of 16 + MAX_WBITS writes a gzip header and trailer
+    return zlib.compressobj(
+        level,
+        zlib.DEFLATED,
+        16 + zlib.MAX_WBITS,
+        zlib.DEF_MEM_LEVEL,
+        GZIP_STRATEGIES[strategy],
+    )
+
+
+def deflate_compressobj(level: int = GZIP_LEVEL, strategy: str = GZIP_STRATEGY):
+    """Return a zlib compression object producing the `deflate' format
+
+    HTTP `deflate' is the zlib format (RFC 1950), not a raw deflate stream.
+    """
+    return zlib.compressobj(
+        level,
+        zlib.DEFLATED,
+        zlib.MAX_WBITS,
+        zlib.DEF_MEM_LEVEL,
+        GZIP_STRATEGIES[strategy],
+    )
+
+
+class BrotliCompressor:
+    """brotli.Compressor with the compress() and flush() zlib interface"""
+
+    def __init__(self, level: int = None, strategy: str = None):
+        # The gzip level and strategy do not apply to brotli
+        self.compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+
+    def compress(self, data: bytes) -> bytes:
+        return self.compressor.process(data)
+
+    def flush(self) -> bytes:
+        return self.compressor.finish()
+
+
+def zstd_compressobj(level: int = None, strategy: str = None):
+    """Return a zstandard compression object with the zlib interface"""
+    # The gzip level and strategy do not apply to zstd
+    return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+
+
+# Content encodings mapped to a callable taking (level, strategy) and
+# returning a streaming compressor with compress(data) and flush() methods
+CONTENT_ENCODERS = {
+    "gzip": gzip_compressobj,
+    "deflate": deflate_compressobj,
+}
+if brotli is not None:
+    CONTENT_ENCODERS["br"] = BrotliCompressor
+if zstandard is not None:
+    CONTENT_ENCODERS["zstd"] = zstd_compressobj
+
+
+def register_content_encoder(encoding: str, compressobj):
+    """Add (or replace) a content encoding offered to clients
+
+    encoding <str>: Content-Encoding token, e.g. "br".
+
+    compressobj <callable>: Called with (level, strategy) for each response
+        and returns an object with compress(data) and flush() methods.
+    """
+    CONTENT_ENCODERS[encoding.lower()] = compressobj
+
+
+def encode_content(
+    data: bytes,
+    encoding: str,
+    level: int = GZIP_LEVEL,
+    strategy: str = GZIP_STRATEGY,
+) -> bytes:
+    """Return `data' compressed with the named content `encoding'"""
+    compressor = CONTENT_ENCODERS[encoding](level, strategy)
+    return compressor.compress(data) + compressor.flush()
+
+
+class NotAcceptable(Exception):
+    """No available content encoding, including identity, is acceptable"""
+
+
+@functools.lru_cache(maxsize=256)
+def negotiate_encoding(accept_encoding: str, encodings: tuple) -> str:
+    """Return the content encoding to use from an `Accept-Encoding' value
+
+    The highest quality value (q) wins. Ties go to the encoding listed first
+    by the client and then to the order of `encodings' for `*'. None is
+    returned for identity (no encoding).
+
+    accept_encoding <str>: `Accept-Encoding' request header value.
+
+    encodings <tuple>: Content encodings the server is able to use.
+
+    Raises NotAcceptable when identity is refused (identity;q=0 or *;q=0)
+    and no other available encoding is acceptable.
+
+    See Also:
+    * www.rfc-editor.org/rfc/rfc9110#name-accept-encoding
+    """
+    qualities = {}
+    for entry in accept_encoding.split(","):
+        coding, *params = [v.strip() for v in entry.split(";")]
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities.setdefault(coding.lower(), quality)
+
+    # Identity is acceptable unless refused but only preferred when listed
+    star = qualities.pop("*", None)
+    identity = qualities.pop("identity", star)
+
+    # Explicitly listed encodings first in client order then any `*' matches
+    candidates = [(q, c) for c, q in qualities.items() if c in encodings]
+    if star is not None:
+        candidates += [(star, c) for c in encodings if c not in qualities]
+    best_quality, best = 0.0, None
+    for quality, coding in candidates:
+        if quality > best_quality:
+            best_quality, best = quality, coding
+
+    if best is not None and (identity is None or best_quality >= identity):
+        return best
+    if identity is None or identity > 0:
+        return None
+    raise NotAcceptable(accept_encoding)
+
+
+def parse_size(value: str) -> int:
+    """Return the number of bytes in a size value such as "1024", "64K" or "5G"
+
+    value <str>: An integer with an optional K, M, G or T binary suffix. A
+        trailing "B" or "iB" is ignored: "5GiB" == "5G" == "5368709120".
+
+    Raises ValueError when `value' is not a finite size.
+    """
+    value = value.strip().upper()
+    for unit in ("IB", "B"):
+        if value.endswith(unit) and len(value) > len(unit):
+            value = value[: -len(unit)]
+            break
+    if value and value[-1] in SIZE_SUFFIXES:
+        try:
+            return int(float(value[:-1]) * SIZE_SUFFIXES[value[-1]])
+        except OverflowError:
+            raise ValueError(value) from None
+    return int(value)
+
+
+@functools.lru_cache(maxsize=64)
+def fill_translation_table(fill_pattern: str):
+    """Return a 256 byte translation table mapping any byte onto `fill_pattern'
+
+    Returns None when `fill_pattern' can not be represented as single bytes,
+    the caller is expected to fall back to a character based generator.
+
+    fill_pattern <str>: Characters allowed in the generated content.
+    """
+    try:
+        alphabet = fill_pattern.encode("latin-1")
+    except UnicodeEncodeError:
+        return None
+    if not alphabet or any(b > 127 for b in alphabet):
+        return None
+    return bytes(alphabet[i % len(alphabet)] for i in range(256))
+
+
+@functools.lru_cache(maxsize=64)
+def fill_rejected_bytes(fill_pattern: str) -> bytes:
+    """Return the bytes dropped so each fill character is equally likely
+
+    Bytes from the top `256 % len(fill_pattern)' values would map onto the
+    first characters of `fill_pattern' once more than onto the others.
+
+    fill_pattern <str>: Characters allowed in the generated content.
+    """
+    return bytes(range(256 - 256 % len(fill_pattern), 256))
+
+
+def generate_random_content(length: int, fill_pattern: str = None, rng=None) -> bytes:
+    """Return `length' random bytes made up of characters from `fill_pattern'
+
+    Bytes are produced in bulk and mapped onto the fill pattern with
+    `bytes.translate', so the cost grows linearly with `length'. Bytes which
+    would make some characters more likely than others are dropped and
+    replaced with new ones.
+
+    length <int>: Number of bytes to generate.
+
+    fill_pattern <str>: Characters allowed in the generated content.
+        (Default = DEFAULT_FILL_PATTERN)
+
+    rng <random.Random>: Source of randomness.
+        (Default = the `random' module)
+    """
+    fill_pattern = fill_pattern or DEFAULT_FILL_PATTERN
+    rng = rng or random
+    if length <= 0:
+        return b""
+
+    table = fill_translation_table(fill_pattern)
+    if table is None:
+        # Multi-byte characters can not be mapped byte for byte
+        return "".join(rng.choices(fill_pattern, k=length)).encode("utf-8")
+
+    # Drop the random bytes which would bias the mapping and draw again
+    rejected = fill_rejected_bytes(fill_pattern)
+    content = rng.randbytes(length).translate(table, rejected)
+    if len(content) == length:
+        return content
+    content = bytearray(content)
+    while len(content) < length:
+        content += rng.randbytes(length - len(content)).translate(table, rejected)
+    return bytes(content)
+
+
+def generate_random_content_in_slices(
+    length: int, fill_pattern: str = None, rng=None
+) -> bytes:
+    """Return the same bytes as generate_random_content() in slices
+
+    Used on the offload threads where generating large content in one call
+    would hold the GIL, and block the event loop, until it completes.
+    """
+    rng = rng or random.Random()
+    return b"".join(
+        generate_random_content(
+            min(OFFLOAD_SLICE_SIZE, length - start), fill_pattern, rng
+        )
+        for start in range(0, length, OFFLOAD_SLICE_SIZE)
+    )
+
+
+def generate_seeded_content(
+    seed: int, start: int, end: int, fill_pattern: str = None
+) -> bytes:
+    """Return bytes `start' to `end' (exclusive) of the content for `seed'
+
+    Seeded content is made of SEED_BLOCK_SIZE blocks each generated from its
+    own seeded source of randomness, so any slice, including the end of a
+    very large body, is produced without generating the bytes before it.
+    With a multi-byte `fill_pattern' the offsets count characters instead,
+    the same as the length of unseeded content.
+
+    seed <int>: Seed used to generate the same content for the same request.
+
+    start <int>: Offset of the first byte.
+
+    end <int>: Offset after the last byte.
+
+    fill_pattern <str>: Characters allowed in the generated content.
+        (Default = DEFAULT_FILL_PATTERN)
+    """
+    if end <= start:
+        return b""
+    first = start // SEED_BLOCK_SIZE
+    last = (end - 1) // SEED_BLOCK_SIZE
+    offset = first * SEED_BLOCK_SIZE
+    blocks = [
+        generate_random_content(
+            SEED_BLOCK_SIZE, fill_pattern, rng=random.Random(f"{seed}:{index}")
+        )
+        for index in range(first, last + 1)
+    ]
+    if len(blocks) == 1 and start == offset and end - offset == SEED_BLOCK_SIZE:
+        return blocks[0]
+    start, end = start - offset, end - offset
+    # Multi-byte fill characters are sliced by character, not byte
+    if fill_translation_table(fill_pattern or DEFAULT_FILL_PATTERN) is None:
+        return b"".join(blocks).decode("utf-8")[start:end].encode("utf-8")
+    return b"".join(blocks)[start:end]
+
+
+def iter_chunks(data: bytes, size: int):
+    """Yield `data' in pieces of `size' bytes, the last may be shorter"""
+    for start in range(0, len(data), size):
+        end = start + size
+        yield data[start:end]
+
+
+async def iterate_async(chunks):
+    """Yield each item of `chunks', an iterable or an asynchronous iterable"""
+    if hasattr(chunks, "__aiter__"):
+        async for chunk in chunks:
+            yield chunk
+    else:
+        for chunk in chunks:
+            yield chunk
+
+
+def parse_byte_ranges(value: str, length: int):
+    """Return the (start, end) byte offsets requested by a Range header value
+
+    `end' is exclusive. None is returned when the value is not a valid bytes
+    range set, or has too many ranges, so the header is ignored. An empty
+    list is returned when none of the ranges are satisfiable (416).
+
+    value <str>: Range request header value, e.g. "bytes=0-99,-100".
+
+    length <int>: Length of the complete body in bytes.
+
+    See Also:
+    * www.rfc-editor.org/rfc/rfc9110#name-range
+    """
+    unit, _, range_set = value.partition("=")
+    if unit.strip().lower() != "bytes" or not range_set.strip():
+        return None
+    specs = [v.strip() for v in range_set.split(",") if v.strip()]
+    if not specs or len(specs) > MAX_BYTE_RANGES:
+        return None
+
+    ranges = []
+    for spec in specs:
+        first, dash, last = spec.partition("-")
+        if (
+            not dash
+            or not (first.isdigit() or first == "")
+            or not (last.isdigit() or last == "")
+        ):
+            return None
+        if first == "":
+            # Suffix range ---> 'bytes=-500' (the last 500 bytes)
+            if last == "":
+                return None
+            if int(last) > 0 and length > 0:
+                ranges.append((max(length - int(last), 0), length))
+            continue
+        start = int(first)
+        if last != "" and int(last) < start:
+            return None
+        end = length if last == "" else int(last) + 1
+        if start < length:
+            ranges.append((start, min(end, length)))
+    return ranges
+
+
+def json_default(obj):
+    """Return a JSON serializable value for the additional object types
+
+    Raises TypeError for any other type, as expected by the JSON encoders.
+    """
+    # Decode Python bytes as a utf-8 string
+    if isinstance(obj, bytes):
+        return obj.decode("utf-8")
+
+    # Format Python datetime objects in ISO format
+    # docs.python.org/3/library/datetime.html#datetime.datetime.isoformat
+    if isinstance(obj, datetime.datetime):
+        return obj.isoformat(timespec="seconds")
+
+    # Format *some* Python Exception as a string
+    # docs.python.org/3/library/exceptions.html
+    if isinstance(obj, NotImplementedError):
+        return str(obj)
+
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
 
 class JSONEncoderPlus(json.JSONEncoder):
     """Extend the standard JSONEncoder to handle additional object types."""
 
     def default(self, obj):
-        # Decode Python bytes as a utf-8 string
-        if isinstance(obj, bytes):
-            return obj.decode("utf-8")
+        try:
+            return json_default(obj)
+        except TypeError:
+            # Otherwise use the default JSONEncoder
+            return super().default(obj)
+
+
+def json_native(value):
+    """Return `value' with only JSON native types: dict, list, str and numbers
+
+    Request arguments hold lists of bytes, converting them up front means the
+    JSON encoders never fall back to calling `json_default' for each value.
+    Dictionary subclasses such as cookie Morsels become plain dictionaries.
+    """
+    if isinstance(value, (str, int, float)) or value is None:
+        return value
+    if isinstance(value, dict):
+        return {key: json_native(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [json_native(item) for item in value]
+    return json_default(value)
+
+
+class RequestSnapshot:
+    """Read the request attributes shown in response bodies once
+
+    Each attribute is only read, or computed, the first time a renderer asks
+    for it and is then kept, so the text and JSON renderers below share the
+    same values without walking the request twice.
+
+    request <tornado.httputil.HTTPServerRequest>: The request to describe.
+    """
+
+    # Attributes in the order they are rendered
+    FIELDS = (
+        "arguments",
+        "body",
+        "body_arguments",
+        "cookies",
+        "files",
+        "full_url",
+        "headers",
+        "host",
+        "host_name",
+        "method",
+        "path",
+        "protocol",
+        "query",
+        "query_arguments",
+        "remote_ip",
+        "request_time",
+        "uri",
+        "version",
+    )
+
+    __slots__ = ("request", "values")
+
+    def __init__(self, request):
+        self.request = request
+        self.values = {}
+
+    def __getitem__(self, key: str):
+        try:
+            return self.values[key]
+        except KeyError:
+            pass
+        # Call the methods to keep their result
+        if key in ("full_url", "request_time"):
+            value = getattr(self.request, key)()
+        # Keep the header (name, value) pairs in the order received
+        elif key == "headers":
+            value = list(self.request.headers.get_all())
+        else:
+            value = getattr(self.request, key)
+        self.values[key] = value
+        return value
+
+
+def request_debug_text(snapshot: RequestSnapshot) -> list:
+    """Return the `# DEBUG:' lines of every request attribute"""
+    lines = []
+    for key in snapshot.FIELDS:
+        value = snapshot[key]
+        lines.append(f"# DEBUG: request.{key} {type(value)}: {value!r}")
+    return lines
+
+
+def request_text(snapshot: RequestSnapshot) -> list:
+    """Return the `>' lines of the request line, headers and any POST data"""
+    lines = [f"> {snapshot['method']} {snapshot['uri']} {snapshot['version']}"]
+    # Always set the Host header first in the list (HTTP/1.0)
+    host = []
+    headers = []
+    for hdr_name, hdr_value in snapshot["headers"]:
+        if hdr_name.lower() == "host":
+            host = [f"> {hdr_name}: {hdr_value}"]
+        else:
+            headers.append(f"> {hdr_name}: {hdr_value}")
+    lines += host + sorted(headers)
+    lines.append(">")
+    # Include POST data provided
+    if snapshot["method"] == "POST":
+        lines.append(f"* POST DATA {snapshot['body']!r}{NL}")
+    return lines
+
+
+def request_json(snapshot: RequestSnapshot) -> dict:
+    """Return the request attributes with only JSON native types"""
+    request = {}
+    for key in snapshot.FIELDS:
+        value = snapshot[key]
+        # Explode the Cookie instance into key/value tuple pairs
+        if key == "cookies":
+            value = list(value.items())
+        # Use 'body_length' instead of 'body'
+        # since POST/PUT data may be large
+        elif key == "body":
+            value = len(value)
+            key = "body_length"
+        request[key] = json_native(value)
+    return request
+
+
+# Options which may be changed by a matched `?set' rule
+SET_CONDITION_KEYS = (
+    "body_delay",
+    "burst",
+    "chunk_interval",
+    "chunk_size",
+    "chunked",
+    "debug",
+    "delay",
+    "encoding",
+    "fill",
+    "gzip_level",
+    "gzip_strategy",
+    "quiet",
+    "rate",
+    "reason",
+    "seed",
+    "stall_at",
+    "status",
+    "stream",
+    "ttfb",
+)
+
+
+class OptionsError(ValueError):
+    """A URL query parameter option has a value which is not valid"""
+
+
+# Delay distributions by name mapped to their parameter defaults and a
+# function sampling seconds from (<random.Random>, <parameters dict>)
+DELAY_DISTRIBUTIONS = {
+    "uniform": (
+        {"low": 0.0, "high": 1.0},
+        lambda rng, p: rng.uniform(p["low"], p["high"]),
+    ),
+    "normal": (
+        {"mu": 1.0, "sigma": 0.1},
+        lambda rng, p: rng.gauss(p["mu"], p["sigma"]),
+    ),
+    "lognormal": (
+        {"mu": 0.0, "sigma": 1.0},
+        lambda rng, p: rng.lognormvariate(p["mu"], p["sigma"]),
+    ),
+    "exponential": (
+        {"mean": 1.0},
+        lambda rng, p: rng.expovariate(1 / p["mean"]),
+    ),
+    "pareto": (
+        {"alpha": 1.5, "scale": 0.1},
+        lambda rng, p: p["scale"] * rng.paretovariate(p["alpha"]),
+    ),
+    # Sampled from the (<seconds>, <weight>) buckets of a histogram file
+    "empirical": ({}, None),
+}
+
+
+@functools.lru_cache(maxsize=32)
+def load_delay_histogram(path: str) -> tuple:
+    """Return (<seconds values>, <cumulative weights>) from a histogram file
+
+    Each line holds a delay in seconds and its weight (a count or a share)
+    separated by white space or a comma. Blank lines and lines starting with
+    `#' are skipped.
+
+    Raises ValueError when the file has no usable buckets.
+    """
+    values, cum_weights, total = [], [], 0.0
+    for line in Path(path).read_text().splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        seconds, weight = line.replace(",", " ").split()
+        if float(seconds) < 0 or float(weight) < 0:
+            raise ValueError(line)
+        total += float(weight)
+        values.append(float(seconds))
+        cum_weights.append(total)
+    if not values or total <= 0:
+        raise ValueError(f"no histogram buckets in {path!r}")
+    return tuple(values), tuple(cum_weights)
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class DelayDistribution:
+    """A parsed `?delay=dist:<name>[,<parameter>=<value>...]'
+
+    Common parameters are `max' (cap samples at N seconds) and `seed' (use
+    the same sample for every request). `empirical' takes `file', the name
+    of a histogram file in the server `--delay-histograms' directory.
+    """
+
+    name: str
+    # Tuple of (<parameter name>, <float>) pairs
+    params: tuple = ()
+    max: float = None
+    seed: int = None
+    file: str = None
+
+    @classmethod
+    def parse(cls, value: str):
+        """Return a DelayDistribution for `dist:<name>[,<key>=<value>...]'
+
+        Raises ValueError when the name or a parameter is not valid.
+        """
+        name, *pairs = value.split(":", 1)[1].split(",")
+        name = name.strip().lower()
+        defaults, _ = DELAY_DISTRIBUTIONS[name]
+        params, values = dict(defaults), {}
+        for pair in pairs:
+            key, item = [v.strip() for v in pair.split("=", 1)]
+            if key == "file":
+                # Only a plain file name inside the histogram directory
+                if not item or item.startswith(".") or Path(item).name != item:
+                    raise ValueError(item)
+                values[key] = item
+            elif key == "seed":
+                values[key] = int(item)
+            elif key == "max":
+                values[key] = float(item)
+                if values[key] < 0 or not math.isfinite(values[key]):
+                    raise ValueError(item)
+            elif key in params:
+                params[key] = float(item)
+                if not math.isfinite(params[key]):
+                    raise ValueError(item)
+            else:
+                raise ValueError(key)
+        if name == "uniform" and params["low"] > params["high"]:
+            raise ValueError(value)
+
+        distribution = cls(name, tuple(sorted(params.items())), **values)
+        if name == "empirical":
+            if distribution.file is None:
+                raise ValueError("file")
+            return distribution
+        # Parameters out of range fail here instead of on the request
+        try:
+            distribution.sample(random.Random(0))
+        except (OverflowError, ValueError, ZeroDivisionError):
+            raise ValueError(value) from None
+        return distribution
+
+    def sample(self, rng: random.Random, histogram_dir: str = None) -> float:
+        """Return a delay in seconds sampled with `rng' (or `seed' if set)
+
+        Raises OSError or ValueError when an `empirical' histogram file can
+        not be used, or ValueError when the sample overflows without `max'.
+        """
+        if self.seed is not None:
+            rng = random.Random(self.seed)
+        if self.name == "empirical":
+            if not histogram_dir:
+                raise ValueError("no --delay-histograms directory")
+            values, cum_weights = load_delay_histogram(
+                str(Path(histogram_dir) / self.file)
+            )
+            seconds = rng.choices(values, cum_weights=cum_weights)[0]
+        else:
+            _, sampler = DELAY_DISTRIBUTIONS[self.name]
+            # Heavy tailed parameters may give samples too large for a float
+            try:
+                seconds = sampler(rng, dict(self.params))
+            except (OverflowError, ZeroDivisionError):
+                seconds = math.inf
+        seconds = max(seconds, 0.0)
+        if self.max is not None:
+            seconds = min(seconds, self.max)
+        if not math.isfinite(seconds):
+            raise ValueError(f"{self.name} sample out of range without `max'")
+        return seconds
+
+
+def delay_random(seed: int = None, worker_id: int = None) -> random.Random:
+    """Return the source of randomness used to sample `?delay=dist:' delays
+
+    The same `seed' repeats the same sequence of delays. Each `--workers'
+    process gets its own sequence.
+    """
+    if seed is None:
+        return random.Random()
+    if worker_id is None:
+        return random.Random(seed)
+    return random.Random(f"{seed}:{worker_id}")
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class SetRule:
+    """A parsed `?set=<condition:value>[,<condition:value>],<match:value>'"""
+
+    # Tuple of (<option name>, <parsed value>) pairs applied on a match
+    conditions: tuple
+    # Lower cased `host' or `addr'
+    match_key: str
+    # Lower cased value compared with the request value
+    match_value: str
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class RequestOptions:
+    """URL query parameter options parsed once per request
+
+    Use `RequestOptions.parse' to create an instance from a dictionary of query
+    arguments. Instances are immutable, use `RequestOptions.replace' to apply
+    the conditions of a matched `?set' rule.
+    """
+
+    # ?body_delay=<seconds float>
+    body_delay: float = None
+    # ?burst=<int>[K|M|G|T]
+    burst: int = None
+    # ?chunk_interval=<milliseconds float>
+    chunk_interval: float = None
+    # ?chunk_size=<int>[K|M|G|T]
+    chunk_size: int = None
+    # ?chunked
+    chunked: bool = False
+    # ?compact
+    compact: bool = False
+    # ?content=[<format>:]<int>[K|M|G|T], `content_length' is None for formats
+    content: str = None
+    content_length: int = None
+    # ?debug
+    debug: bool = False
+    # ?delay=<seconds float> or a DelayDistribution for ?delay=dist:...
+    delay: float = None
+    # ?encoding=<encoding[;q=0.99]>[,...]
+    encoding: str = None
+    # ?etag=[W/]<str>, the quoted ETag response header value
+    etag: str = None
+    # ?fill=<str>
+    fill: str = DEFAULT_FILL_PATTERN
+    # ?gzip_level=<0-9>
+    gzip_level: int = None
+    # ?gzip_strategy=<default|filtered|huffman|rle|fixed>
+    gzip_strategy: str = None
+    # ?header=<name>[:<value>], tuple of (<name>, <value or None to clear>)
+    headers: tuple = ()
+    # ?last_modified=<HTTP-date|epoch seconds>, as epoch seconds
+    last_modified: int = None
+    # Notes about options which were ignored
+    messages: tuple = ()
+    # ?no_buffering
+    no_buffering: bool = False
+    # ?no_end_of_content
+    no_end_of_content: bool = False
+    # ?quiet
+    quiet: bool = False
+    # ?rate=<int>[K|M|G|T] bytes per second
+    rate: int = None
+    # ?read_rate=<int>[K|M|G|T] request body bytes per second read by /sink
+    read_rate: int = None
+    # ?reason=<str>
+    reason: str = None
+    # ?seed=<int>
+    seed: int = None
+    # ?set=..., tuple of SetRule
+    set_rules: tuple = ()
+    # ?stall_at=<offset>[K|M|G|T]:<seconds float>, tuple of (offset, seconds)
+    stall_at: tuple = None
+    # ?status=<int>
+    status: int = None
+    # ?stream
+    stream: bool = False
+    # ?ttfb=<seconds float>
+    ttfb: float = None
+    # ?upload[=<hash algorithm|count>], the upload body is not kept
+    upload: str = None
+
+    @staticmethod
+    def parse_value(key: str, value: str):
+        """Return `value' converted for the option `key'
+
+        Raises OptionsError when the value is not valid for the option.
+        """
+        try:
+            if key in (
+                "chunked",
+                "compact",
+                "debug",
+                "no_buffering",
+                "no_end_of_content",
+                "quiet",
+                "stream",
+            ):
+                return value.lower() not in ("0", "false", "no")
+            if key == "content":
+                if value.lower().startswith(("lipsum:", "ascii:")):
+                    return value, None
+                if parse_size(value) < 0:
+                    raise ValueError(value)
+                return value, parse_size(value)
+            if key == "delay":
+                if value.lower().startswith("dist:"):
+                    return DelayDistribution.parse(value)
+                # Seconds of `inf' would hold the request forever
+                if not math.isfinite(float(value)):
+                    raise ValueError(value)
+                return float(value)
+            if key in ("body_delay", "chunk_interval", "ttfb"):
+                if float(value) < 0 or not math.isfinite(float(value)):
+                    raise ValueError(value)
+                return float(value)
+            if key == "stall_at":
+                offset, seconds = value.split(":")
+                if parse_size(offset) < 0 or float(seconds) < 0:
+                    raise ValueError(value)
+                if not math.isfinite(float(seconds)):
+                    raise ValueError(value)
+                return parse_size(offset), float(seconds)
+            if key in ("burst", "chunk_size", "rate", "read_rate"):
+                if parse_size(value) <= 0:
+                    raise ValueError(value)
+                if key == "chunk_size" and parse_size(value) > MAX_CHUNK_SIZE:
+                    raise ValueError(value)
+                return parse_size(value)
+            if key in ("seed", "status"):
+                return int(value)
+            if key == "gzip_level":
+                if int(value) not in range(0, 10):
+                    raise ValueError(value)
+                return int(value)
+            if key == "gzip_strategy" and value not in GZIP_STRATEGIES:
+                raise ValueError(value)
+            if key == "etag":
+                weak = value.startswith("W/")
+                opaque = value[2:] if weak else value
+                if len(opaque) > 1 and opaque[0] == opaque[-1] == '"':
+                    opaque = opaque[1:-1]
+                if not opaque.isprintable() or any(c in opaque for c in '" '):
+                    raise ValueError(value)
+                return f'{"W/" if weak else ""}"{opaque}"'
+            if key == "upload":
+                if value != "count" and (
+                    value not in hashlib.algorithms_guaranteed
+                    or value.startswith("shake_")
+                ):
+                    raise ValueError(value)
+                return value
+            if key == "last_modified":
+                try:
+                    if value.isdigit():
+                        seconds = int(value)
+                    else:
+                        seconds = int(
+                            email.utils.parsedate_to_datetime(value).timestamp()
+                        )
+                    # Only times the `Last-Modified' header can be set to
+                    tornado.httputil.format_timestamp(seconds)
+                except (OSError, OverflowError, TypeError):
+                    raise ValueError(value) from None
+                return seconds
+        except (KeyError, ValueError):
+            raise OptionsError(f"Invalid `{key}' option value: {value!r}") from None
+        return value
+
+    @classmethod
+    def parse(cls, arguments: dict):
+        """Return options parsed from a dictionary of query arguments
+
+        arguments <dict>: Query argument names mapped to a list of bytes values
+            as found in `tornado.httputil.HTTPServerRequest.query_arguments'.
+
+        Raises OptionsError when an option value is not valid.
+        """
+        values = {}
+        messages = []
+
+        def first(key: str) -> str:
+            # Use the first value ONLY
+            return arguments[key][0].decode("utf-8")
+
+        # Presence of these keys with or without any value sets the option
+        for key in (
+            "chunked",
+            "compact",
+            "debug",
+            "no_buffering",
+            "no_end_of_content",
+            "quiet",
+            "stream",
+        ):
+            if key in arguments:
+                values[key] = True
+
+        # Empty values are treated the same as a missing option
+        for key in (
+            "body_delay",
+            "burst",
+            "chunk_interval",
+            "chunk_size",
+            "delay",
+            "encoding",
+            "etag",
+            "gzip_level",
+            "gzip_strategy",
+            "last_modified",
+            "rate",
+            "read_rate",
+            "reason",
+            "seed",
+            "stall_at",
+            "status",
+            "ttfb",
+        ):
+            if key in arguments and first(key):
+                values[key] = cls.parse_value(key, first(key))
+
+        if "content" in arguments and first("content"):
+            values["content"], values["content_length"] = cls.parse_value(
+                "content", first("content")
+            )
+
+        if "fill" in arguments and first("fill"):
+            values["fill"] = first("fill")
+
+        if "upload" in arguments:
+            values["upload"] = cls.parse_value("upload", first("upload") or "sha256")
+
+        # Set or clear response headers as requested
+        headers = []
+        for header in arguments.get("header", []):
+            header = header.decode("utf-8").split(":", 1)
+            if len(header) == 2 and header[1] != "":
+                headers.append((header[0], header[1]))
+            else:
+                headers.append((header[0], None))
+        values["headers"] = tuple(headers)
+
+        # Multiple `set' key/value pairs may be passed
+        # ? set = <condition : value> , <match : value>
+        set_rules = []
+        for set_conditions in arguments.get("set", []):
+            set_conditions = set_conditions.decode("utf-8").split(",")
+
+            # Each `set_conditions' should have at minimum two items:
+            # a "condition" and a "match": [<condition>, <match>]
+            if len(set_conditions) < 2:
+                messages.append(f"missing arguments: {set_conditions!r}")
+                continue
+
+            # Match condition should be last in the list
+            # Match condition should be a <key>:<value> pair
+            # Be mindful of IPv6 addresses
+            set_match = set_conditions.pop(-1).split(":", 1)
+            if len(set_match) != 2:
+                messages.append(f"`set_match' missing arguments: {set_match!r}")
+                continue
+
+            conditions = []
+            for set_condition in set_conditions:
+                # A `set_condition' should be a <key>:<value> pair
+                # Be mindful of IPv6 addresses
+                set_condition = set_condition.split(":", 1)
+                if len(set_condition) != 2:
+                    messages.append(
+                        f"`set_condition' missing arguments: {set_condition!r}"
+                    )
+                    continue
+                key, value = set_condition
+                if key == "content":
+                    content, content_length = cls.parse_value(key, value)
+                    conditions += [
+                        ("content", content),
+                        ("content_length", content_length),
+                    ]
+                elif key in SET_CONDITION_KEYS:
+                    conditions.append((key, cls.parse_value(key, value)))
+                else:
+                    messages.append(f"`set_condition' unknown option: {key!r}")
+
+            set_rules.append(
+                SetRule(
+                    conditions=tuple(conditions),
+                    match_key=set_match[0].lower(),
+                    match_value=set_match[1].lower(),
+                )
+            )
+        values["set_rules"] = tuple(set_rules)
+        values["messages"] = tuple(messages)
+
+        return cls(**values)
+
+    def replace(self, **changes):
+        """Return a copy of these options with `changes' applied"""
+        return dataclasses.replace(self, **changes)
+
+
+def parse_query_options(query: str) -> RequestOptions:
+    """Return the RequestOptions for a raw URL query string
+
+    make_app wraps this function with `functools.lru_cache' so repeated query
+    strings skip parsing and validation, see the `parse_options' setting.
 
-        # Format Python datetime objects in ISO format
-        # docs.python.org/3/library/datetime.html#datetime.datetime.isoformat
-        if isinstance(obj, datetime.datetime):
-            return obj.isoformat(timespec="seconds")
+    query <str>: The URL query string without the leading "?".
+    """
+    return RequestOptions.parse(
+        tornado.httputil.parse_qs_bytes(query, keep_blank_values=True)
+    )
+
+
+class StaticResponse:
+    """A response body built once at start up in each supported encoding
+
+    Each encoded body has a precomputed strong ETag so static endpoints are
+    served without any body assembly, compression or hashing per request.
+
+    content <str>: Response body content.
+
+    content_type <str>: Content-Type response header value.
+
+    last_modified <int>: Last-Modified epoch seconds, the start up time.
+        (Default = now)
+
+    gzip_level <int>: gzip compression level used for the encoded bodies.
+        (Default = GZIP_LEVEL)
+
+    gzip_strategy <str>: gzip compression strategy used for the encoded
+        bodies. (Default = GZIP_STRATEGY)
+    """
+
+    def __init__(
+        self,
+        content: str,
+        content_type: str,
+        gzip_level: int = GZIP_LEVEL,
+        gzip_strategy: str = GZIP_STRATEGY,
+        last_modified: int = None,
+    ):
+        self.content_type = content_type
+        self.last_modified = int(last_modified or time.time())
+        body = content.encode("utf-8")
+        # Encoded once for each content encoding available
+        self.bodies = {"identity": body}
+        for encoding in CONTENT_ENCODERS:
+            self.bodies[encoding] = encode_content(
+                body, encoding, gzip_level, gzip_strategy
+            )
+        self.etags = {
+            encoding: f'"{hashlib.sha1(body).hexdigest()}"'
+            for encoding, body in self.bodies.items()
+        }
+
+
+def json_text(content: dict, compact: bool = False) -> str:
+    """Return `content' formatted as pretty JSON with a trailing line break
+
+    compact <bool>: Leave out the indentation and key sorting, using orjson
+        or ujson when installed. (Default = False)
+    """
+    if compact:
+        return json_compact(content) + "\n"
+    return (
+        json.dumps(
+            content,
+            indent=4,
+            separators=(",", ": "),
+            sort_keys=True,
+            cls=JSONEncoderPlus,
+        )
+        + "\n"
+    )
+
+
+def json_compact(content: dict) -> str:
+    """Return `content' as JSON without any whitespace or key sorting
+
+    `content' is converted with json_native() first and non-ASCII characters
+    are written as UTF-8 by every encoder, so the same content gives the same
+    text whichever encoder is installed. Floats are written in each encoder's
+    shortest form, which may differ for exponents: 1e-05 or 1e-5.
+    """
+    content = json_native(content)
+    if orjson is not None:
+        return orjson.dumps(content).decode("utf-8")
+    if ujson is not None:
+        return ujson.dumps(content, ensure_ascii=False, escape_forward_slashes=False)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":"))
+
+
+# Name of the encoder used by json_compact, shown with ?debug
+JSON_BACKEND = "orjson" if orjson else "ujson" if ujson else "json"
+
+
+def build_static_responses(**kwargs) -> dict:
+    """Return the static endpoint responses matched by the end of the URL path
+
+    Keyed by (<path suffix>, <JSON requested>) with StaticResponse values.
+    Keyword arguments are passed to each StaticResponse.
+    """
+    return {
+        ("/ping", False): StaticResponse("pong\n", "text/plain", **kwargs),
+        ("/ping", True): StaticResponse(
+            json_text({"ping": "pong"}), "text/json", **kwargs
+        ),
+        ("/hello_world", False): StaticResponse(
+            "Hello, World!\n", "text/plain", **kwargs
+        ),
+        ("/hello_world", True): StaticResponse(
+            json_text({"Hello": "World!"}), "text/json", **kwargs
+        ),
+        ("/football.svg", False): StaticResponse(
+            FOOTBALL_SVG, "image/svg+xml", **kwargs
+        ),
+        ("/football.svg", True): StaticResponse(
+            FOOTBALL_SVG, "image/svg+xml", **kwargs
+        ),
+    }
+
+
+class ContentCache:
+    """A least recently used cache of response body bytes bounded by size
+
+    Entries are keyed by a tuple such as (seed, length, fill, encoding) so the
+    raw bytes and each compressed variant are cached independently.
+
+    max_bytes <int>: Total bytes allowed across all cached values. Zero
+        disables the cache.
+        (Default = CONTENT_CACHE_SIZE)
+    """
+
+    def __init__(self, max_bytes: int = CONTENT_CACHE_SIZE):
+        self.max_bytes = int(max_bytes)
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key: tuple):
+        """Return the cached bytes for `key' or None when not cached"""
+        value = self._entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def peek(self, key: tuple):
+        """Return the cached bytes for `key' without counting a hit or miss"""
+        return self._entries.get(key)
+
+    def put(self, key: tuple, value: bytes):
+        """Cache `value' for `key' evicting the least recently used entries"""
+        if len(value) > self.max_bytes:
+            return
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self.current_bytes -= len(previous)
+        self._entries[key] = value
+        self.current_bytes += len(value)
+        while self.current_bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.current_bytes -= len(evicted)
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        """Return the cache counters"""
+        return {
+            "entries": len(self._entries),
+            "bytes": self.current_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+class TokenBucket:
+    """Pace writes to `rate' bytes per second allowing bursts of `burst' bytes
+
+    Tokens refill continuously with time. Taking more tokens than available
+    sleeps on the IOLoop (one timer, no busy loop) until the tokens have been
+    earned, so many paced responses cost next to nothing while waiting.
+
+    rate <int>: Bytes per second.
+
+    burst <int>: Bytes allowed at once, also the starting tokens.
+        (Default = `rate' * RATE_BURST_SECONDS, at least 1)
+    """
+
+    def __init__(self, rate: int, burst: int = None):
+        self.rate = int(rate)
+        self.burst = int(burst or max(int(self.rate * RATE_BURST_SECONDS), 1))
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+
+    async def take(self, count: int):
+        """Take `count' tokens, waiting until they are available"""
+        now = time.monotonic()
+        self.tokens = min(self.tokens + (now - self.updated) * self.rate, self.burst)
+        self.updated = now
+        self.tokens -= count
+        if self.tokens < 0:
+            await tornado.gen.sleep(-self.tokens / self.rate)
+
+
+class UploadCounter:
+    """Count, and optionally hash, request body bytes as they arrive
+
+    Chunks are not kept so memory does not grow with the size of the body.
+
+    algorithm <str>: hashlib algorithm name or None to only count the bytes.
+    """
+
+    __slots__ = ("bytes", "digest", "first", "last")
+
+    def __init__(self, algorithm: str = None):
+        self.bytes = 0
+        self.digest = hashlib.new(algorithm) if algorithm else None
+        # time.perf_counter() of the first and last body bytes
+        self.first = None
+        self.last = None
+
+    def update(self, chunk: bytes):
+        now = time.perf_counter()
+        if self.first is None:
+            self.first = now
+        self.last = now
+        self.bytes += len(chunk)
+        if self.digest is not None:
+            self.digest.update(chunk)
+
+    def summary(self) -> dict:
+        """Return the byte count, seconds, MB/s and digest of the body"""
+        seconds = self.last - self.first if self.first is not None else 0.0
+        summary = {
+            "bytes": self.bytes,
+            "seconds": round(seconds, 6),
+            "mb_per_sec": round(self.bytes / seconds / 1e6, 3) if seconds else None,
+        }
+        if self.digest is not None:
+            summary[self.digest.name] = self.digest.hexdigest()
+        return summary
+
+
+class OffloadExecutor:
+    """Run CPU heavy functions on a thread pool above a size threshold
+
+    zlib releases the GIL while compressing so compression runs in parallel
+    with the event loop. Smaller work is cheaper to run inline than to hand
+    off and is called directly.
+
+    workers <int>: Number of threads. Zero runs everything inline.
+        (Default = OFFLOAD_WORKERS)
+
+    threshold <int>: Size in bytes at or above which work is offloaded.
+        (Default = OFFLOAD_THRESHOLD)
+    """
+
+    def __init__(
+        self, workers: int = OFFLOAD_WORKERS, threshold: int = OFFLOAD_THRESHOLD
+    ):
+        self.workers = int(workers)
+        self.threshold = int(threshold)
+        # Counters are only changed on the event loop thread
+        self.pending = 0
+        self.inline = 0
+        self.offloaded = 0
+        self.executor = None
+        if self.workers > 0:
+            # Threads are started on first use, after any --workers fork
+            self.executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix="offload"
+            )
+
+    async def run(self, size: int, function, *args):
+        """Return function(*args) run off the event loop when `size' is large"""
+        if self.executor is None or size < self.threshold:
+            self.inline += 1
+            return function(*args)
+        self.pending += 1
+        try:
+            return await tornado.ioloop.IOLoop.current().run_in_executor(
+                self.executor, function, *args
+            )
+        finally:
+            self.pending -= 1
+            self.offloaded += 1
+
+    def stats(self) -> dict:
+        """Return the executor counters including the queue depth"""
+        return {
+            "workers": self.workers,
+            "threshold": self.threshold,
+            "running": min(self.pending, self.workers),
+            "queued": max(self.pending - self.workers, 0),
+            "inline": self.inline,
+            "offloaded": self.offloaded,
+        }
+
+
+class Histogram:
+    """Counts of observed values in METRICS_BUCKETS with their sum"""
+
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        # One count per bucket plus the +Inf bucket, not cumulative
+        self.counts = [0] * (len(METRICS_BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(METRICS_BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    """Request metrics exposed in the Prometheus text format at /metrics
+
+    Values are only changed on the IOLoop thread (never by the offload
+    threads) so plain counters are used without any locking. With --workers
+    each worker saves a snapshot of its values to `snapshot_dir' every
+    METRICS_SNAPSHOT_INTERVAL seconds and /metrics adds the saved values of
+    the other workers to its own.
+
+    snapshot_dir <str>: Directory shared by the worker processes or None.
+
+    worker_id <int>: Worker process id used to name the snapshot file.
+    """
+
+    # Stages of RepeaterHandler.repeat timed for each request
+    STAGES = (
+        "set_condition",
+        "delay_response",
+        "content_encoding",
+        "prepare_body_text",
+        "write",
+    )
+
+    def __init__(self, snapshot_dir: str = None, worker_id: int = None):
+        self.snapshot_dir = snapshot_dir
+        self.worker_id = worker_id
+        self.in_flight = 0
+        # (method, status) mapped to a count
+        self.requests = collections.Counter()
+        # Content-Encoding mapped to body bytes
+        self.bytes_out = collections.Counter()
+        # Histogram name mapped to {<label value>: Histogram}
+        self.histograms = collections.defaultdict(
+            lambda: collections.defaultdict(Histogram)
+        )
+
+    def observe(self, name: str, label: str, value: float):
+        """Add `value' to the `name' histogram with the `label' value"""
+        self.histograms[name][label].observe(value)
+
+    def record_request(
+        self,
+        method: str,
+        status: int,
+        encoding: str,
+        body_bytes: int,
+        seconds: float,
+        stages: dict,
+    ):
+        """Count a finished request and observe its latencies"""
+        self.requests[(method, status)] += 1
+        self.bytes_out[encoding] += body_bytes
+        self.observe("request_seconds", "", seconds)
+        for stage, stage_seconds in stages.items():
+            self.observe("stage_seconds", stage, stage_seconds)
+
+    def snapshot(self) -> dict:
+        """Return the current values in a JSON serializable dictionary"""
+        return {
+            "in_flight": self.in_flight,
+            "requests": [[m, s, n] for (m, s), n in self.requests.items()],
+            "bytes_out": [[e, n] for e, n in self.bytes_out.items()],
+            "histograms": [
+                [name, label, h.counts, h.sum, h.count]
+                for name, labels in self.histograms.items()
+                for label, h in labels.items()
+            ],
+        }
+
+    @property
+    def snapshot_path(self) -> Path:
+        return Path(self.snapshot_dir) / f"worker-{self.worker_id}.json"
+
+    def save_snapshot(self):
+        """Save a snapshot for the other workers to read, atomically"""
+        path = self.snapshot_path
+        temporary = path.with_suffix(".tmp")
+        temporary.write_text(json.dumps(self.snapshot()))
+        os.replace(temporary, path)
+
+    def combined(self) -> dict:
+        """Return the snapshot of this process with those of other workers"""
+        snapshots = [self.snapshot()]
+        if self.snapshot_dir is not None:
+            for path in Path(self.snapshot_dir).glob("worker-*.json"):
+                if path != self.snapshot_path:
+                    try:
+                        snapshots.append(json.loads(path.read_text()))
+                    except (OSError, ValueError):
+                        continue
+        combined = {"in_flight": 0, "requests": {}, "bytes_out": {}, "histograms": {}}
+        for snapshot in snapshots:
+            combined["in_flight"] += snapshot["in_flight"]
+            for method, status, count in snapshot["requests"]:
+                key = (method, status)
+                combined["requests"][key] = combined["requests"].get(key, 0) + count
+            for encoding, count in snapshot["bytes_out"]:
+                total = combined["bytes_out"].get(encoding, 0) + count
+                combined["bytes_out"][encoding] = total
+            for name, label, counts, total, count in snapshot["histograms"]:
+                current = combined["histograms"].setdefault((name, label), Histogram())
+                current.counts = [a + b for a, b in zip(current.counts, counts)]
+                current.sum += total
+                current.count += count
+        return combined
+
+    def render(self, prefix: str = "mock_http_origin") -> str:
+        """Return all worker values in the Prometheus text exposition format
+
+        See Also:
+        * prometheus.io/docs/instrumenting/exposition_formats/
+        """
+        combined = self.combined()
+        lines = [
+            f"# HELP {prefix}_requests_total Requests finished.",
+            f"# TYPE {prefix}_requests_total counter",
+        ]
+        for (method, status), count in sorted(combined["requests"].items()):
+            lines.append(
+                f'{prefix}_requests_total{{method="{method}",status="{status}"}} {count}'
+            )
+        lines += [
+            f"# HELP {prefix}_response_bytes_total Response body bytes sent.",
+            f"# TYPE {prefix}_response_bytes_total counter",
+        ]
+        for encoding, count in sorted(combined["bytes_out"].items()):
+            lines.append(
+                f'{prefix}_response_bytes_total{{encoding="{encoding}"}} {count}'
+            )
+        lines += [
+            f"# HELP {prefix}_in_flight_requests Requests being handled.",
+            f"# TYPE {prefix}_in_flight_requests gauge",
+            f"{prefix}_in_flight_requests {combined['in_flight']}",
+        ]
+        descriptions = {
+            "request_seconds": ("", "Time to handle each request."),
+            "stage_seconds": ("stage", "Time spent in each stage of a request."),
+            "loop_lag_seconds": ("", "IOLoop callback scheduling lag."),
+        }
+        histograms = combined["histograms"]
+        for name, (label_name, description) in descriptions.items():
+            lines += [
+                f"# HELP {prefix}_{name} {description}",
+                f"# TYPE {prefix}_{name} histogram",
+            ]
+            for (hist_name, label), histogram in sorted(histograms.items()):
+                if hist_name != name:
+                    continue
+                labels = f'{label_name}="{label}",' if label_name else ""
+                cumulative = 0
+                for bound, count in zip(METRICS_BUCKETS + ("+Inf",), histogram.counts):
+                    cumulative += count
+                    lines.append(
+                        f'{prefix}_{name}_bucket{{{labels}le="{bound}"}} {cumulative}'
+                    )
+                labels = f"{{{labels.rstrip(',')}}}" if labels else ""
+                lines.append(f"{prefix}_{name}_sum{labels} {histogram.sum}")
+                lines.append(f"{prefix}_{name}_count{labels} {histogram.count}")
+        return NL.join(lines) + NL
+
+    def start(self):
+        """Save snapshots for the other workers on the current IOLoop"""
+        if self.snapshot_dir is not None:
+            tornado.ioloop.PeriodicCallback(
+                self.save_snapshot, METRICS_SNAPSHOT_INTERVAL * 1000
+            ).start()
+
+
+class LoopMonitor:
+    """Measure the IOLoop lag and report the callbacks blocking the IOLoop
+
+    A timer on the IOLoop runs every `interval' seconds and the time it runs
+    late by is the lag, observed in the `loop_lag_seconds' histogram. A lag
+    of `threshold' seconds or more is logged as a slow callback and the
+    `kept' slowest are kept for /metrics/loop.
+
+    The lag alone does not tell what blocked the IOLoop so a watchdog thread
+    checks that the timer keeps running. Once it is `threshold' seconds late
+    the watchdog takes the stack of the IOLoop thread to find the code and
+    the handler stage being run. Only the code objects and line numbers of
+    the frames are read, the local variables of the running thread are not
+    touched. Nothing is added to the request path. The stack cannot be
+    taken while C code holds the GIL for the whole stall, those slow
+    callbacks are reported without a stage.
+
+    metrics <Metrics>: Metrics receiving the lag samples.
+
+    interval <float>: Seconds between each lag sample.
+
+    threshold <float>: Seconds of lag reported as a slow callback.
+
+    kept <int>: Number of the slowest callbacks kept.
+    """
 
-        # Format *some* Python Exception as a string
-        # docs.python.org/3/library/exceptions.html
-        if isinstance(obj, NotImplementedError):
-            return str(obj)
+    def __init__(
+        self,
+        metrics: Metrics,
+        interval: float = LOOP_MONITOR_INTERVAL,
+        threshold: float = SLOW_CALLBACK_THRESHOLD,
+        kept: int = SLOW_CALLBACKS_KEPT,
+    ):
+        self.metrics = metrics
+        self.interval = interval
+        self.threshold = threshold
+        self.kept = kept
+        self.samples = 0
+        self.max_lag = 0.0
+        self.slow_count = 0
+        # Slowest callbacks first
+        self.slow_callbacks = []
+        # IOLoop time the lag timer is expected to run next
+        self.expected = None
+        # Where the IOLoop was found blocked by the watchdog, if it was
+        self.blocked = None
+        self.thread_id = None
+
+    def start(self):
+        """Start sampling the lag of the current IOLoop with the watchdog"""
+        io_loop = tornado.ioloop.IOLoop.current()
+        self.thread_id = threading.get_ident()
+
+        def sample_lag():
+            now = io_loop.time()
+            self.record_lag(max(now - self.expected, 0.0))
+            self.expected = now + self.interval
+            io_loop.call_at(self.expected, sample_lag)
+
+        self.expected = io_loop.time() + self.interval
+        io_loop.call_at(self.expected, sample_lag)
+        threading.Thread(
+            target=self.watch, args=(io_loop,), name="LoopMonitor", daemon=True
+        ).start()
+
+    def watch(self, io_loop: tornado.ioloop.IOLoop):
+        """Take the IOLoop thread stack when the lag timer runs late"""
+        period = min(self.interval, self.threshold) / 2
+        while True:
+            time.sleep(period)
+            expected = self.expected
+            if self.blocked is not None or io_loop.time() - expected < self.threshold:
+                continue
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None and self.expected == expected:
+                self.blocked = self.where(frame)
+
+    @staticmethod
+    def where(frame) -> dict:
+        """Return the handler stage and code location of a stack `frame'
+
+        The stage is the name of the function called by RepeaterHandler.repeat
+        on the way to `frame', None when `frame' is not below `repeat'.
+        """
+        code = frame.f_code
+        location = f"{Path(code.co_filename).name}:{frame.f_lineno} {code.co_name}"
+        repeat, called = RepeaterHandler.repeat.__code__, None
+        while frame is not None:
+            if frame.f_code is repeat:
+                return {"stage": called, "location": location}
+            called = frame.f_code.co_name
+            frame = frame.f_back
+        return {"stage": None, "location": location}
+
+    def record_lag(self, lag: float):
+        """Observe a lag sample and report it when it is a slow callback"""
+        blocked, self.blocked = self.blocked, None
+        self.samples += 1
+        self.max_lag = max(self.max_lag, lag)
+        self.metrics.observe("loop_lag_seconds", "", lag)
+        if lag < self.threshold:
+            return
+        self.slow_count += 1
+        blocked = blocked or {"stage": None, "location": None}
+        slow = dict(lag=round(lag, 6), time=time.time(), **blocked)
+        logging.warning(
+            "IOLoop blocked for %.3f seconds in stage %s at %s",
+            lag,
+            slow["stage"],
+            slow["location"],
+        )
+        self.slow_callbacks.append(slow)
+        self.slow_callbacks.sort(key=lambda slow: slow["lag"], reverse=True)
+        while len(self.slow_callbacks) > self.kept:
+            self.slow_callbacks.pop()
+
+    def stats(self) -> dict:
+        return {
+            "interval": self.interval,
+            "threshold": self.threshold,
+            "samples": self.samples,
+            "max_lag": round(self.max_lag, 6),
+            "slow_count": self.slow_count,
+            "slow_callbacks": self.slow_callbacks,
+        }
+
+
+class MetricsHandler(tornado.web.RequestHandler):
+    """Return the request metrics of all workers in the Prometheus format"""
+
+    def get(self):
+        self.set_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.set_header("Cache-Control", "private, no-store")
+        self.write(self.settings["metrics"].render())
 
-        # Otherwise use the default JSONEncoder
-        return super().default(obj)
 
+class LoopMonitorHandler(tornado.web.RequestHandler):
+    """Return the IOLoop lag and slowest callbacks of this worker as JSON"""
 
+    def get(self):
+        stats = self.settings["loop_monitor"].stats()
+        stats["worker_id"] = self.settings.get("worker_id")
+        self.set_header("Content-Type", "application/json")
+        self.set_header("Cache-Control", "private, no-store")
+        self.write(json_text(stats))
+
+
+@tornado.web.stream_request_body
 class RepeaterHandler(tornado.web.RequestHandler):
-    """Repeat the HTTP request back to the requester"""
+    """Repeat the HTTP request back to the requester
+
+    Request bodies are streamed in through `data_received'. They are joined
+    back together for the response unless `?upload' is used, when each chunk
+    is only counted and hashed as it arrives so memory does not grow with
+    the size of the upload.
+    """
 
     def initialize(self, **kwargs):
-        logging.debug(f"RepeaterHandler.initialize - **kwargs: {kwargs!r}")
+        logging.debug("RepeaterHandler.initialize - **kwargs: %r", kwargs)
+        # Cache key of seeded generated content used as the response body
+        self.content_cache_key = None
+        # Seconds spent in each stage of `repeat' and body bytes flushed
+        self.stage_times = {}
+        self.body_bytes = 0
+        # Request body chunks, or the upload digest with `?upload'
+        self.body_chunks = []
+        self.upload = None
+        self.metrics_recorded = False
+        self.settings["metrics"].in_flight += 1
         self.set_header("Cache-Control", "private, no-store")
         self.set_header("Server", self.settings.get("name"))
+        # Identify the worker process handling the request with --workers
+        if self.settings.get("worker_id") is not None:
+            self.set_header("X-Worker-Id", self.settings.get("worker_id"))
+
+    def prepare(self):
+        """Parse the URL query parameter options once for this request"""
+        name = "RepeaterHandler.prepare"
+        try:
+            self.request_options = self.settings["parse_options"](self.request.query)
+        except OptionsError as err:
+            logging.debug("%s - %s", name, err)
+            self.set_status(400)
+            self.set_header("Content-Type", "text/plain")
+            self.finish(f"{err}{NL}")
+            return
+        logging.debug("%s - request_options: %r", name, self.request_options)
+        # Check a histogram file is usable before the response starts
+        delay = self.request_options.delay
+        if isinstance(delay, DelayDistribution) and delay.file is not None:
+            try:
+                delay.sample(random.Random(), self.settings.get("delay_histogram_dir"))
+            except (OSError, ValueError) as err:
+                logging.debug("%s - %s", name, err)
+                self.set_status(400)
+                self.set_header("Content-Type", "text/plain")
+                self.finish(f"Invalid `delay' option value: {err}{NL}")
+                return
+        try:
+            self.accepted_encoding(strict=True)
+        except NotAcceptable as err:
+            logging.debug("%s - no acceptable encoding: %r", name, str(err))
+            self.set_status(406)
+            self.set_header("Content-Type", "text/plain")
+            self.finish(f"No acceptable content encoding: {err}{NL}")
+            return
+        if self.request_options.upload is not None:
+            self.start_upload(self.request_options.upload)
+
+    def start_upload(self, algorithm: str):
+        """Count and hash the request body instead of keeping it
+
+        algorithm <str>: hashlib algorithm name or "count" for no digest.
+        """
+        self.upload = UploadCounter(None if algorithm == "count" else algorithm)
+        # Uploads are not held in memory so allow them to be larger
+        self.request.connection.set_max_body_size(
+            int(self.settings.get("max_upload_size", MAX_UPLOAD_SIZE))
+        )
+
+    def data_received(self, chunk: bytes):
+        """Count and hash an `?upload' body chunk or keep it for the response"""
+        if self.upload is None:
+            self.body_chunks.append(chunk)
+        else:
+            self.upload.update(chunk)
+
+    def join_request_body(self):
+        """Set the request body and body arguments from the streamed chunks"""
+        if not self.body_chunks:
+            return
+        self.request.body = b"".join(self.body_chunks)
+        self.body_chunks = []
+        # As done by Tornado for request bodies which are not streamed
+        tornado.httputil.parse_body_arguments(
+            self.request.headers.get("Content-Type", ""),
+            self.request.body,
+            self.request.body_arguments,
+            self.request.files,
+            self.request.headers,
+        )
+        for key, values in self.request.body_arguments.items():
+            self.request.arguments.setdefault(key, []).extend(values)
+
+    def flush(self, include_footers: bool = False):
+        """Count the body bytes sent before flushing them"""
+        self.body_bytes += sum(map(len, self._write_buffer))
+        return super().flush(include_footers=include_footers)
+
+    def on_finish(self):
+        self.record_metrics()
+
+    def on_connection_close(self):
+        self.record_metrics()
+
+    def record_metrics(self):
+        """Record this request in the /metrics values once"""
+        if self.metrics_recorded:
+            return
+        self.metrics_recorded = True
+        metrics = self.settings["metrics"]
+        metrics.in_flight -= 1
+        metrics.record_request(
+            self.request.method,
+            self.get_status(),
+            self._headers.get("Content-Encoding", "identity"),
+            self.body_bytes,
+            self.request.request_time(),
+            self.stage_times,
+        )
+
+    def record_stage(self, stage: str, started: float):
+        """Add the time since `started' to the `stage' time of this request"""
+        elapsed = time.perf_counter() - started
+        self.stage_times[stage] = self.stage_times.get(stage, 0.0) + elapsed
 
     # Allowed HTTP methods
     # https://developer.mozilla.org/en-US/docs/Web/HTTP/Methods
@@ -66,22 +1949,25 @@ class RepeaterHandler(tornado.web.RequestHandler):
     async def get(self, **kwargs):
         """Convenience method to self.repeat"""
         name = "RepeaterHandler.get"
-        logging.debug(f"{name} - calling repeat")
+        logging.debug("%s - calling repeat", name)
         await self.repeat(**kwargs)
+        await self.wait_for_first_byte()
 
     # Handle HEAD requests
     async def head(self, **kwargs):
         """Convenience method to self.repeat"""
         name = "RepeaterHandler.head"
-        logging.debug(f"{name} - calling repeat")
+        logging.debug("%s - calling repeat", name)
         await self.repeat(**kwargs)
+        await self.wait_for_first_byte()
 
     # Handle OPTIONS requests
     async def options(self, **kwargs):
         """Convenience method to self.repeat"""
         name = "RepeaterHandler.options"
-        logging.debug(f"{name} - calling repeat")
+        logging.debug("%s - calling repeat", name)
         await self.repeat(**kwargs)
+        await self.wait_for_first_byte()
 
     # Handle PATCH requests
     async def patch(self, **kwargs):
@@ -91,8 +1977,9 @@ class RepeaterHandler(tornado.web.RequestHandler):
     async def post(self, **kwargs):
         """Convenience method to self.repeat"""
         name = "RepeaterHandler.post"
-        logging.debug(f"{name} - calling repeat")
+        logging.debug("%s - calling repeat", name)
         await self.repeat(**kwargs)
+        await self.wait_for_first_byte()
 
     # Handle PUT requests
     async def put(self, **kwargs):
@@ -100,7 +1987,45 @@ class RepeaterHandler(tornado.web.RequestHandler):
 
     # -------------------------------------------------------------------------
 
-    def content_encoding(
+    def accepted_encoding(self, strict: bool = False):
+        """Return the content encoding to use for the response or None
+
+        The URL query `encoding' value is used ahead of the `Accept-Encoding'
+        request header value. Encodings are negotiated by quality value from
+        the encodings in CONTENT_ENCODERS.
+
+        strict <bool>: Raise NotAcceptable instead of returning None when no
+            encoding, including identity, is acceptable. (Default = False)
+        """
+        name = "RepeaterHandler.accepted_encoding"
+
+        from_query_param = self.request_options.encoding
+        logging.debug("%s - URL query `encoding': %r", name, from_query_param)
+
+        from_ae_header = self.request.headers.get("Accept-Encoding", False)
+        logging.debug("%s - `Accept-Encoding': %r", name, from_ae_header)
+
+        # Use the URL query parameter value ahead of the header value
+        accept_encoding = from_query_param or from_ae_header
+        logging.debug("%s - accept_encoding: %r", name, accept_encoding)
+
+        # Early escape if a zero length body or no encoding was specified
+        logging.debug("%s - self.request.method: %r", name, self.request.method)
+        if self.request.method in ["OPTIONS"] or not accept_encoding:
+            return None
+
+        try:
+            encoding = negotiate_encoding(accept_encoding, tuple(CONTENT_ENCODERS))
+        except NotAcceptable:
+            if strict:
+                raise
+            encoding = None
+        logging.debug("%s - encoding: %r", name, encoding)
+        return encoding
+
+    # -------------------------------------------------------------------------
+
+    async def content_encoding(
         self,
         content: str,
         content_as_json: dict = None,
@@ -109,8 +2034,6 @@ class RepeaterHandler(tornado.web.RequestHandler):
     ):
         """Compress content according to the content encoding requested
 
-        Only supports gzip compression currently.
-
         content <str>: Response body content.
 
         content_as_json <dict>: Response body content formatted in a key/value
@@ -124,259 +2047,718 @@ class RepeaterHandler(tornado.web.RequestHandler):
             (Default = False)
 
         See Also:
-        * docs.python.org/3/library/gzip.html
+        * docs.python.org/3/library/zlib.html
         * developer.mozilla.org/en-US/docs/Web/HTTP/Headers/Accept-Encoding
         * developer.mozilla.org/en-US/docs/Glossary/Quality_values
         """
         name = "RepeaterHandler.content_encoding"
 
-        from_query_param = self.request.arguments.get("encoding", False)
-        logging.debug(f"{name} - URL query `encoding': {from_query_param!r}")
-
-        from_ae_header = self.request.headers.get("Accept-Encoding", False)
-        logging.debug(f"{name} - `Accept-Encoding': {from_ae_header!r}")
-
-        # Use the URL query parameter value ahead of the header value
-        accept_encoding = from_query_param or from_ae_header
-        logging.debug(f"{name} - accept_encoding: {accept_encoding!r}")
-
         # Initialize content_as_json as needed
         if content_as_json is None:
             content_as_json = {}
 
-        # Catch no encoding required
-        if not accept_encoding:
+        encoding = self.accepted_encoding()
+        if encoding is None:
+            logging.debug("%s - not encoding content", name)
             return content, content_as_json
 
-        # Use the first value in a list of acceptable encodings
-        if isinstance(accept_encoding, list):
-            accept_encoding = accept_encoding[0]
-            logging.debug(
-                f"{name} - accept_encoding list unpacked: {accept_encoding!r}"
-            )
+        # Add the expected response headers
+        self.set_header("Content-Encoding", encoding)
+        self.set_header("Vary", "Accept-Encoding")
 
-        # Decode bytes to string
-        if isinstance(accept_encoding, bytes):
-            accept_encoding = accept_encoding.decode()
-            logging.debug(
-                f"{name} - accept_encoding bytes decoded: {accept_encoding!r}"
-            )
+        # Escape early when this is only for adding response headers
+        logging.debug("%s - add_headers_only: %s", name, add_headers_only)
+        if add_headers_only:
+            logging.debug("%s - not encoding content yet!", name)
+            return content, content_as_json
 
-        # Early escape if a zero length body or no encoding was specified
-        logging.debug(f"{name} - self.request.method: {self.request.method!r}")
-        if self.request.method in ["OPTIONS"] or not accept_encoding:
-            logging.debug(f"{name} - not encoding content")
+        # Chunked bodies are compressed chunk by chunk as they are written
+        if self.request_options.chunked:
+            logging.debug("%s - encoding ?chunked content per chunk", name)
             return content, content_as_json
 
-        # TODO: sort list for different quality levels (Q values)
-        # https://developer.mozilla.org/en-US/docs/Glossary/Quality_values
-
-        # Process the encodings
-        for encoding in [v.strip() for v in accept_encoding.split(",")]:
-            logging.debug(f"{name} - encoding: {encoding!r}")
-
-            # Handle Q values ---> 'Accept-Encoding: gzip;q=0.5'
-            quality_value = 1  # default when not set
-            if encoding.find(";q=") != -1:
-                quality_value = float(encoding.split(";q=")[-1])
-            logging.debug(f"{name} - quality_value: {quality_value!r}")
-
-            # Handle gzip encoding ---> 'Accept-Encoding: gzip'
-            if encoding.startswith("gzip") and quality_value > 0:
-                # Add the expected response headers
-                self.set_header("Content-Encoding", "gzip")
-                self.set_header("Vary", "Accept-Encoding")
-
-                # Escape early when this is only for adding response headers
-                logging.debug(f"{name} - add_headers_only: {add_headers_only}")
-                if add_headers_only:
-                    logging.debug(f"{name} - not encoding content yet!")
-                    return content, content_as_json
-
-                # Encode the content
-                logging.debug(f"{name} - encoding content with: {encoding!r}")
-
-                # TODO: Allow different compression levels
-                """
-                # Placeholder note for more control over the gzip compression
-                # https://docs.python.org/3/library/zlib.html
-                zlib.compressobj(
-                    level=-1,
-                    method=DEFLATED,
-                    wbits=MAX_WBITS,
-                    memLevel=DEF_MEM_LEVEL,
-                    strategy=Z_DEFAULT_STRATEGY,
-                    zdict,
-                    )
-                gzip_compress = zlib.compressobj(...)
-                content = gzip_compress.compress(str.encode(response))
-                content += gzip_compress.flush()
-                """
+        # Encode the content
+        logging.debug("%s - encoding content with: %r", name, encoding)
 
-                # Handle encoding `content_as_json'
-                logging.debug(f"{name} - `content_as_json' {type(content_as_json)}")
-                logging.debug(
-                    f"{name} - `content_as_json' length with identity: {len(content_as_json or '')}"
-                )
-                if content_as_json:
-                    # Handle converting `content_as_json' to valid JSON
-                    if isinstance(content_as_json, dict):
-                        content_as_json = json.dumps(
-                            content_as_json,
-                            indent=4,
-                            separators=(",", ": "),
-                            sort_keys=True,
-                            cls=JSONEncoderPlus,
-                        )
-                        content_as_json += "\n"  # pretty trailing line break
-                    content_as_json = gzip.compress(content_as_json.encode("utf-8"))
-                logging.debug(
-                    f"{name} - `content_as_json' length with {encoding}: {len(content_as_json or '')}"
+        # Handle encoding `content_as_json'
+        logging.debug("%s - `content_as_json' %s", name, type(content_as_json))
+        logging.debug(
+            "%s - `content_as_json' length with identity: %s",
+            name,
+            len(content_as_json or ""),
+        )
+        if content_as_json:
+            # Handle converting `content_as_json' to valid JSON
+            if isinstance(content_as_json, dict):
+                content_as_json = json_text(
+                    content_as_json, self.request_options.compact
                 )
+            content_as_json = content_as_json.encode("utf-8")
+            content_as_json = await self.settings["offload"].run(
+                len(content_as_json),
+                encode_content,
+                content_as_json,
+                encoding,
+                *self.compression_options(),
+            )
+        logging.debug(
+            "%s - `content_as_json' length with %s: %s",
+            name,
+            encoding,
+            len(content_as_json or ""),
+        )
 
-                # Handle encoding content
-                logging.debug(f"{name} - `content' {type(content)}")
-                logging.debug(
-                    f"{name} - `content' length with identity: {len(content)}"
-                )
-                content = gzip.compress(content.encode("utf-8"))
-                logging.debug(
-                    f"{name} - `content' length with {encoding}: {len(content)}"
-                )
+        # The JSON body is used instead of `content' which is not compressed
+        if content_as_json:
+            return content, content_as_json
 
-                return content, content_as_json
+        # Handle encoding content
+        logging.debug("%s - `content' %s", name, type(content))
+        logging.debug("%s - `content' length with identity: %s", name, len(content))
+        content = await self.compress_content(content, encoding)
+        if self.content_cache_key is not None:
+            self.set_etag(self.content_etag(encoding))
+        logging.debug("%s - `content' length with %s: %s", name, encoding, len(content))
 
-            # Accept-Encoding: compress
-            # TODO: support not implemented yet.
+        return content, content_as_json
 
-            # Accept-Encoding: deflate
-            # TODO: support not implemented yet.
+    # -------------------------------------------------------------------------
+
+    def compression_options(self) -> tuple:
+        """Return the (level, strategy) passed to the content encoders
+
+        The `gzip_level' and `gzip_strategy' URL query parameters are used
+        ahead of the application settings. Only gzip and deflate use them.
+        """
+        level = self.request_options.gzip_level
+        if level is None:
+            level = self.settings.get("gzip_level", GZIP_LEVEL)
+        strategy = self.request_options.gzip_strategy
+        if strategy is None:
+            strategy = self.settings.get("gzip_strategy", GZIP_STRATEGY)
+        return level, strategy
+
+    async def compress_content(self, content, encoding: str) -> bytes:
+        """Return `content' compressed with `encoding'
+
+        Compressed seeded content is served from the content cache when the
+        same (seed, length, fill) content was compressed earlier.
+        """
+        name = "RepeaterHandler.compress_content"
 
-            # Accept-Encoding: br
-            # TODO: support not implemented yet.
+        cache = self.settings.get("content_cache")
+        cache_key = None
+        if cache is not None and self.content_cache_key is not None:
+            cache_key = (
+                self.content_cache_key + (encoding,) + self.compression_options()
+            )
+            cached = cache.get(cache_key)
+            if cached is not None:
+                logging.debug("%s - content cache hit: %r", name, cache_key)
+                return cached
+
+        if isinstance(content, str):
+            content = content.encode("utf-8")
+        # Large content is compressed off the event loop
+        content = await self.settings["offload"].run(
+            len(content),
+            encode_content,
+            content,
+            encoding,
+            *self.compression_options(),
+        )
 
-            # Accept-Encoding: identity
-            # TODO: support not implemented yet.
+        if cache_key is not None:
+            cache.put(cache_key, content)
+        return content
 
-            # Accept-Encoding: *
-            # TODO: support not implemented yet.
+    async def compress_chunks(self, chunks, encoding: str):
+        """Yield `chunks' compressed as they are produced with `encoding'
 
-        # Fail safe return when nothing has matched earlier
-        return content, content_as_json
+        One streaming compressor is used for the whole body, so a chunk may
+        compress to nothing until the compressor has enough input. Large
+        chunks are compressed off the event loop. Chunks are passed through
+        as-is when `encoding' is None.
+        """
+        if encoding is None:
+            async for chunk in iterate_async(chunks):
+                yield chunk
+            return
+        compressor = CONTENT_ENCODERS[encoding](*self.compression_options())
+        offload = self.settings["offload"]
+        async for chunk in iterate_async(chunks):
+            yield await offload.run(len(chunk), compressor.compress, chunk)
+        yield compressor.flush()
 
     # -------------------------------------------------------------------------
 
-    def generate_content(self, **kwargs):
+    async def generate_content(self, **kwargs):
         """Generate random body content
 
         content <str|list>: Passed through when URL query string key `content'
           is not provided in the request.
 
         max_content_length <int>: Maximum number of bytes allowed
-          Default 10240
+          Default is the `max_content_length' application setting (10MiB)
 
         """
         name = "RepeaterHandler.generate_content"
 
-        # Maximum content length allowed, default to 1MiB
-        max_content_length = int(kwargs.get("max_content_length", 10240))
+        # Maximum content length allowed
+        max_content_length = int(
+            kwargs.get(
+                "max_content_length",
+                self.settings.get("max_content_length", MAX_CONTENT_LENGTH),
+            )
+        )
         logging.debug(
-            f"{name} - max_content_length {type(max_content_length)}: {max_content_length!r}"
+            "%s - max_content_length %s: %r",
+            name,
+            type(max_content_length),
+            max_content_length,
         )
 
         # URL query string value syntax:
         # ?content=[<format>:]<int>[&fill=<str>]
-        content_length = self.request.arguments.get("content", False)
-        # Unpack a list of values and use the first value ONLY
-        if isinstance(content_length, list):
-            content_length = content_length[0]
-        if isinstance(content_length, bytes):
-            content_length = content_length.decode()
-        logging.debug(
-            f"{name} - content_length {type(content_length)}: {content_length!r}"
-        )
+        content = self.request_options.content
+        content_length = self.request_options.content_length
+        logging.debug("%s - content: %r", name, content)
 
         # Catch lack of a `content_length' to work with and exit
         # Pass-through `content' as-is or default to an empty list
-        if not content_length:
+        if not content:
             return kwargs.get("content", [])
 
         # TODO: Lipsum
-        if content_length.lower().startswith("lipsum:"):
+        if content.lower().startswith("lipsum:"):
             raise NotImplementedError("...yet")
         # TODO: ASCII ART
-        elif content_length.lower().startswith("ascii:"):
+        elif content.lower().startswith("ascii:"):
             raise NotImplementedError("...yet")
-        else:
-            content_length = int(content_length)
         logging.debug(
-            f"{name} - content_length {type(content_length)}: {content_length!r}"
+            "%s - content_length %s: %r", name, type(content_length), content_length
         )
 
         # Enforce a maximum content limit
         if content_length > max_content_length:
-            logging.debug(f"{name} - content_length too large!")
+            logging.debug("%s - content_length too large!", name)
             content_length = max_content_length
             logging.debug(
-                f"{name} - using max_content_length as content_length: {content_length!r}"
+                "%s - using max_content_length as content_length: %r",
+                name,
+                content_length,
             )
 
         # Fill pattern to use with generating content
-        default_fill_pattern = (
-            "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789 "
-        )
-        fill_pattern = self.request.arguments.get("fill", default_fill_pattern)
-        # Unpack a list of values and use the first value ONLY
-        if isinstance(fill_pattern, list):
-            fill_pattern = fill_pattern[0]
-        if isinstance(fill_pattern, bytes):
-            fill_pattern = fill_pattern.decode()
-        logging.debug(f"{name} - fill_pattern {type(fill_pattern)}: {fill_pattern!r}")
-
-        # List of lines to gather body content
-        generated_content = []
-
-        # Generate random content until content length is correct
-        while len("".join(generated_content)) < content_length:
-            generated_content.append(
-                fill_pattern[random.randint(0, (len(fill_pattern) - 1))]
+        fill_pattern = self.request_options.fill
+        logging.debug("%s - fill_pattern: %r", name, fill_pattern)
+
+        # Seed used to generate the same content for the same request
+        seed = self.request_options.seed
+        logging.debug("%s - seed: %r", name, seed)
+
+        # Large content is generated off the event loop
+        offload = self.settings["offload"]
+
+        # Generate random content in bulk, seeded content may be cached
+        if seed is not None:
+            cache = self.settings.get("content_cache")
+            self.content_cache_key = (seed, content_length, fill_pattern)
+            raw_key = self.content_cache_key + ("identity",)
+            generated_content = None
+            if cache is not None:
+                generated_content = cache.get(raw_key)
+                self.set_header(
+                    "X-Content-Cache", "miss" if generated_content is None else "hit"
+                )
+            if generated_content is None:
+                generated_content = await offload.run(
+                    content_length,
+                    generate_seeded_content,
+                    seed,
+                    0,
+                    content_length,
+                    fill_pattern,
+                )
+                if cache is not None:
+                    cache.put(raw_key, generated_content)
+        else:
+            generated_content = await offload.run(
+                content_length,
+                generate_random_content_in_slices,
+                content_length,
+                fill_pattern,
             )
         logging.debug(
-            f"{name} - generated_content {type(generated_content)}: length={len(generated_content)}"
+            "%s - generated_content %s: length=%s",
+            name,
+            type(generated_content),
+            len(generated_content),
         )
 
-        # TODO: Handle 'Transfer-Encoding: chunked'
+        # Seeded content is the same for every request so it has a validator
+        if fill_translation_table(fill_pattern) is not None:
+            self.set_header("Accept-Ranges", "bytes")
+            if seed is not None:
+                self.set_etag(self.content_etag())
+
+        # Return the generated content
+        return generated_content
+
+    # -------------------------------------------------------------------------
+
+    async def stream_content(self, **kwargs):
+        """Stream random body content in fixed size chunks
+
+        The body is never held in memory as a whole. Each chunk is written and
+        flushed before the next chunk is generated so the client's read rate
+        controls the pace of the response (Tornado flow control).
+
+        When a content encoding is accepted each chunk is passed through a
+        single streaming compressor and the response is sent without Content-Length
+        (chunked transfer encoding) since the compressed size is not known.
+        With `?chunked' each generated chunk is sent as one HTTP/1.1 chunk,
+        or as the compressed piece it produced when encoded.
+
+        chunk_size <int>: Number of bytes generated for each write, before
+          compression.
+          Default is the `chunk_size' option or STREAM_CHUNK_SIZE (64KiB)
+
+        """
+        name = "RepeaterHandler.stream_content"
+
+        chunk_size = int(
+            kwargs.get("chunk_size")
+            or self.request_options.chunk_size
+            or STREAM_CHUNK_SIZE
+        )
+
+        # URL query string value syntax:
+        # ?content=<int>[K|M|G|T]&stream[&fill=<str>]
+        content_length = self.request_options.content_length
+        logging.debug("%s - content_length: %r", name, content_length)
+
+        fill_pattern = self.request_options.fill
+        logging.debug("%s - fill_pattern: %r", name, fill_pattern)
+
+        # Seeded content streams the same bytes as the non-streamed content
+        seed = self.request_options.seed
+        if seed is not None:
+            self.content_cache_key = (seed, content_length, fill_pattern)
+        logging.debug("%s - seed: %r", name, seed)
+
+        # Set some defaults used unless set through request options
+        self.set_header("Content-Type", "text/plain")
+        self.set_header("Cache-Control", "private, no-store")
+        if fill_translation_table(fill_pattern) is not None:
+            self.set_header("Accept-Ranges", "bytes")
+
+        # Compress chunks as they are generated when an encoding is accepted
+        encoding = self.accepted_encoding()
+        if encoding is not None:
+            self.set_header("Content-Encoding", encoding)
+            self.set_header("Vary", "Accept-Encoding")
+        logging.debug("%s - encoding: %r", name, encoding)
+        if seed is not None:
+            self.set_etag(self.content_etag(encoding))
+
+        # Apply the status code and response header options
+        # Multi-byte fill characters make the body longer than `content_length'
+        self.modify_status_code()
+        if (
+            self.get_status() in [200]
+            and encoding is None
+            and not self.request_options.chunked
+            and fill_translation_table(fill_pattern) is not None
+        ):
+            self.set_header("Content-Length", content_length)
+        self.modify_response_headers(content=[])
+
+        # Only include body content with some status codes and methods
+        if self.get_status() not in [200] or self.request.method in [
+            "HEAD",
+            "OPTIONS",
+        ]:
+            logging.debug("%s - not streaming content", name)
+            return
+
+        # Large chunks are generated off the event loop
+        offload = self.settings["offload"]
+
+        async def chunks():
+            for position in range(0, content_length, chunk_size):
+                end = min(position + chunk_size, content_length)
+                chunk = await offload.run(
+                    end - position, self.read_content, position, end
+                )
+                yield bytes(chunk)
+
+        await self.write_chunks(self.compress_chunks(chunks(), encoding))
+
+    async def write_body(self, body: bytes):
+        """Write the complete response `body', streamed when it is paced
+
+        The body is streamed through write_chunks() when ?rate=, ?body_delay=
+        or ?stall_at= is set.
+        """
+        options = self.request_options
+        if not (options.rate or options.body_delay or options.stall_at):
+            self.write(body)
+            return
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        # The length is known up front, the body is not sent chunked
+        self.set_header("Content-Length", len(body))
+        await self.write_chunks(iter_chunks(body, STREAM_CHUNK_SIZE))
+
+    async def write_chunks(self, chunks):
+        """Write and flush each body chunk from `chunks' as it is produced
+
+        Tornado sends each flush as one HTTP/1.1 chunk when the response has
+        no Content-Length. Options used:
+
+          ?chunk_interval=<ms>: Wait between chunks.
+          ?rate=<bytes/s>[&burst=<bytes>]: Trickle the chunks at a rate, each
+            chunk is written in pieces of at most `burst' bytes.
+          ?ttfb=<s>: Send the response headers `ttfb' seconds after the
+            request started.
+          ?body_delay=<s>: Send the response headers then wait.
+          ?stall_at=<offset>:<s>: Wait once `offset' body bytes were sent.
+          ?no_buffering: Add `X-Accel-Buffering: no' to the response headers.
+          ?no_end_of_content: With `?chunked' leave out the terminating chunk
+            and hold the connection open until the client closes it.
+
+        chunks <iterable>: Body bytes to write, empty chunks are skipped. An
+            asynchronous iterable is awaited for each chunk.
+        """
+        name = "RepeaterHandler.write_chunks"
+
+        # Ask nginx (and similar proxies) not to buffer the response
+        # nginx.org/en/docs/http/ngx_http_proxy_module.html#proxy_buffering
+        if self.request_options.no_buffering:
+            self.set_header("X-Accel-Buffering", "no")
+
+        interval = self.request_options.chunk_interval
+        bucket = None
+        if self.request_options.rate:
+            bucket = TokenBucket(self.request_options.rate, self.request_options.burst)
+            self.set_header("X-Rate", f"{bucket.rate} set by query string")
+        stall_at = self.request_options.stall_at
+        if stall_at is not None:
+            self.set_header("X-Stall-At", "{}:{} set by query string".format(*stall_at))
+        body_delay = self.request_options.body_delay
+        if body_delay:
+            self.set_header("X-Body-Delay", f"{body_delay} set by query string")
+        written = 0
+        try:
+            await self.wait_for_first_byte()
+            if body_delay:
+                # Send the response headers ahead of the body
+                await self.flush()
+                await tornado.gen.sleep(body_delay)
+            index = 0
+            async for chunk in iterate_async(chunks):
+                if index and interval:
+                    await tornado.gen.sleep(interval / 1000)
+                index += 1
+                pieces = [chunk] if bucket is None else iter_chunks(chunk, bucket.burst)
+                for piece in pieces:
+                    if stall_at is not None and written + len(piece) > stall_at[0]:
+                        # Send the bytes up to the offset then stall once
+                        head = stall_at[0] - written
+                        self.write(piece[:head])
+                        written += head
+                        await self.flush()
+                        logging.debug("%s - stalled at %r", name, written)
+                        await tornado.gen.sleep(stall_at[1])
+                        piece = piece[head:]
+                        stall_at = None
+                    if bucket is not None:
+                        await bucket.take(len(piece))
+                    if piece:
+                        self.write(piece)
+                        written += len(piece)
+                    # Wait for the piece to be handed off to the socket
+                    await self.flush()
+            if self.request_options.chunked and self.request_options.no_end_of_content:
+                await self.hold_without_end_of_content()
+        except tornado.iostream.StreamClosedError:
+            logging.debug("%s - stream closed after %r bytes", name, written)
+
+    async def wait_for_first_byte(self):
+        """Wait until `?ttfb=' seconds have passed since the request started
+
+        Called before the response headers are first sent. Time spent on
+        `?delay=' and preparing the body counts towards the wait so the first
+        byte is sent as close to `ttfb' seconds as possible.
         """
-        logging.debug(f"{name} - kwargs.get('transfer-encoding'): \
-            {kwargs.get('transfer-encoding')}")
-        if kwargs.get('transfer-encoding') == 'chunked':
-            chunks = []
-            chunk_length = 64
-            # Allow chunk_length to be set by a argument
-            if self.request.arguments.get('chunk_length', False):
-                chunk_length = \
-                    int(self.request.arguments.get('chunk_length', 64)[0])
-            logging.debug(f"generate_content - chunk_length: {chunk_length!r}")
-            for index in range(0, len(output), chunk_length):
-                chunk = ''.join(output[index : index + chunk_length])
-                # length of bytes sent to hexadecimal
-                # remove 0x to uppercase with '\r\n'
-                chunks.append(f"{hex(len(chunk)).replace('0x','').upper()}{CR}{NL}")
-                # data with '\r\n'
-                chunks.append(f"{chunk}{CR}{NL}")
-            # Allow this to contain no end of content for some reason
-            if not self.request.arguments.get('no_end_of_content', False):
-                chunks.append(f"0{CR}{NL}") # end of content
-                chunks.append(f"{CR}{NL}") # end of message
-            # Set the output to the chunks
-            output = chunks
-            # Set X-Accel-Buffering: no (proxy_buffering off)
-            # nginx.org/en/docs/http/ngx_http_proxy_module.html#proxy_buffering
-            self.set_header('X-Accel-Buffering', 'no')
+        ttfb = self.request_options.ttfb
+        if not ttfb or self._headers_written:
+            return
+        self.set_header("X-TTFB", f"{ttfb} set by query string")
+        remaining = ttfb - self.request.request_time()
+        logging.debug("RepeaterHandler.wait_for_first_byte - remaining: %r", remaining)
+        if remaining > 0:
+            await tornado.gen.sleep(remaining)
+
+    async def hold_without_end_of_content(self):
+        """Hold the connection open without sending the terminating chunk
+
+        The client is left waiting for the end of the response until it gives
+        up, or NO_END_OF_CONTENT_HOLD seconds pass and the connection closes.
         """
+        name = "RepeaterHandler.hold_without_end_of_content"
+        logging.debug("%s - holding the connection", name)
+        stream = self.detach()
+        try:
+            await tornado.gen.with_timeout(
+                datetime.timedelta(seconds=NO_END_OF_CONTENT_HOLD),
+                stream.read_until_close(),
+            )
+        except (tornado.iostream.StreamClosedError, tornado.util.TimeoutError):
+            pass
+        finally:
+            stream.close()
+            self.record_metrics()
 
-        # Return the generated content
-        return "".join(generated_content)
+    # -------------------------------------------------------------------------
+
+    def set_etag(self, etag: str):
+        """Set the ETag response header unless `?etag=' overrides it"""
+        self.set_header("Etag", self.request_options.etag or etag)
+
+    def validators(self) -> tuple:
+        """Return the (ETag, Last-Modified) of the response known up front
+
+        Both are derived from the options alone so a conditional request is
+        answered before any body is generated. Seeded content has a strong
+        ETag for each content encoding and was last modified at start up.
+        The `?etag=' and `?last_modified=' options are used ahead of these.
+        """
+        options = self.request_options
+        etag, last_modified = options.etag, options.last_modified
+        if (
+            options.seed is not None
+            and options.content_length
+            and options.status is None
+            and not self.json_requested()
+            and fill_translation_table(options.fill) is not None
+        ):
+            content_length = options.content_length
+            # Streamed content is not limited by the maximum content length
+            if not (options.stream or options.chunked):
+                content_length = min(
+                    content_length,
+                    int(self.settings.get("max_content_length", MAX_CONTENT_LENGTH)),
+                )
+            self.content_cache_key = (options.seed, content_length, options.fill)
+            if etag is None:
+                # Byte ranges are served from the unencoded content, the
+                # whole body is sent encoded when no range will be served
+                etag = self.content_etag()
+                if (
+                    options.chunked
+                    or self.requested_ranges(content_length, etag) is None
+                ):
+                    etag = self.content_etag(self.accepted_encoding())
+            if last_modified is None:
+                last_modified = self.settings.get("last_modified")
+        return etag, last_modified
+
+    def not_modified(self, etag: str = None, last_modified: int = None) -> bool:
+        """Return True when a 304 Not Modified answers this request
+
+        If-None-Match is used ahead of If-Modified-Since as in RFC 9110.
+        Only GET and HEAD requests of a 2xx response are conditional.
+
+        etag <str>: ETag response header value, which must be set already.
+
+        last_modified <int>: Last-Modified epoch seconds of the response.
+        """
+        status = self.request_options.status
+        if self.request.method not in ["GET", "HEAD"] or status not in [None, 200]:
+            return False
+        if "If-None-Match" in self.request.headers:
+            # Tornado only checks If-None-Match for ETags it computes itself
+            return etag is not None and self.check_etag_header()
+        if_modified_since = self.request.headers.get("If-Modified-Since")
+        if last_modified is None or if_modified_since is None:
+            return False
+        try:
+            since = email.utils.parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        return last_modified <= since.timestamp()
+
+    def content_etag(self, encoding: str = None) -> str:
+        """Return a strong ETag for the seeded content of this request
+
+        The ETag is derived from (seed, length, fill) instead of hashing the
+        body which may be too large to hold in memory.
+
+        encoding <str>: Content encoding used for the body or None.
+        """
+        seed, length, fill_pattern = self.content_cache_key
+        key = f"{seed}:{length}:{fill_pattern}"
+        if encoding is not None:
+            key += ":{}:{}:{}".format(encoding, *self.compression_options())
+        return f'"{hashlib.sha1(key.encode("utf-8")).hexdigest()}"'
+
+    def read_content(self, start: int, end: int):
+        """Return bytes `start' to `end' (exclusive) of the generated content
+
+        Seeded content is sliced from the content cache when the whole body
+        is cached or generated straight at the offset otherwise. Unseeded
+        content is random, any bytes will do.
+        """
+        fill_pattern = self.request_options.fill
+        if self.content_cache_key is None:
+            # Sliced so the GIL is released when called on the offload threads
+            return generate_random_content_in_slices(end - start, fill_pattern, random)
+        # Cached bytes can only be sliced at character offsets for single
+        # byte fill characters
+        cache = self.settings.get("content_cache")
+        cached = (
+            cache.peek(self.content_cache_key + ("identity",))
+            if cache is not None and fill_translation_table(fill_pattern) is not None
+            else None
+        )
+        if cached is not None:
+            return memoryview(cached)[start:end]
+        return generate_seeded_content(
+            self.request_options.seed, start, end, fill_pattern
+        )
+
+    def requested_ranges(self, length: int, etag: str = None):
+        """Return the byte ranges requested for a body of `length' bytes
+
+        None is returned when the whole body should be sent: no `Range'
+        request header, an invalid one, or an `If-Range' validator which does
+        not match the current `etag'. An empty list means not satisfiable.
+        """
+        name = "RepeaterHandler.requested_ranges"
+        value = self.request.headers.get("Range")
+        if self.request.method != "GET" or not value:
+            return None
+        logging.debug("%s - Range: %r", name, value)
+        # Only a strong ETag match allows a range, dates never match
+        if_range = self.request.headers.get("If-Range")
+        if if_range is not None and (etag is None or if_range.strip() != etag):
+            logging.debug("%s - If-Range %r does not match %r", name, if_range, etag)
+            return None
+        return parse_byte_ranges(value, length)
+
+    async def write_ranges(self, ranges: list, length: int, read, content_type: str):
+        """Write a 206 (or 416) response for `ranges' of a `length' byte body
+
+        A single range is sent as is, multiple ranges are sent as the parts
+        of a multipart/byteranges body. Bytes are written through
+        write_chunks() in STREAM_CHUNK_SIZE pieces so large ranges are never
+        held in memory.
+
+        ranges <list>: (start, end) offsets from parse_byte_ranges().
+
+        length <int>: Length of the complete body in bytes.
+
+        read <callable>: Called with (start, end) and returns those bytes.
+
+        content_type <str>: Content-Type of the complete body.
+        """
+        name = "RepeaterHandler.write_ranges"
+        logging.debug("%s - ranges: %r", name, ranges)
+
+        # Ranges are served from the unencoded body
+        self.clear_header("Content-Encoding")
+
+        if not ranges:
+            self.set_status(416)
+            self.set_header("Content-Range", f"bytes */{length}")
+            self.set_header("Content-Length", 0)
+            return
+
+        self.set_status(206)
+        if len(ranges) == 1:
+            start, end = ranges[0]
+            self.set_header("Content-Type", content_type)
+            self.set_header("Content-Range", f"bytes {start}-{end - 1}/{length}")
+            self.set_header("Content-Length", end - start)
+            parts = [(b"", start, end)]
+            closing = b""
+        else:
+            boundary = f"{random.getrandbits(64):016x}"
+            self.set_header(
+                "Content-Type", f"multipart/byteranges; boundary={boundary}"
+            )
+            parts = [
+                (
+                    (
+                        f"{CR}{NL}--{boundary}{CR}{NL}"
+                        f"Content-Type: {content_type}{CR}{NL}"
+                        f"Content-Range: bytes {start}-{end - 1}/{length}{CR}{NL}"
+                        f"{CR}{NL}"
+                    ).encode("utf-8"),
+                    start,
+                    end,
+                )
+                for start, end in ranges
+            ]
+            closing = f"{CR}{NL}--{boundary}--{CR}{NL}".encode("utf-8")
+            self.set_header(
+                "Content-Length",
+                sum(len(head) + end - start for head, start, end in parts)
+                + len(closing),
+            )
+
+        def chunks():
+            for head, start, end in parts:
+                yield head
+                for position in range(start, end, STREAM_CHUNK_SIZE):
+                    yield bytes(read(position, min(position + STREAM_CHUNK_SIZE, end)))
+            yield closing
+
+        await self.write_chunks(chunks())
+
+    async def range_content(self) -> bool:
+        """Write the byte ranges requested of `?content=' generated content
+
+        Only the requested bytes are generated. Returns False when the whole
+        body should be sent instead.
+        """
+        name = "RepeaterHandler.range_content"
+
+        content_length = self.request_options.content_length
+        fill_pattern = self.request_options.fill
+        # Streamed content is not limited by the maximum content length
+        if not self.request_options.stream:
+            content_length = min(
+                content_length,
+                int(self.settings.get("max_content_length", MAX_CONTENT_LENGTH)),
+            )
+        # Byte offsets are not character offsets with multi-byte fill patterns
+        if fill_translation_table(fill_pattern) is None:
+            return False
+
+        etag = None
+        if self.request_options.seed is not None:
+            self.content_cache_key = (
+                self.request_options.seed,
+                content_length,
+                fill_pattern,
+            )
+            etag = self.request_options.etag or self.content_etag()
+        ranges = self.requested_ranges(content_length, etag)
+        logging.debug("%s - ranges: %r", name, ranges)
+        if ranges is None:
+            self.content_cache_key = None
+            return False
+
+        self.set_header("Cache-Control", "private, no-store")
+        self.set_header("Accept-Ranges", "bytes")
+        if etag is not None:
+            self.set_header("Etag", etag)
+        self.modify_response_headers(content=[])
+        await self.write_ranges(ranges, content_length, self.read_content, "text/plain")
+        return True
 
     # -------------------------------------------------------------------------
 
@@ -388,17 +2770,12 @@ class RepeaterHandler(tornado.web.RequestHandler):
         """
         name = "RepeaterHandler.prepend_help_text"
 
-        logging.debug(f"{name} - content {type(content)}: length={len(content)}")
+        logging.debug("%s - content %s: length=%s", name, type(content), len(content))
 
-        # Prepend each line in HELP with a comment mark and space ('# ')
-        help_message = []
-        for line in HELP.strip().split("\n"):
-            help_message.append(f"# {line}{NL}")
+        # Prepend the help text, commented once at start up, to the content
+        content = HELP_COMMENTED + content
 
-        # Prepend the help text to the current content
-        content = f"{''.join(help_message)}{NL}{content}"
-
-        logging.debug(f"{name} - content {type(content)}: length={len(content)}")
+        logging.debug("%s - content %s: length=%s", name, type(content), len(content))
 
         return content
 
@@ -407,29 +2784,27 @@ class RepeaterHandler(tornado.web.RequestHandler):
     def modify_status_code(self, **kwargs) -> str:
         """Modify the HTTP status code"""
         name = "RepeaterHandler.modify_status_code"
-        logging.debug(f"{name} - self.get_status(): {self.get_status()!r}")
+        logging.debug("%s - self.get_status(): %r", name, self.get_status())
         logging.debug(
-            f"{name} - match `status' query parameter: {self.request.arguments.get('status', False)!r}"
+            "%s - match `status' query parameter: %r",
+            name,
+            self.request_options.status,
         )
         logging.debug(
-            f"{name} - match `reason' query parameter: {self.request.arguments.get('reason', False)!r}"
+            "%s - match `reason' query parameter: %r",
+            name,
+            self.request_options.reason,
         )
-        if self.request.arguments.get("status", False):
-            new_status = self.request.arguments.get("status")
-            if isinstance(new_status, list):
-                new_status = new_status[0]
-            new_status = int(new_status)
-            logging.debug(f"{name} - new_status: {new_status!r}")
+        if self.request_options.status is not None:
+            new_status = self.request_options.status
+            logging.debug("%s - new_status: %r", name, new_status)
 
             # Allow the reason test to be set
-            if self.request.arguments.get("reason", False):
-                new_reason = self.request.arguments.get("reason")[0]
-            else:
-                new_reason = None
-            logging.debug(f"{name} - new_reason: {new_reason!r}")
+            new_reason = self.request_options.reason
+            logging.debug("%s - new_reason: %r", name, new_reason)
 
             self.set_status(new_status, new_reason)
-            logging.debug(f"{name} - self.get_status(): {self.get_status()!r}")
+            logging.debug("%s - self.get_status(): %r", name, self.get_status())
 
             # Also set a response header noting the change in the status code
             self.set_header("X-Status-Code", f"{new_status} set by query string")
@@ -444,20 +2819,20 @@ class RepeaterHandler(tornado.web.RequestHandler):
         """Modify the HTTP response headers"""
         name = "RepeaterHandler.modify_response_headers"
         logging.debug(
-            f"{name} - match `header' query parameter: {self.request.arguments.get('header', [])!r}"
+            "%s - match `header' query parameter: %r",
+            name,
+            self.request_options.headers,
         )
 
         content = kwargs.get("content", "")
         content_as_json = kwargs.get("content_as_json", False)
 
         # Set or clear response headers as requested
-        for header in self.request.arguments.get("header", []):
-            header = header.decode("utf8").split(":", 1)
-            logging.debug(f"{name} - header: {header!r}")
-            if len(header) == 2 and header[1] != "":
-                self.set_header(*header)
+        for header_name, header_value in self.request_options.headers:
+            if header_value is not None:
+                self.set_header(header_name, header_value)
             else:
-                self.clear_header(header[0])
+                self.clear_header(header_name)
 
         # Append the response header to the response content
         response_headers = []
@@ -478,10 +2853,20 @@ class RepeaterHandler(tornado.web.RequestHandler):
 
     # -------------------------------------------------------------------------
 
-    def prepare_body_text(self, **kwargs) -> str:
-        """Prepare body text content based on the current request"""
+    def json_requested(self) -> bool:
+        """Return True when the response body should be JSON"""
+        return self.request.headers.get("Accept", "").endswith(
+            "/json"
+        ) or self.request.path.endswith(".json")
+
+    async def prepare_body_text(self, **kwargs) -> str:
+        """Prepare body text content based on the current request
+
+        The request is read through one RequestSnapshot shared by the text
+        and JSON renderers. Only the renderer of the requested format runs.
+        """
         name = "RepeaterHandler.prepare_body_text"
-        logging.debug(f"{name} - **kwargs: {kwargs!r}")
+        logging.debug("%s - **kwargs: %r", name, kwargs)
 
         content = kwargs.get("content", [])
 
@@ -489,160 +2874,72 @@ class RepeaterHandler(tornado.web.RequestHandler):
         self.set_header("Content-Type", "text/plain")
         self.set_header("Cache-Control", "private, no-store")
 
+        # Request attributes are read once and only when a renderer needs them
+        snapshot = RequestSnapshot(self.request)
+
         # Collect data to be used instead of text/plain for JSON requests
-        logging.debug(f"{name} - Accept: {self.request.headers.get('Accept', '')}")
+        logging.debug("%s - Accept: %s", name, self.request.headers.get("Accept", ""))
         logging.debug(
-            f"{name} - path.endswith('.json'): {self.request.path.endswith('.json')}"
+            "%s - path.endswith('.json'): %s", name, self.request.path.endswith(".json")
         )
-        if self.request.headers.get("Accept", "").endswith(
-            "/json"
-        ) or self.request.path.endswith(".json"):
+        if self.json_requested():
             self.set_header("Content-Type", "text/json")
-            logging.debug(f"{name} - prepare content as JSON!")
-            content_as_json = {"request": {}, "response": {}}
-        else:
-            logging.debug(f"{name} - prepare content as TEXT!")
-            content_as_json = False
-        logging.debug(
-            f"{name} - content_as_json {type(content_as_json)}: {content_as_json!r}"
-        )
-
-        # Create a separator line
-        separator = "# " + ("=" * 78)
+            logging.debug("%s - prepare content as JSON!", name)
+            content_as_json = {"request": request_json(snapshot), "response": {}}
 
-        # Include A LOT more information with `debug'
-        logging.debug(
-            f"{name} - match `debug' query parameter: {self.request.arguments.get('debug', False)}"
-        )
-        if self.request.arguments.get("debug", False):
-            for key in sorted(
-                [
-                    "arguments",
-                    "body",
-                    "body_arguments",
-                    "cookies",
-                    "files",
-                    "full_url",
-                    "headers",
-                    "host",
-                    "host_name",
-                    "method",
-                    "path",
-                    "protocol",
-                    "query",
-                    "query_arguments",
-                    "remote_ip",
-                    "request_time",
-                    "uri",
-                    "version",
-                ]
-            ):
-                if key in ["full_url", "request_time"]:
-                    value = getattr(self.request, key)()
-                elif key == "headers":
-                    value = [h for h in getattr(self.request, key).get_all()]
-                else:
-                    value = getattr(self.request, key)
-                logging.debug(f"{name} - self.request.{key} {type(value)}: {value!r}")
-                content.append(f"# DEBUG: request.{key} {type(value)}: {value!r}")
-
-        # TODO: this is not very DRY: de-duplicate the following with the above
-        if content_as_json is not False:
-            request = {}
-            for key in sorted(
-                [
-                    "arguments",
-                    "body",
-                    "body_arguments",
-                    "cookies",
-                    "files",
-                    "full_url",
-                    "headers",
-                    "host",
-                    "host_name",
-                    "method",
-                    "path",
-                    "protocol",
-                    "query",
-                    "query_arguments",
-                    "remote_ip",
-                    "request_time",
-                    "uri",
-                    "version",
-                ]
-            ):
-                # Call the function to return the result
-                if key in ["full_url", "request_time"]:
-                    value = getattr(self.request, key)()
-                # Explode the Cookie instance into key/value tuple pairs
-                elif key in ["cookies"]:
-                    value = [(k, v) for k, v in getattr(self.request, key).items()]
-                # Explode the Header instance into key/value tuple pairs
-                elif key == "headers":
-                    value = [h for h in getattr(self.request, key).get_all()]
-                # Use 'body_length' instead of 'body'
-                # since POST/PUT data may be large
-                elif key == "body":
-                    value = len(getattr(self.request, key))
-                    key = "body_length"
-                else:
-                    value = getattr(self.request, key)
-                request[key] = value
-                logging.debug(
-                    f"{name} - content_as_json['request'][{key!r}]: {value!r}"
-                )
-            content_as_json.update(request=request)
+            # Modify the HTTP status code and response headers
+            self.modify_status_code()
+            content_as_json["response"].update(status_code=self.get_status())
+            _, content_as_json = self.modify_response_headers(
+                content=[], content_as_json=content_as_json
+            )
+            logging.debug(
+                "%s - content_as_json %s: length=%s",
+                name,
+                type(content_as_json),
+                len(content_as_json),
+            )
 
-        # Return a pong when asked for a ping
-        logging.debug(
-            f"{name} - match `pong' endpoint: {self.request.path.endswith('/ping')}"
-        )
-        if self.request.path.endswith("/ping"):
-            # return content, content_as_json
-            if content_as_json:
-                return "pong\n", {"ping": "pong"}
-            else:
-                return "pong\n", False
+            # Generated content is not used in the JSON body so it is not
+            # generated, looked up in the content cache or compressed
+            return "", content_as_json
 
-        # Return a message when asked for a hello_world
-        logging.debug(
-            f"{name} - match `hello_world' endpoint: {self.request.path.endswith('/hello_world')}"
-        )
-        if self.request.path.endswith("/hello_world"):
-            # return content, content_as_json
-            if content_as_json:
-                return "Hello, World!\n", {"Hello": "World!"}
-            else:
-                return "Hello, World!\n", False
+        logging.debug("%s - prepare content as TEXT!", name)
 
-        # Return a svg file when asked for a football.svg
-        logging.debug(
-            f"{name} - match `football' endpoint: {self.request.path.endswith('/football.svg')}"
-        )
-        if self.request.path.endswith("/football.svg"):
-            self.set_header("Content-Type", "image/svg+xml")
-            # return content, content_as_json
-            return FOOTBALL_SVG, False
+        # Create a separator line
+        separator = "# " + ("=" * 78)
 
-        logging.debug(f"{name} - content {type(content)}: length={len(content)}")
+        # Include A LOT more information with `debug'
         logging.debug(
-            f"{name} - content_as_json {type(content_as_json)}: length={len(content_as_json or '')}"
+            "%s - match `debug' query parameter: %s",
+            name,
+            self.request_options.debug,
         )
+        if self.request_options.debug:
+            content += request_debug_text(snapshot)
+            # Include the cache counters to help with tuning the cache sizes
+            options_cache = self.settings["parse_options"].cache_info()
+            content.append(f"# DEBUG: options_cache: {options_cache._asdict()!r}")
+            content_cache = self.settings["content_cache"].stats()
+            content.append(f"# DEBUG: content_cache: {content_cache!r}")
+            offload = self.settings["offload"].stats()
+            content.append(f"# DEBUG: offload: {offload!r}")
+            content.append(f"# DEBUG: json_backend: {JSON_BACKEND!r}")
 
         # Include more information with /help or when not `quiet'
-        if self.request.path.endswith("/help") or not self.request.arguments.get(
-            "quiet", False
-        ):
+        if self.request.path.endswith("/help") or not self.request_options.quiet:
             # Include a leading separator
             content.append(separator)
             # Include the time of the request per this moment
-            now = str(datetime.datetime.now(datetime.timezone.utc).isoformat()).rsplit(".", 1)[0]
+            now = str(datetime.datetime.now(datetime.timezone.utc).isoformat()).rsplit(
+                ".", 1
+            )[0]
             content.append(
                 f"# Headers received and returned for this request at: {now} UTC"
             )
             # Note late additions
             content.append(
-                "# NOTE: `Etag' and `Content-Length' response headers are omitted"
+                "# NOTE: `Content-Length' and body computed `Etag' response headers are omitted"
             )
             # Note the use of a downstream proxy
             if self.settings.get("proxied", False):
@@ -657,65 +2954,20 @@ class RepeaterHandler(tornado.web.RequestHandler):
             # Include a line break before the header content
             content.append("")
 
-        # Note some lengths
-        logging.debug(f"{name} - content {type(content)}: length={len(content)}")
-        logging.debug(
-            f"{name} - content_as_json {type(content_as_json)}: length={len(content_as_json or '')}"
-        )
-
-        # Append the request line
-        content.append(
-            f"> {self.request.method} {self.request.uri} {self.request.version}"
-        )
-
-        # Append the request headers to the content
-        # TODO: This is not very DRY: already performed for `content_as_json'
-        request_host_header = None
-        request_headers = []
-        for hdr_name, hdr_value in self.request.headers.get_all():
-            # Always set the Host header first in the list (HTTP/1.0)
-            if hdr_name.lower() == "host":
-                request_host_header = [f"> {hdr_name}: {hdr_value}"]
-            else:
-                request_headers.append(f"> {hdr_name}: {hdr_value}")
-        request_headers = sorted(request_headers)
-        request_headers = request_host_header + request_headers
-        content += request_headers
-        content.append(">")
-
-        # Include POST data provided
-        # TODO: This is not very DRY: already performed for `content_as_json'
-        if self.request.method == "POST":
-            content.append(f"* POST DATA {self.request.body!r}{NL}")
+        # Append the request line, request headers and any POST data
+        content += request_text(snapshot)
+        logging.debug("%s - content %s: length=%s", name, type(content), len(content))
 
         # Modify the HTTP status code
         content.append(self.modify_status_code())
-        if content_as_json:
-            content_as_json["response"].update(status_code=self.get_status())
-        logging.debug(f"{name} - content {type(content)}: length={len(content)}")
-        logging.debug(
-            f"{name} - content_as_json {type(content_as_json)}: length={len(content_as_json or '')}"
-        )
 
         # Modify the HTTP response headers
-        content, content_as_json = self.modify_response_headers(
-            content=content,
-            content_as_json=content_as_json,
-        )
+        content, _ = self.modify_response_headers(content=content)
         content.append("<")
-        logging.debug(
-            f"{name} - content {type(content)}: \
-            length={len(content)}"
-        )
-        logging.debug(
-            f"{name} - content_as_json {type(content_as_json)}: \
-            length={len(content_as_json or '')}"
-        )
+        logging.debug("%s - content %s: length=%s", name, type(content), len(content))
 
         # Include more information with /help or when not `quiet'
-        if self.request.path.endswith("/help") or not self.request.arguments.get(
-            "quiet", False
-        ):
+        if self.request.path.endswith("/help") or not self.request_options.quiet:
             # Include a line break after the header content
             content.append("")
             # Include a trailing separator
@@ -723,10 +2975,7 @@ class RepeaterHandler(tornado.web.RequestHandler):
 
         # Combine all lines with a trailing line break
         content = "\n".join(content) + "\n"
-        logging.debug(f"{name} - content {type(content)}: length={len(content)}")
-        logging.debug(
-            f"{name} - content_as_json {type(content_as_json)}: length={len(content_as_json or '')}"
-        )
+        logging.debug("%s - content %s: length=%s", name, type(content), len(content))
 
         # Include more information with /help
         if self.request.path.endswith("/help"):
@@ -734,37 +2983,48 @@ class RepeaterHandler(tornado.web.RequestHandler):
 
         # Allow for random content of some length to be generated and used
         # instead of the response content generated above
-        content = self.generate_content(content=content)
+        content = await self.generate_content(content=content)
+        logging.debug("%s - content %s: length=%r", name, type(content), len(content))
 
-        logging.debug(f"{name} - content {type(content)}: length={len(content)!r}")
-        logging.debug(
-            f"{name} - content_as_json {type(content_as_json)}: length={len(content_as_json or '')}"
-        )
-
-        return content, content_as_json
+        return content, False
 
     # -------------------------------------------------------------------------
 
     async def delay_response(self, **kwargs):
         """Allow the response to be delayed"""
         name = "RepeaterHandler.delay_response"
-        logging.debug(f"{name} - **kwargs: {kwargs!r}")
+        logging.debug("%s - **kwargs: %r", name, kwargs)
         logging.debug(
-            f"{name} - match `delay' query parameter: {self.request.arguments.get('delay', False)}"
+            "%s - match `delay' query parameter: %s",
+            name,
+            self.request_options.delay,
         )
 
         content = kwargs.get("content", [])
 
-        if self.request.arguments.get("delay", False):
-            delay = self.request.arguments.get("delay")
-            if isinstance(delay, list):
-                delay = delay[0]
-            delay = float(delay)
-            logging.debug(f"{name} - delay for {delay!r}")
-            logging.debug(f"{name} - delay started...")
+        if self.request_options.delay:
+            delay = self.request_options.delay
+            # Sample a delay from the distribution requested
+            if isinstance(delay, DelayDistribution):
+                try:
+                    delay = round(
+                        delay.sample(
+                            self.settings["delay_random"],
+                            self.settings.get("delay_histogram_dir"),
+                        ),
+                        6,
+                    )
+                except (OSError, ValueError) as err:
+                    logging.debug("%s - %s", name, err)
+                    self.set_status(400)
+                    self.set_header("Content-Type", "text/plain")
+                    self.finish(f"Invalid `delay' option value: {err}{NL}")
+                    return content
+            logging.debug("%s - delay for %r", name, delay)
+            logging.debug("%s - delay started...", name)
             # https://www.tornadoweb.org/en/stable/gen.html#tornado.gen.sleep
             await tornado.gen.sleep(delay)
-            logging.debug(f"{name} - delay finished!")
+            logging.debug("%s - delay finished!", name)
             self.set_header("X-Delay", f"{delay} set by query string")
 
         return content
@@ -775,56 +3035,39 @@ class RepeaterHandler(tornado.web.RequestHandler):
         """Set a condition to occur only when a value matches"""
         name = "RepeaterHandler.set_condition"
         logging.debug(
-            f"{name} - match `set' query parameter: {self.request.arguments.get('set', False)}"
+            "%s - match `set' query parameter: %r",
+            name,
+            self.request_options.set_rules,
         )
 
         content = kwargs.get("content", [])
 
-        # Exit early when `set' is not found
-        if not self.request.arguments.get("set", False):
-            return content
+        # Note any `set' options which could not be used
+        for message in self.request_options.messages:
+            content.append(f"# DEBUG {name} - {message}")
+            logging.debug("%s - %s", name, message)
 
         # Multiple `set' key/value pairs may be passed
         # ? set = <condition : value> , <match : value>
-        for set_conditions in self.request.arguments.get("set"):
-            set_conditions = set_conditions.decode().split(",")
-
-            # Each `set_conditions' should have at minimum two items:
-            # a "condition" and a "match": [<condition>, <match>]
-            if len(set_conditions) < 2:
-                message = f"{name} - missing arguments: {set_conditions!r}"
-                content.append(f"# DEBUG {message}")
-                logging.debug(message)
-                continue
-
-            # Match condition should be last in the list
-            # Match condition should be a <key>:<value> pair
-            # Be mindful of IPv6 addresses
-            set_match = set_conditions.pop(-1).split(":", 1)
-            if len(set_match) != 2:
-                logging.debug(f"{name} - `set_match' missing arguments: {set_match!r}")
-                continue
-
+        for set_rule in self.request_options.set_rules:
             # See if we matched
             matched = False
-            set_match_key, set_match_value = set_match
-            logging.debug(f"{name} - set_match_key: {set_match_key!r}")
-            logging.debug(f"{name} - set_match_value: {set_match_value!r}")
+            logging.debug("%s - set_rule: %r", name, set_rule)
 
             # Match the request header Host value
             # ?set=delay:4,status:699,host:my-host-value
             host_hdr = str(self.request.headers.get("host")).lower()
-            if set_match_key.lower() == "host" and host_hdr == set_match_value.lower():
+            if set_rule.match_key == "host" and host_hdr == set_rule.match_value:
                 matched = True
-                logging.debug(f"{name} - matched `host' header: {matched!r}")
+                logging.debug("%s - matched `host' header: %r", name, matched)
 
             # Match the requesting client's IP address
             # ?set=delay:3,status:599,addr:4.68.48.225
-            elif set_match_key.lower() == "addr":
+            elif set_rule.match_key == "addr":
                 # Check the Forwarded request header: `for=<client addr>'
                 # Forwarded: for="4.68.48.225";scheme=https;method=GET
                 forwarded = self.request.headers.get("Forwarded", False)
-                logging.debug(f"{name} - forwarded: {forwarded!r}")
+                logging.debug("%s - forwarded: %r", name, forwarded)
                 if forwarded and forwarded.find("for=") != -1:
                     # Remove double quotes and split at semi colons
                     forwarded = forwarded.replace('"', "").split(";")
@@ -836,126 +3079,348 @@ class RepeaterHandler(tornado.web.RequestHandler):
                     ][0]
                 else:
                     client_addr = self.request.remote_ip
-                logging.debug(f"{name} - client_addr: {client_addr!r}")
+                logging.debug("%s - client_addr: %r", name, client_addr)
                 # Be mindful of IPv6 addresses
-                if client_addr.lower() == set_match_value.lower():
+                if client_addr.lower() == set_rule.match_value:
                     matched = True
-                    logging.debug(f"{name} - matched `addr': {matched!r}")
+                    logging.debug("%s - matched `addr': %r", name, matched)
 
             # Continue to the next `set' as this `set' did not match
-            logging.debug(f"{name} - matched: {matched!r}")
+            logging.debug("%s - matched: %r", name, matched)
             if not matched:
                 continue
 
             # Set the condition on this request as we did match
-            for set_condition in set_conditions:
-                logging.debug(f"{name} - set_condition: {set_condition!r}")
+            self.request_options = self.request_options.replace(
+                **dict(set_rule.conditions)
+            )
+            logging.debug("%s - request_options: %r", name, self.request_options)
 
-                # A `set_condition' should be a <key>:<value> pair
-                # Be mindful of IPv6 addresses
-                set_condition = set_condition.split(":", 1)
-                if len(set_condition) != 2:
-                    logging.debug(
-                        f"{name} - `set_condition' missing arguments: {set_condition!r}"
-                    )
-                    continue
+        return content
 
-                set_condition_key, set_condition_value = set_condition
-                self.request.arguments[set_condition_key] = set_condition_value
-                logging.debug(
-                    f"{name} - self.request.arguments[{set_condition_key!r}]: \
-                    {self.request.arguments.get(set_condition_key)!r}"
-                )
+    # -------------------------------------------------------------------------
 
-        return content
+    def set_options_headers(self):
+        """Set a generally accepted set of OPTIONS response headers"""
+        self.set_header("Access-Control-Allow-Origin", "*")
+        self.set_header("Access-Control-Allow-Methods", "GET,HEAD,OPTIONS")
+        self.set_header("Access-Control-Allow-Headers", "Origin,Range")
+        self.set_header(
+            "Access-Control-Expose-Headers", "Cache-Control,Date,Expires,Server"
+        )
+        self.set_header("Access-Control-Max-Age", "60")
+        self.set_header("Content-Type", "text/plain")
+
+    # -------------------------------------------------------------------------
+
+    def static_response(self):
+        """Return the StaticResponse for a static endpoint or None
+
+        Static endpoints are matched by the end of the URL path:
+        /ping, /hello_world and /football.svg
+        """
+        path = self.request.path
+        for suffix in ("/ping", "/hello_world", "/football.svg"):
+            if path.endswith(suffix):
+                as_json = self.request.headers.get("Accept", "").endswith("/json")
+                return self.settings["static_responses"][(suffix, as_json)]
+        return None
+
+    async def write_static_response(self, static: StaticResponse):
+        """Write a StaticResponse in the accepted content encoding
+
+        The body, Content-Length and ETag were all computed at start up.
+        Byte ranges are sliced from the unencoded body.
+        """
+        name = "RepeaterHandler.write_static_response"
+
+        self.set_header("Content-Type", static.content_type)
+        self.set_header("Cache-Control", "private, no-store")
+        self.set_header("Accept-Ranges", "bytes")
+
+        # Do not include body content with some request methods
+        if self.request.method == "OPTIONS":
+            self.set_options_headers()
+            self.write("")
+            return
+
+        encoding = self.accepted_encoding() or "identity"
+        logging.debug("%s - encoding: %r", name, encoding)
+        if encoding != "identity":
+            self.set_header("Content-Encoding", encoding)
+            self.set_header("Vary", "Accept-Encoding")
+
+        body = static.bodies.get(encoding)
+        etag = static.etags.get(encoding)
+        # Compress again when the request asks for other gzip options or for
+        # an encoding registered after the static responses were built
+        server_options = (
+            self.settings.get("gzip_level", GZIP_LEVEL),
+            self.settings.get("gzip_strategy", GZIP_STRATEGY),
+        )
+        if body is None or (
+            encoding != "identity" and self.compression_options() != server_options
+        ):
+            body = encode_content(
+                static.bodies["identity"], encoding, *self.compression_options()
+            )
+            etag = f'"{hashlib.sha1(body).hexdigest()}"'
+        self.set_etag(etag)
+        last_modified = self.request_options.last_modified or static.last_modified
+        self.set_header(
+            "Last-Modified", tornado.httputil.format_timestamp(last_modified)
+        )
+        if self.not_modified(self._headers["Etag"], last_modified):
+            self.set_status(304)
+            return
+        # Serve the byte ranges requested of the unencoded body
+        identity = static.bodies["identity"]
+        identity_etag = self.request_options.etag or static.etags["identity"]
+        ranges = self.requested_ranges(len(identity), identity_etag)
+        if ranges is not None:
+            self.set_etag(static.etags["identity"])
+            await self.write_ranges(
+                ranges,
+                len(identity),
+                lambda start, end: memoryview(identity)[start:end],
+                static.content_type,
+            )
+            return
+        # Set Content-Length
+        if self.request.method == "HEAD":
+            self.set_header("Content-Length", len(body))
+        else:
+            await self.write_body(body)
+
+    def write_upload_summary(self):
+        """Write the byte count, digest and throughput of an `?upload' body"""
+        summary = self.upload.summary()
+        logging.debug("RepeaterHandler.write_upload_summary - %r", summary)
+        self.modify_status_code()
+        self.modify_response_headers(content=[])
+        if self.json_requested():
+            self.set_header("Content-Type", "text/json")
+            self.write(json_text({"upload": summary}, self.request_options.compact))
+        else:
+            self.set_header("Content-Type", "text/plain")
+            self.write(
+                "".join(
+                    f"* UPLOAD {key}: {value}{NL}" for key, value in summary.items()
+                )
+            )
 
     # -------------------------------------------------------------------------
 
     async def repeat(self, **kwargs):
         """Repeat the request made in the response body"""
         name = "RepeaterHandler.repeat"
-        logging.debug(f"{name} - **kwargs: {kwargs!r}")
+        logging.debug("%s - **kwargs: %r", name, kwargs)
+
+        # Put the streamed request body back together for the response
+        self.join_request_body()
 
         # Always start with an empty content list
         # Weird issue seen that content was not initiated clean per a request
         content = []
-        logging.debug(f"{name} - content {type(content)}: length={len(content)!r}")
+        logging.debug("%s - content %s: length=%r", name, type(content), len(content))
 
         # Allow a condition to only be set for a matching condition
+        started = time.perf_counter()
         content = self.set_condition(content=content)
-        logging.debug(f"{name} - content {type(content)}: length={len(content)!r}")
+        self.record_stage("set_condition", started)
+        logging.debug("%s - content %s: length=%r", name, type(content), len(content))
 
         # Allow the response to be delayed
+        started = time.perf_counter()
         content = await self.delay_response(content=content)
-        logging.debug(f"{name} - content {type(content)}: length={len(content)!r}")
+        self.record_stage("delay_response", started)
+        if self._finished:
+            return
+        logging.debug("%s - content %s: length=%r", name, type(content), len(content))
+
+        # Reply with the upload digest instead of the request details
+        if self.upload is not None:
+            started = time.perf_counter()
+            self.write_upload_summary()
+            self.record_stage("write", started)
+            return
+
+        # Serve static endpoints from bytes built at start up
+        static = self.static_response()
+        if static is not None:
+            logging.debug("%s - static response: %r", name, static.content_type)
+            started = time.perf_counter()
+            await self.write_static_response(static)
+            self.record_stage("write", started)
+            return
+
+        # Answer conditional requests before any body is built
+        etag, last_modified = self.validators()
+        if etag is not None:
+            self.set_header("Etag", etag)
+        if last_modified is not None:
+            self.set_header(
+                "Last-Modified", tornado.httputil.format_timestamp(last_modified)
+            )
+        if self.not_modified(etag, last_modified):
+            logging.debug("%s - not modified: %r %r", name, etag, last_modified)
+            self.set_status(304)
+            return
+
+        # Serve the byte ranges requested of generated content
+        started = time.perf_counter()
+        if (
+            self.request_options.content_length
+            and self.request_options.status is None
+            and not self.request_options.chunked
+            and not self.json_requested()
+            and await self.range_content()
+        ):
+            logging.debug("%s - byte ranges served", name)
+            self.record_stage("write", started)
+            return
+
+        # Stream generated content instead of building the response body
+        if (
+            self.request_options.stream or self.request_options.chunked
+        ) and self.request_options.content_length:
+            logging.debug("%s - streaming content", name)
+            started = time.perf_counter()
+            await self.stream_content()
+            self.record_stage("write", started)
+            return
 
         # Include encoding response headers in the content as requested
-        content, content_as_json = self.content_encoding(
+        started = time.perf_counter()
+        content, content_as_json = await self.content_encoding(
             content=content, add_headers_only=True
         )
+        self.record_stage("content_encoding", started)
+        logging.debug("%s - content %s: length=%r", name, type(content), len(content))
         logging.debug(
-            f"{name} - content {type(content)}: \
-            length={len(content)!r}"
-        )
-        logging.debug(
-            f"{name} - content_as_json {type(content_as_json)}: \
-            length={len(content_as_json or '')!r}"
+            "%s - content_as_json %s: length=%r",
+            name,
+            type(content_as_json),
+            len(content_as_json or ""),
         )
 
         # Prepare the body content for the response
         # `content_as_json' may be ignored as input at this point
         # since `prepare_body_text' will set it accordingly
-        content, content_as_json = self.prepare_body_text(content=content)
-        logging.debug(f"{name} - content {type(content)}: length={len(content)!r}")
+        started = time.perf_counter()
+        content, content_as_json = await self.prepare_body_text(content=content)
+        self.record_stage("prepare_body_text", started)
+        logging.debug("%s - content %s: length=%r", name, type(content), len(content))
         logging.debug(
-            f"{name} - content_as_json {type(content_as_json)}: length={len(content_as_json or '')!r}"
+            "%s - content_as_json %s: length=%r",
+            name,
+            type(content_as_json),
+            len(content_as_json or ""),
         )
 
         # Encode the content as requested
-        content, content_as_json = self.content_encoding(
+        started = time.perf_counter()
+        content, content_as_json = await self.content_encoding(
             content=content, content_as_json=content_as_json
         )
-        logging.debug(f"{name} - content {type(content)}: length={len(content)!r}")
+        self.record_stage("content_encoding", started)
+        logging.debug("%s - content %s: length=%r", name, type(content), len(content))
         logging.debug(
-            f"{name} - content_as_json {type(content_as_json)}: length={len(content_as_json or '')!r}"
+            "%s - content_as_json %s: length=%r",
+            name,
+            type(content_as_json),
+            len(content_as_json or ""),
         )
 
         # Only include body content with some status codes
+        started = time.perf_counter()
         if self.get_status() in [200]:
             # Handle converting `content_as_json' to valid JSON
             if isinstance(content_as_json, dict):
                 logging.debug(
-                    f"{name} - content_as_json \
-                    {type(content_as_json)}: encoding as JSON"
+                    "%s - content_as_json %s: encoding as JSON",
+                    name,
+                    type(content_as_json),
                 )
-                content_as_json = json.dumps(
-                    content_as_json,
-                    indent=4,
-                    separators=(",", ": "),
-                    sort_keys=True,
-                    cls=JSONEncoderPlus,
+                content_as_json = json_text(
+                    content_as_json, self.request_options.compact
                 )
-                content_as_json += "\n"  # trailing line break
             # Use `content_as_json' if this is not empty or False
             if content_as_json:
-                logging.debug(f"{name} - using `content_as_json' as response `content'")
+                logging.debug(
+                    "%s - using `content_as_json' as response `content'", name
+                )
                 content = content_as_json
             # Do not include body content with some request methods
             if self.request.method == "OPTIONS":
-                self.set_header("Access-Control-Allow-Origin", "*")
-                self.set_header("Access-Control-Allow-Methods", "GET,HEAD,OPTIONS")
-                self.set_header("Access-Control-Allow-Headers", "Origin,Range")
-                self.set_header(
-                    "Access-Control-Expose-Headers", "Cache-Control,Date,Expires,Server"
-                )
-                self.set_header("Access-Control-Max-Age", "60")
-                self.set_header("Content-Type", "text/plain")
+                self.set_options_headers()
                 self.write("")
-            # Set Content-Length
+            # Tornado only checks If-None-Match for ETags it computes itself
+            elif (
+                self.request.method in ["GET", "HEAD"]
+                and "Etag" in self._headers
+                and self.check_etag_header()
+            ):
+                self.set_status(304)
+            # Set Content-Length, the length of chunked bodies is not known
             elif self.request.method == "HEAD":
-                self.set_header("Content-Length", len(content))
+                if not self.request_options.chunked:
+                    self.set_header("Content-Length", len(content))
+            # Send the body as HTTP/1.1 chunks of `chunk_size' bytes before
+            # compression, each compressed piece is sent as it is produced
+            elif self.request_options.chunked:
+                if isinstance(content, str):
+                    content = content.encode("utf-8")
+                chunk_size = self.request_options.chunk_size or STREAM_CHUNK_SIZE
+                await self.write_chunks(
+                    self.compress_chunks(
+                        iter_chunks(content, chunk_size), self.accepted_encoding()
+                    )
+                )
             else:
-                self.write(content)
+                await self.write_body(content)
+        self.record_stage("write", started)
+
+
+class SinkHandler(RepeaterHandler):
+    """Discard PUT and POST bodies and reply with the ingestion throughput
+
+    The body is only counted as it arrives, or hashed too with `?upload=',
+    and the response is the same summary as `?upload'. With `?read_rate='
+    the next chunk is not read until the previous one is paid for, so the
+    client sees backpressure through the TCP window.
+    """
+
+    SUPPORTED_METHODS = ("POST", "PUT")
+
+    def initialize(self, **kwargs):
+        super().initialize(**kwargs)
+        self.read_bucket = None
+
+    def prepare(self):
+        super().prepare()
+        if self._finished:
+            return
+        if self.upload is None:
+            self.start_upload("count")
+        read_rate = self.request_options.read_rate
+        if read_rate is not None:
+            self.set_header("X-Read-Rate", f"{read_rate} set by query string")
+            self.read_bucket = TokenBucket(read_rate, self.request_options.burst)
+
+    def data_received(self, chunk: bytes):
+        """Count the chunk, waiting to read more with `?read_rate='"""
+        super().data_received(chunk)
+        if self.read_bucket is not None:
+            return self.read_bucket.take(len(chunk))
+
+    # Handle POST requests
+    async def post(self, **kwargs):
+        self.write_upload_summary()
+
+    # Handle PUT requests
+    async def put(self, **kwargs):
+        self.write_upload_summary()
 
 
 def make_app(**kwargs):
@@ -963,56 +3428,240 @@ def make_app(**kwargs):
     # tornado.web.Application settings
     # www.tornadoweb.org/en/stable/web.html#tornado.web.Application.settings
     name = "make_app"
-    logging.debug(f"{name} - **kwargs: {kwargs!r}")
+    logging.debug("%s - **kwargs: %r", name, kwargs)
 
     # tornado.web.Application routes
     # www.tornadoweb.org/en/stable/web.html#application-configuration
     routes = kwargs.get(
         "routes",
         [
+            (r"/metrics/loop", LoopMonitorHandler),
+            (r"/metrics", MetricsHandler),
+            (r".*/sink", SinkHandler),
             (r"/.*", RepeaterHandler),
         ],
     )
-    logging.debug(f"{name} - tornado.web.Application routes: {routes!r}")
+    logging.debug("%s - tornado.web.Application routes: %r", name, routes)
+
+    # Last-Modified of the static and seeded generated content
+    started = int(time.time())
+
+    # Request metrics shared with the IOLoop lag monitor
+    metrics = Metrics(kwargs.get("metrics_dir"), kwargs.get("worker_id"))
 
     # tornado.web.Application settings
     # www.tornadoweb.org/en/stable/web.html#tornado.web.Application.settings
     app = tornado.web.Application(
         routes,
-        autoreload=kwargs.get("debug", False),
+        autoreload=kwargs.get("autoreload", kwargs.get("debug", False)),
         debug=kwargs.get("debug", False),
         compress_response=kwargs.get("compress_response", False),
         allow_ipv6=kwargs.get("allow_ipv6", True),
         name=kwargs.get("name", "Python/Tornado"),
         proxied=kwargs.get("proxied", False),
+        max_content_length=int(kwargs.get("max_content_length") or MAX_CONTENT_LENGTH),
+        max_upload_size=int(kwargs.get("max_upload_size") or MAX_UPLOAD_SIZE),
+        parse_options=functools.lru_cache(
+            maxsize=int(kwargs.get("options_cache_size", OPTIONS_CACHE_SIZE))
+        )(parse_query_options),
+        gzip_level=int(kwargs.get("gzip_level", GZIP_LEVEL)),
+        gzip_strategy=kwargs.get("gzip_strategy", GZIP_STRATEGY),
+        static_responses=build_static_responses(
+            gzip_level=int(kwargs.get("gzip_level", GZIP_LEVEL)),
+            gzip_strategy=kwargs.get("gzip_strategy", GZIP_STRATEGY),
+            last_modified=started,
+        ),
+        # Generated content is only ever modified by starting again
+        last_modified=started,
+        content_cache=ContentCache(
+            kwargs.get("content_cache_size", CONTENT_CACHE_SIZE)
+        ),
+        offload=OffloadExecutor(
+            kwargs.get("offload_workers", OFFLOAD_WORKERS),
+            kwargs.get("offload_threshold", OFFLOAD_THRESHOLD),
+        ),
+        delay_random=delay_random(kwargs.get("delay_seed"), kwargs.get("worker_id")),
+        delay_histogram_dir=kwargs.get("delay_histograms"),
+        metrics=metrics,
+        loop_monitor=LoopMonitor(
+            metrics,
+            float(kwargs.get("loop_monitor_interval") or LOOP_MONITOR_INTERVAL),
+            float(kwargs.get("slow_callback_threshold") or SLOW_CALLBACK_THRESHOLD),
+        ),
         version=kwargs.get("version", "0.0.0a"),
+        worker_id=kwargs.get("worker_id"),
     )
-    logging.debug(f"{name} - tornado.web.Application app: {app!r}")
+    logging.debug("%s - tornado.web.Application app: %r", name, app)
 
     return app
 
 
-def main(*args, **kwargs):
-    """Run a Tornado application server"""
-    name = "main"
-    logging.debug(f"{name} - *args: {args!r}")
-    logging.debug(f"{name} - **kwargs: {kwargs!r}")
+def serve(sockets: list, **kwargs):
+    """Run a Tornado HTTP server on `sockets' until SIGTERM or SIGINT
+
+    sockets <list>: Listening sockets from `tornado.netutil.bind_sockets'.
+
+    Remaining keyword arguments are passed to `make_app'.
+    """
+    name = "serve"
 
     # tornado.web.Application settings
     # www.tornadoweb.org/en/stable/web.html#tornado.web.Application.settings
     app = make_app(**kwargs)
-    logging.debug(f"{name} - tornado.web.Application app: {app!r}")
+    logging.debug("%s - tornado.web.Application app: %r", name, app)
 
     # tornado.httpserver.HTTPServer
     # https://www.tornadoweb.org/en/stable/httpserver.html#http-server
     # https://www.tornadoweb.org/en/stable/tcpserver.html
     server = tornado.httpserver.HTTPServer(app)
+    server.add_sockets(sockets)
+
+    io_loop = tornado.ioloop.IOLoop.current()
+
+    # Sample the IOLoop lag and share the metrics with the other workers
+    app.settings["metrics"].start()
+    app.settings["loop_monitor"].start()
+
+    async def shutdown():
+        """Stop accepting connections, close open connections and stop"""
+        logging.debug("%s - shutting down worker: %r", name, kwargs.get("worker_id"))
+        server.stop()
+        await server.close_all_connections()
+        io_loop.stop()
+
+    def on_signal():
+        io_loop.add_callback(shutdown)
+
+    # Shutdown cleanly when asked to terminate
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        io_loop.asyncio_loop.add_signal_handler(signum, on_signal)
+
+    io_loop.start()
+
+
+def supervise(workers: int, start_worker):
+    """Fork `workers' child processes and restart any that exit
+
+    SIGTERM and SIGINT received by the parent are passed along to every child
+    and the parent returns once all children have exited.
+
+    workers <int>: Number of worker processes to keep running.
+
+    start_worker <callable>: Called in each child with a worker id between
+        0 and `workers' - 1. The child exits when this returns.
+    """
+    name = "supervise"
+
+    children = {}  # pid -> (worker_id, started)
+    stopping = False
+
+    def spawn(worker_id: int):
+        pid = os.fork()
+        if pid == 0:
+            # Child process: restore the default signal handling
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            exit_code = 0
+            try:
+                start_worker(worker_id)
+            except Exception:
+                logging.exception("%s - worker %s failed", name, worker_id)
+                exit_code = 1
+            finally:
+                os._exit(exit_code)
+        logging.debug("%s - started worker %s pid %s", name, worker_id, pid)
+        children[pid] = (worker_id, time.monotonic())
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for worker_id in range(workers):
+        spawn(worker_id)
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        if pid not in children:
+            continue
+        worker_id, started = children.pop(pid)
+        if stopping:
+            logging.debug("%s - worker %s pid %s stopped", name, worker_id, pid)
+            continue
+        logging.warning(
+            "Worker %s (pid %s) exited with status %s, restarting",
+            worker_id,
+            pid,
+            status,
+        )
+        # Avoid a tight restart loop when a worker fails on start up
+        if time.monotonic() - started < 1:
+            time.sleep(1)
+        if not stopping:
+            spawn(worker_id)
+
+
+def main(*args, **kwargs):
+    """Run a Tornado application server"""
+    name = "main"
+    logging.debug("%s - *args: %r", name, args)
+    logging.debug("%s - **kwargs: %r", name, kwargs)
+
     address = kwargs.get("address")
     port = int(kwargs.get("port", 8888))
-    server.listen(port, address=address)
+
+    # Number of worker processes, 0 for one per CPU
+    workers = int(kwargs.get("workers") or 1)
+    if kwargs.get("workers") == 0:
+        workers = tornado.process.cpu_count()
+    logging.debug("%s - workers: %r", name, workers)
+
+    logging.info("Started listening at http://%s:%s/", address or "127.0.0.1", port)
+
+    # A single process server
+    if workers == 1:
+        serve(tornado.netutil.bind_sockets(port, address=address), **kwargs)
+        logging.info("Stopped listening at http://%s:%s/", address or "127.0.0.1", port)
+        return
+
+    # Autoreload does not work with multiple processes
+    kwargs.update(autoreload=False)
+
+    # Each worker saves its metrics here for /metrics to add them all up
+    metrics_dir = tempfile.mkdtemp(prefix="mock-http-origin-metrics-")
+    kwargs.update(metrics_dir=metrics_dir)
+
+    # Each worker binds its own socket with SO_REUSEPORT so the kernel spreads
+    # new connections across workers, otherwise all workers share one socket
+    reuse_port = hasattr(socket, "SO_REUSEPORT")
+    shared_sockets = tornado.netutil.bind_sockets(
+        port, address=address, reuse_port=reuse_port
+    )
+    if reuse_port:
+        # Only bound to fail early when the port is not available
+        for sock in shared_sockets:
+            sock.close()
+
+    def start_worker(worker_id: int):
+        sockets = shared_sockets
+        if reuse_port:
+            sockets = tornado.netutil.bind_sockets(
+                port, address=address, reuse_port=True
+            )
+        serve(sockets, worker_id=worker_id, **kwargs)
+
     try:
-        logging.info(f"Started listening at http://{address or '127.0.0.1'}:{port}/")
-        server.start(1)
-        tornado.ioloop.IOLoop.current().start()
-    except KeyboardInterrupt:
-        logging.info(f"Stopped listening at http://{address or '127.0.0.1'}:{port}/")
+        supervise(workers, start_worker)
+    finally:
+        shutil.rmtree(metrics_dir, ignore_errors=True)
+    logging.info("Stopped listening at http://%s:%s/", address or "127.0.0.1", port)
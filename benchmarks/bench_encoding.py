@@ -0,0 +1,112 @@
+"""Measure compression ratio against CPU cost for each content encoding
+
+Requests are dispatched straight to the application with a fake connection,
+the same way as bench_logging.py, so the `Accept-Encoding' negotiation and
+the response compression are measured through the real request path. Each
+encoding available (gzip, deflate and br/zstd when installed) is compared to
+identity for the same URLs:
+
+  python3 benchmarks/bench_encoding.py
+  python3 benchmarks/bench_encoding.py --gzip-level 1 --requests 200
+"""
+
+import argparse
+import asyncio
+import logging
+import sys
+import time
+
+from pathlib import Path
+
+# Append the root directory of this application to system path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app import CONTENT_ENCODERS, make_app  # noqa: E402
+from bench_logging import FakeConnection, dispatch  # noqa: E402
+
+URLS = [
+    "/bench/default?content=64K",
+    "/bench/default?content=64K&fill=abcdefgh",
+    "/bench/default.json?debug",
+]
+
+
+class CountingConnection(FakeConnection):
+    """FakeConnection counting the response body bytes written"""
+
+    def __init__(self):
+        super().__init__()
+        self.body_bytes = 0
+
+    def write_headers(self, start_line, headers, chunk=None):
+        self.body_bytes += len(chunk or b"")
+        return super().write_headers(start_line, headers, chunk)
+
+    def write(self, chunk):
+        self.body_bytes += len(chunk)
+        return super().write(chunk)
+
+
+async def fetch(app, url: str, encoding: str) -> int:
+    """Dispatch one GET request for `url' to `app' and return the body bytes"""
+    connection = CountingConnection()
+    dispatch(
+        app,
+        connection,
+        url,
+        {"Host": "bench", "Accept": "*/*", "Accept-Encoding": encoding},
+    )
+    await connection.done
+    return connection.body_bytes
+
+
+async def run(app, url: str, encoding: str, requests: int) -> tuple:
+    """Return (CPU seconds per request, mean body bytes) for `requests' fetches"""
+    body_bytes = 0
+    start = time.process_time()
+    for _ in range(requests):
+        body_bytes += await fetch(app, url, encoding)
+    return (time.process_time() - start) / requests, body_bytes / requests
+
+
+async def main(argv):
+    app = make_app(
+        name="bench", gzip_level=argv.gzip_level, gzip_strategy=argv.gzip_strategy
+    )
+    print(f"gzip level: {argv.gzip_level}, gzip strategy: {argv.gzip_strategy}")
+    for url in URLS:
+        print(url)
+        baseline = None
+        for encoding in ["identity", *CONTENT_ENCODERS]:
+            # Warm up before measuring
+            await run(app, url, encoding, 10)
+            # Report the best of a few runs to reduce noise from other processes
+            cpu, size = min(
+                [
+                    await run(app, url, encoding, argv.requests)
+                    for _ in range(argv.repeat)
+                ]
+            )
+            if baseline is None:
+                baseline = (cpu, size)
+            print(
+                f"  {encoding:<10} {cpu * 1000:>8.3f} ms/request"
+                f" {cpu * 1000 - baseline[0] * 1000:>+8.3f} ms"
+                f" {size:>10.0f} bytes {size / baseline[1]:>7.1%}"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--gzip-level", type=int, default=6)
+    parser.add_argument("--gzip-strategy", default="default")
+    argv = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, stream=sys.stderr)
+    logging.getLogger("tornado.access").setLevel(logging.WARNING)
+
+    asyncio.run(main(argv))
@@ -0,0 +1,115 @@
+"""Compare the JSON rendering variants of the JSON response bodies
+
+The JSON content of a `?debug' request is serialized with each variant on
+its own, then whole requests are dispatched straight to the application with
+a fake connection, the same way as bench_logging.py, with and without
+`?compact'. orjson and ujson are compared when installed:
+
+  python3 benchmarks/bench_json.py
+  python3 benchmarks/bench_json.py --number 5000
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import sys
+import time
+
+from pathlib import Path
+
+# Append the root directory of this application to system path
+sys.path.append(str(Path(__file__).parent.parent))
+
+import app  # noqa: E402
+from bench_logging import FakeConnection, dispatch  # noqa: E402
+from bench_stages import make_handler  # noqa: E402
+
+URL = "/bench/default.json?debug&a=1&b=2&c=3"
+
+HEADERS = {"Accept": "application/json", "Cookie": "session=abc; theme=dark"}
+
+
+def variants() -> dict:
+    """Return the serializers to compare by name"""
+    found = {
+        "pretty (json, indent=4, sort_keys)": lambda content: app.json_text(content),
+        "compact (json)": lambda content: json.dumps(
+            content, separators=(",", ":"), default=app.json_default
+        ),
+    }
+    if app.orjson is not None:
+        found["compact (orjson)"] = lambda content: app.orjson.dumps(
+            content, default=app.json_default
+        ).decode("utf-8")
+    if app.ujson is not None:
+        found["compact (ujson)"] = lambda content: app.ujson.dumps(
+            content, ensure_ascii=False, escape_forward_slashes=False
+        )
+    return found
+
+
+def best(function, content: dict, number: int, repeat: int) -> float:
+    """Return the best seconds per `function(content)' call of `repeat' runs"""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            function(content)
+        timings.append((time.perf_counter() - started) / number)
+    return min(timings)
+
+
+async def fetch(application, url: str):
+    """Dispatch one GET request for `url' to `application'"""
+    connection = FakeConnection()
+    dispatch(application, connection, url, {"Host": "bench", **HEADERS})
+    await connection.done
+
+
+async def main(argv):
+    application = app.make_app(name="bench")
+    handler = make_handler(application, URL, HEADERS)
+    _, content = await handler.prepare_body_text(content=[])
+
+    print(
+        f"serializing the JSON content of {URL} (compact backend: {app.JSON_BACKEND})"
+    )
+    for name, serialize in variants().items():
+        seconds = best(serialize, content, argv.number, argv.repeat)
+        print(f"  {name:<36} {seconds * 1e6:>10.3f} us")
+
+    # The request arguments as Tornado holds them, lists of bytes values
+    raw = {"arguments": handler.request.arguments, "headers": list(HEADERS.items())}
+    seconds = best(app.json_text, raw, argv.number, argv.repeat)
+    print(f"  {'bytes values via default hook':<36} {seconds * 1e6:>10.3f} us")
+    seconds = best(app.json_text, app.json_native(raw), argv.number, argv.repeat)
+    print(f"  {'bytes values converted up front':<36} {seconds * 1e6:>10.3f} us")
+
+    print("whole requests")
+    for url in [URL, URL + "&compact"]:
+        # Warm up before measuring
+        for _ in range(10):
+            await fetch(application, url)
+        timings = []
+        for _ in range(argv.repeat):
+            started = time.perf_counter()
+            for _ in range(argv.requests):
+                await fetch(application, url)
+            timings.append((time.perf_counter() - started) / argv.requests)
+        print(f"  {url:<50} {min(timings) * 1e6:>10.3f} us/request")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument("--number", type=int, default=2000)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=3)
+    argv = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, stream=sys.stderr)
+    logging.getLogger("tornado.access").setLevel(logging.WARNING)
+
+    asyncio.run(main(argv))
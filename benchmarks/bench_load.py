@@ -0,0 +1,219 @@
+"""Drive a running origin with concurrent keep-alive connections
+
+Unlike bench_logging.py and bench_encoding.py this goes through real sockets
+so the HTTP server, the response writes and the kernel are all included.
+Each scenario of the matrix below is run for `--duration' seconds over
+`--concurrency' HTTP/1.1 keep-alive connections and the requests/sec,
+latency percentiles and body bytes/sec are printed as JSON for tracking the
+origin throughput across releases on the same hardware:
+
+  python3 ./cli.py --workers 0 &
+  python3 benchmarks/bench_load.py
+  python3 benchmarks/bench_load.py --concurrency 200 --duration 10 --output run.json
+  python3 benchmarks/bench_load.py --scenario ping --scenario content-1M-gzip
+
+The load generator is a single process, give it a CPU of its own or measure
+an origin running on another host with `--url'.
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import platform
+import sys
+import time
+import urllib.parse
+
+CONTENT_SIZES = ["1K", "64K", "1M", "10M"]
+
+ENCODINGS = ["identity", "gzip"]
+
+
+def scenarios() -> list:
+    """Return the matrix of (name, path, request headers) to measure"""
+    matrix = [
+        ("ping", "/bench/ping", {}),
+        ("quiet", "/bench/default?quiet", {}),
+        ("text", "/bench/default", {}),
+        ("json", "/bench/default", {"Accept": "application/json"}),
+        ("debug-text", "/bench/default?debug", {}),
+        ("debug-json", "/bench/default?debug", {"Accept": "application/json"}),
+    ]
+    for size in CONTENT_SIZES:
+        for encoding in ENCODINGS:
+            matrix.append(
+                (
+                    f"content-{size}-{encoding}",
+                    f"/bench/default?content={size}",
+                    {"Accept-Encoding": encoding},
+                )
+            )
+    return matrix
+
+
+class Connection:
+    """A HTTP/1.1 keep-alive connection reading just enough of responses"""
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+
+    async def open(self):
+        self.reader, self.writer = await asyncio.open_connection(
+            self.host, self.port, limit=1 << 20
+        )
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+    async def request(self, path: str, headers: dict) -> tuple:
+        """Send a GET request for `path' and return (status, body bytes, headers)"""
+        if self.writer is None:
+            await self.open()
+        lines = [f"GET {path} HTTP/1.1", f"Host: {self.host}:{self.port}"]
+        lines += [f"{name}: {value}" for name, value in headers.items()]
+        self.writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+
+        head = await self.reader.readuntil(b"\r\n\r\n")
+        status_line, *header_lines = head.decode("latin-1").split("\r\n")
+        status = int(status_line.split(" ", 2)[1])
+        response_headers = {}
+        for line in header_lines:
+            if line:
+                name, _, value = line.partition(":")
+                response_headers[name.strip().lower()] = value.strip()
+
+        body_bytes = 0
+        if "content-length" in response_headers:
+            body_bytes = int(response_headers["content-length"])
+            await self.reader.readexactly(body_bytes)
+        elif response_headers.get("transfer-encoding") == "chunked":
+            while True:
+                size = int((await self.reader.readline()).split(b";")[0], 16)
+                await self.reader.readexactly(size + 2)
+                body_bytes += size
+                if size == 0:
+                    break
+        if response_headers.get("connection", "").lower() == "close":
+            self.close()
+        return status, body_bytes, response_headers
+
+
+def percentile(latencies: list, fraction: float) -> float:
+    """Return the nearest-rank percentile of sorted `latencies' in ms"""
+    if not latencies:
+        return None
+    index = min(len(latencies) - 1, max(0, math.ceil(fraction * len(latencies)) - 1))
+    return round(latencies[index] * 1000, 3)
+
+
+async def run_scenario(argv, path: str, headers: dict) -> dict:
+    """Run one scenario over `argv.concurrency' connections"""
+    url = urllib.parse.urlsplit(argv.url)
+    path = url.path.rstrip("/") + path
+    latencies = []
+    statuses = {}
+    totals = {"bytes": 0, "errors": 0, "server": None}
+
+    async def client(deadline: float, record: bool):
+        connection = Connection(url.hostname, url.port or 80)
+        try:
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                try:
+                    status, body_bytes, response_headers = await connection.request(
+                        path, headers
+                    )
+                except (OSError, ValueError, asyncio.IncompleteReadError):
+                    connection.close()
+                    if record:
+                        totals["errors"] += 1
+                    continue
+                if record:
+                    latencies.append(time.perf_counter() - start)
+                    statuses[status] = statuses.get(status, 0) + 1
+                    totals["bytes"] += body_bytes
+                    totals["server"] = response_headers.get("server")
+        finally:
+            connection.close()
+
+    # Warm up connections and caches before measuring
+    if argv.warmup > 0:
+        deadline = time.perf_counter() + argv.warmup
+        await asyncio.gather(
+            *[client(deadline, False) for _ in range(argv.concurrency)]
+        )
+
+    start = time.perf_counter()
+    deadline = start + argv.duration
+    await asyncio.gather(*[client(deadline, True) for _ in range(argv.concurrency)])
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "path": path,
+        "headers": headers,
+        "requests": len(latencies),
+        "errors": totals["errors"],
+        "statuses": {str(status): count for status, count in sorted(statuses.items())},
+        "rps": round(len(latencies) / elapsed, 1),
+        "latency_ms": {
+            "p50": percentile(latencies, 0.50),
+            "p99": percentile(latencies, 0.99),
+            "p999": percentile(latencies, 0.999),
+            "max": percentile(latencies, 1.0),
+        },
+        "bytes_per_sec": round(totals["bytes"] / elapsed),
+        "server": totals["server"],
+    }
+
+
+async def main(argv) -> dict:
+    selected = [
+        scenario
+        for scenario in scenarios()
+        if not argv.scenario or scenario[0] in argv.scenario
+    ]
+    if not selected:
+        raise SystemExit(f"No scenario matches: {', '.join(argv.scenario)}")
+    report = {
+        "url": argv.url,
+        "concurrency": argv.concurrency,
+        "duration": argv.duration,
+        "started": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "scenarios": {},
+    }
+    for name, path, headers in selected:
+        print(f"running {name} ...", file=sys.stderr)
+        report["scenarios"][name] = await run_scenario(argv, path, headers)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument("--url", default="http://127.0.0.1:8888")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--warmup", type=float, default=1.0)
+    parser.add_argument(
+        "--scenario",
+        action="append",
+        help="run only the named scenarios: "
+        + ", ".join(name for name, _, _ in scenarios()),
+    )
+    parser.add_argument("--output", help="write the JSON report to a file")
+    argv = parser.parse_args()
+
+    report = json.dumps(asyncio.run(main(argv)), indent=4)
+    if argv.output:
+        with open(argv.output, "w") as file:
+            file.write(report + "\n")
+    print(report)
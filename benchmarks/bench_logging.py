@@ -0,0 +1,116 @@
+"""Measure requests/sec through the full request path at a given log level
+
+Requests are dispatched straight to the application with a fake connection
+so the HTTP client and sockets do not hide the cost of the handler itself.
+Debug logging in the request path should cost next to nothing when the log
+level is above DEBUG. Run this before and after changes to the logging calls:
+
+  python3 benchmarks/bench_logging.py
+  python3 benchmarks/bench_logging.py --level DEBUG --requests 2000
+"""
+
+import argparse
+import asyncio
+import logging
+import sys
+import time
+
+from pathlib import Path
+
+import tornado.httputil
+
+# Append the root directory of this application to system path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app import make_app  # noqa: E402
+
+URLS = [
+    "/bench/default",
+    "/bench/default?quiet",
+    "/bench/default?debug",
+    "/bench/default.json",
+    "/bench/ping",
+    "/bench/default?content=1024&encoding=gzip",
+]
+
+
+class FakeConnection:
+    """Just enough of tornado.httputil.HTTPConnection to complete a request"""
+
+    def __init__(self):
+        self.done = asyncio.get_running_loop().create_future()
+
+    def set_close_callback(self, callback):
+        pass
+
+    def _resolved(self):
+        future = asyncio.get_running_loop().create_future()
+        future.set_result(None)
+        return future
+
+    def write_headers(self, start_line, headers, chunk=None):
+        return self._resolved()
+
+    def write(self, chunk):
+        return self._resolved()
+
+    def finish(self):
+        self.done.set_result(None)
+
+
+def dispatch(app, connection, url: str, headers: dict):
+    """Start a GET request for `url' on `app' as the HTTP server would
+
+    The request goes through the connection delegate interface rather than
+    `app(request)' so handlers streaming the request body get it too.
+    """
+    delegate = app.start_request(None, connection)
+    delegate.headers_received(
+        tornado.httputil.RequestStartLine("GET", url, "HTTP/1.1"),
+        tornado.httputil.HTTPHeaders(headers),
+    )
+    delegate.finish()
+
+
+async def fetch(app, url: str):
+    """Dispatch one GET request for `url' to `app'"""
+    connection = FakeConnection()
+    dispatch(app, connection, url, {"Host": "bench", "Accept": "*/*"})
+    await connection.done
+
+
+async def run(app, url: str, requests: int) -> float:
+    """Return requests/sec for `requests' sequential fetches of `url'"""
+    start = time.perf_counter()
+    for _ in range(requests):
+        await fetch(app, url)
+    return requests / (time.perf_counter() - start)
+
+
+async def main(argv):
+    app = make_app(name="bench")
+    print(f"log level: {argv.level}")
+    for url in URLS:
+        # Warm up before measuring
+        await run(app, url, 100)
+        # Report the best of a few runs to reduce noise from other processes
+        rps = max([await run(app, url, argv.requests) for _ in range(argv.repeat)])
+        print(f"{url:<45} {rps:>10.1f} requests/sec")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--level", default="WARNING")
+    argv = parser.parse_args()
+
+    # Keep a handler attached so the log level check is the only cost
+    logging.basicConfig(level=getattr(logging, argv.level), stream=sys.stderr)
+    if argv.level == "DEBUG":
+        logging.getLogger().handlers[0].setStream(open("/dev/null", "w"))
+    logging.getLogger("tornado.access").setLevel(logging.WARNING)
+
+    asyncio.run(main(argv))
@@ -0,0 +1,225 @@
+"""Time each RepeaterHandler stage on its own against a stored baseline
+
+Every case builds a handler for a fake request, the same way as
+bench_logging.py, and times only the one stage being measured. Times are
+also given relative to a fixed pure Python calibration loop so a baseline
+recorded on one host can be compared on another. A case more than
+`--threshold' slower than the baseline fails the run, as does generated
+content costing more per byte as it grows (a quadratic loop):
+
+  python3 benchmarks/bench_stages.py
+  python3 benchmarks/bench_stages.py --output stages.json
+  python3 benchmarks/bench_stages.py --update-baseline
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import sys
+import time
+
+from pathlib import Path
+
+import tornado.httputil
+
+# Append the root directory of this application to system path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app import RepeaterHandler, json_text, make_app  # noqa: E402
+from bench_logging import FakeConnection  # noqa: E402
+
+BASELINE = Path(__file__).parent / "baseline_stages.json"
+
+JSON = {"Accept": "application/json"}
+
+GZIP = {"Accept-Encoding": "gzip"}
+
+
+async def set_condition(handler):
+    handler.set_condition(content=[])
+
+
+async def generate_content(handler):
+    await handler.generate_content(content=[])
+
+
+async def content_encoding_headers(handler):
+    await handler.content_encoding(content=[], add_headers_only=True)
+
+
+async def content_encoding(handler):
+    content, content_as_json = await handler.prepare_body_text(content=[])
+    started = time.perf_counter()
+    await handler.content_encoding(content=content, content_as_json=content_as_json)
+    return time.perf_counter() - started
+
+
+async def prepare_body_text(handler):
+    await handler.prepare_body_text(content=[])
+
+
+async def modify_response_headers(handler):
+    handler.modify_response_headers(content=[])
+
+
+async def serialize_json(handler):
+    _, content_as_json = await handler.prepare_body_text(content=[])
+    started = time.perf_counter()
+    json_text(content_as_json)
+    return time.perf_counter() - started
+
+
+# (name, stage, URL, request headers)
+CASES = [
+    ("set_condition", set_condition, "/bench/default?set=status:599,host:bench", {}),
+    ("generate_content-64K", generate_content, "/bench/default?content=64K", {}),
+    ("generate_content-1M", generate_content, "/bench/default?content=1M", {}),
+    ("content_encoding-headers", content_encoding_headers, "/bench/default", GZIP),
+    ("content_encoding-gzip", content_encoding, "/bench/default?debug", GZIP),
+    ("prepare_body_text", prepare_body_text, "/bench/default", {}),
+    ("prepare_body_text-debug", prepare_body_text, "/bench/default?debug", {}),
+    ("prepare_body_text-json", prepare_body_text, "/bench/default?debug", JSON),
+    (
+        "modify_response_headers",
+        modify_response_headers,
+        "/bench/default?header=X-One:1&header=X-Two:2",
+        {},
+    ),
+    ("serialize_json", serialize_json, "/bench/default?debug", JSON),
+]
+
+# Cases of one stage at two sizes which should cost the same per byte
+SCALING = [("generate_content-64K", 65536, "generate_content-1M", 1048576)]
+
+
+def calibrate(loops: int = 50000) -> float:
+    """Return the best seconds taken by a fixed pure Python loop"""
+    best = None
+    for _ in range(5):
+        started = time.perf_counter()
+        total = 0
+        for i in range(loops):
+            total += i % 7
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def make_handler(app, url: str, headers: dict) -> RepeaterHandler:
+    """Return a handler prepared for a GET request of `url'"""
+    request = tornado.httputil.HTTPServerRequest(
+        method="GET",
+        uri=url,
+        version="HTTP/1.1",
+        headers=tornado.httputil.HTTPHeaders({"Host": "bench", **headers}),
+        connection=FakeConnection(),
+    )
+    handler = RepeaterHandler(app, request)
+    handler.prepare()
+    return handler
+
+
+async def measure(app, stage, url: str, headers: dict, number: int) -> float:
+    """Return the seconds per call of `stage' over `number' fresh handlers"""
+    total = 0.0
+    for _ in range(number):
+        handler = make_handler(app, url, headers)
+        started = time.perf_counter()
+        elapsed = await stage(handler)
+        total += elapsed if elapsed is not None else time.perf_counter() - started
+    return total / number
+
+
+async def main(argv) -> int:
+    app = make_app(name="bench", offload_workers=0, content_cache_size=0)
+    calibration = calibrate()
+    timings = {}
+    for name, stage, url, headers in CASES:
+        # Warm up before measuring
+        await measure(app, stage, url, headers, 5)
+        # Keep the best of a few runs to reduce noise from other processes
+        # and calibrate again in between as the CPU speed may change
+        timings[name] = min(
+            [
+                await measure(app, stage, url, headers, argv.number)
+                for _ in range(argv.repeat)
+            ]
+        )
+        calibration = min(calibration, calibrate())
+    results = {
+        name: {
+            "url": url,
+            "headers": headers,
+            "us": round(timings[name] * 1e6, 3),
+            "relative": round(timings[name] / calibration, 6),
+        }
+        for name, _, url, headers in CASES
+    }
+
+    report = {
+        "python": sys.version.split()[0],
+        "calibration_us": round(calibration * 1e6, 3),
+        "results": results,
+    }
+    text = json.dumps(report, indent=4) + "\n"
+    print(text, end="")
+    if argv.output:
+        Path(argv.output).write_text(text)
+
+    if argv.update_baseline:
+        BASELINE.write_text(text)
+        print(f"baseline updated: {BASELINE}", file=sys.stderr)
+        return 0
+
+    failures = []
+    for small, small_bytes, large, large_bytes in SCALING:
+        per_byte_small = results[small]["relative"] / small_bytes
+        per_byte_large = results[large]["relative"] / large_bytes
+        if per_byte_large > per_byte_small * (1 + argv.threshold) * 2:
+            failures.append(
+                f"{large}: {per_byte_large / per_byte_small:.1f}x the cost per byte of {small}"
+            )
+    if BASELINE.exists():
+        baseline = json.loads(BASELINE.read_text())["results"]
+        for name, result in results.items():
+            if name not in baseline:
+                continue
+            ratio = result["relative"] / baseline[name]["relative"]
+            print(
+                f"{name:<26} {result['us']:>12.3f} us {ratio:>7.2f}x", file=sys.stderr
+            )
+            if ratio > 1 + argv.threshold:
+                failures.append(f"{name}: {ratio:.2f}x the baseline")
+    else:
+        print(f"no baseline to compare with: {BASELINE}", file=sys.stderr)
+
+    for failure in failures:
+        print(f"FAIL {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument("--number", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.5,
+        help="fail when a case is this fraction slower than the baseline",
+    )
+    parser.add_argument("--output", help="write the JSON results to a file")
+    parser.add_argument(
+        "--update-baseline",
+        action="store_true",
+        help=f"store the results as the new baseline in {BASELINE.name}",
+    )
+    argv = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, stream=sys.stderr)
+    logging.getLogger("tornado.access").setLevel(logging.WARNING)
+
+    sys.exit(asyncio.run(main(argv)))
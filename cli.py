@@ -2,7 +2,20 @@ import argparse
 import logging
 import sys
 
-from app import main
+from app import (
+    CONTENT_CACHE_SIZE,
+    GZIP_LEVEL,
+    GZIP_STRATEGIES,
+    GZIP_STRATEGY,
+    LOOP_MONITOR_INTERVAL,
+    MAX_CONTENT_LENGTH,
+    MAX_UPLOAD_SIZE,
+    OFFLOAD_THRESHOLD,
+    OFFLOAD_WORKERS,
+    OPTIONS_CACHE_SIZE,
+    SLOW_CALLBACK_THRESHOLD,
+    main,
+)
 
 __version__ = "0.12.1a"
 
@@ -16,6 +29,7 @@ Run the program:
 
   python3 ./cli.py --debug
   python3 ./cli.py -v --port 8888 --proxied
+  python3 ./cli.py --workers 0
 
   curl -i http://127.0.0.1:8888/help
 """
@@ -39,6 +53,13 @@ if __name__ == "__main__":
         default=8888,
         help="set the port to listen for HTTP traffic (default: 8888)",
     )
+    parser.add_argument(
+        "--workers",
+        metavar="<int>",
+        type=int,
+        default=1,
+        help="set the number of worker processes, 0 for one per CPU (default: 1)",
+    )
     parser.add_argument(
         "--name",
         metavar="<str>",
@@ -46,6 +67,90 @@ if __name__ == "__main__":
         help=f'set the application "name" used in logging \
                and Server response header (default: {DEFAULT_NAME!r})',
     )
+    parser.add_argument(
+        "--max-content-length",
+        metavar="<int>",
+        type=int,
+        default=MAX_CONTENT_LENGTH,
+        help=f"set the maximum bytes generated by ?content= (default: {MAX_CONTENT_LENGTH})",
+    )
+    parser.add_argument(
+        "--max-upload-size",
+        metavar="<int>",
+        type=int,
+        default=MAX_UPLOAD_SIZE,
+        help=f"set the maximum request body bytes read with ?upload (default: {MAX_UPLOAD_SIZE})",
+    )
+    parser.add_argument(
+        "--content-cache-size",
+        metavar="<int>",
+        type=int,
+        default=CONTENT_CACHE_SIZE,
+        help=f"set the bytes allowed in the ?seed= content cache, 0 to disable (default: {CONTENT_CACHE_SIZE})",
+    )
+    parser.add_argument(
+        "--options-cache-size",
+        metavar="<int>",
+        type=int,
+        default=OPTIONS_CACHE_SIZE,
+        help=f"set the number of parsed query strings cached, 0 to disable (default: {OPTIONS_CACHE_SIZE})",
+    )
+    parser.add_argument(
+        "--offload-workers",
+        metavar="<int>",
+        type=int,
+        default=OFFLOAD_WORKERS,
+        help=f"set the threads used to generate and compress large bodies, 0 to disable (default: {OFFLOAD_WORKERS})",
+    )
+    parser.add_argument(
+        "--offload-threshold",
+        metavar="<int>",
+        type=int,
+        default=OFFLOAD_THRESHOLD,
+        help=f"set the body bytes at or above which work leaves the event loop (default: {OFFLOAD_THRESHOLD})",
+    )
+    parser.add_argument(
+        "--delay-seed",
+        metavar="<int>",
+        type=int,
+        default=None,
+        help="seed the ?delay=dist: samples so a run repeats the same delays (default: None)",
+    )
+    parser.add_argument(
+        "--delay-histograms",
+        metavar="<dir>",
+        default=None,
+        help="set the directory of histogram files used by ?delay=dist:empirical (default: None)",
+    )
+    parser.add_argument(
+        "--gzip-level",
+        metavar="<int>",
+        type=int,
+        choices=range(0, 10),
+        default=GZIP_LEVEL,
+        help=f"set the gzip compression level 0-9 (default: {GZIP_LEVEL})",
+    )
+    parser.add_argument(
+        "--gzip-strategy",
+        metavar="<str>",
+        choices=list(GZIP_STRATEGIES),
+        default=GZIP_STRATEGY,
+        help=f"set the gzip compression strategy (default: {GZIP_STRATEGY!r})",
+    )
+    parser.add_argument(
+        "--loop-monitor-interval",
+        metavar="<float>",
+        type=float,
+        default=LOOP_MONITOR_INTERVAL,
+        help=f"set the seconds between each IOLoop lag sample (default: {LOOP_MONITOR_INTERVAL})",
+    )
+    parser.add_argument(
+        "--slow-callback-threshold",
+        metavar="<float>",
+        type=float,
+        default=SLOW_CALLBACK_THRESHOLD,
+        help=f"set the seconds of IOLoop lag logged as a slow callback (default: {SLOW_CALLBACK_THRESHOLD})",
+    )
     parser.add_argument(
         "--proxied",
         action="store_true",
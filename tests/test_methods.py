@@ -54,3 +54,14 @@ class TestRepeaterHandler(AsyncHTTPTestCase):
     @pytest.mark.xfail(reason='TRACE not supported')
     def test_HTTP_method_TRACE(self):
         response = self.fetch('/', method='TRACE')
+
+
+## https://www.tornadoweb.org/en/stable/testing.html
+class TestRepeaterHandler_WorkerId(AsyncHTTPTestCase):
+    def get_app(self):
+        return make_app(debug=True, autoreload=False, worker_id=3)
+
+    def test_HTTP_method_GET_worker_id(self):
+        response = self.fetch('/', method='GET')
+        self.assertEqual(response.code, 200)
+        self.assertEqual(response.headers.get('X-Worker-Id'), '3')
@@ -1,5 +1,8 @@
+import asyncio
 import json
 import sys
+import tempfile
+import time
 from pathlib import Path
 
 import pytest
@@ -10,7 +13,7 @@ from tornado.testing import AsyncHTTPTestCase
 # Append the root directory of this application to system path
 sys.path.append(str(Path(__file__).parent.parent))
 
-from app import make_app
+from app import LoopMonitorHandler, Metrics, MetricsHandler, RepeaterHandler, make_app
 
 
 ## https://www.tornadoweb.org/en/stable/testing.html
@@ -115,6 +118,29 @@ class TestRepeaterHandler_FootballPaths(AsyncHTTPTestCase):
         assert boilerplate is True
 
 
+    def test_HTTP_method_GET_with_Range(self):
+        svg = (Path(__file__).parent.parent / 'football.svg').read_bytes()
+        response = self.fetch('/test/football.svg',
+            method='GET',
+            headers={'Accept-Encoding': 'gzip', 'Range': 'bytes=100-199'},
+            decompress_response=False,
+            )
+        assert response.code == 206
+        assert response.headers.get('Content-Range') == 'bytes 100-199/1384'
+        assert response.headers.get('Content-Encoding') is None
+        assert response.headers.get('Content-Type') == 'image/svg+xml'
+        assert response.body == svg[100:200]
+
+
+    def test_HTTP_method_GET_with_Range_not_satisfiable(self):
+        response = self.fetch('/test/football.svg',
+            method='GET',
+            headers={'Range': 'bytes=2000-'},
+            )
+        assert response.code == 416
+        assert response.headers.get('Content-Range') == 'bytes */1384'
+
+
 ## https://www.tornadoweb.org/en/stable/testing.html
 class TestRepeaterHandler_HelpPaths(AsyncHTTPTestCase):
     def get_app(self):
@@ -275,6 +301,42 @@ class TestRepeaterHandler_PingPaths(AsyncHTTPTestCase):
         assert boilerplate is True
 
 
+    def test_HTTP_method_GET_JSON(self):
+        response = self.fetch('/test/ping',
+            method='GET',
+            headers={'Accept': 'text/json', 'Accept-Encoding': 'identity'},
+            )
+        assert response.code == 200
+        assert response.headers.get('Content-Type') == 'text/json'
+        assert json.loads(response.body.decode()) == {'ping': 'pong'}
+
+
+    def test_HTTP_method_GET_ETag(self):
+        identity = self.fetch('/test/ping',
+            method='GET',
+            headers={'Accept-Encoding': 'identity'},
+            decompress_response=False,
+            )
+        gzip = self.fetch('/test/ping',
+            method='HEAD',
+            headers={'Accept-Encoding': 'gzip'},
+            decompress_response=False,
+            )
+        assert identity.headers.get('Etag').startswith('"')
+        assert identity.headers.get('Etag') != gzip.headers.get('Etag')
+        assert int(gzip.headers.get('Content-Length')) > len(b'pong\n')
+        response = self.fetch('/test/ping',
+            method='GET',
+            headers={
+                'Accept-Encoding': 'identity',
+                'If-None-Match': identity.headers.get('Etag'),
+            },
+            decompress_response=False,
+            )
+        assert response.code == 304
+        assert response.body == b''
+
+
 ## https://www.tornadoweb.org/en/stable/testing.html
 class TestRepeaterHandler_HelloWorldPaths(AsyncHTTPTestCase):
     def get_app(self):
@@ -635,3 +697,173 @@ class TestRepeaterHandler_DefaultPaths(AsyncHTTPTestCase):
             )
         boilerplate = self.boilerplate(response, code=200, method='POST')
         assert boilerplate is True
+
+
+## https://www.tornadoweb.org/en/stable/testing.html
+class TestRepeaterHandler_MetricsPaths(AsyncHTTPTestCase):
+    def get_app(self):
+        return make_app(debug=True, autoreload=False)
+
+
+    def metrics(self):
+        response = self.fetch('/metrics',
+            method='GET',
+            )
+        assert response.code == 200
+        assert response.headers.get('Content-Type').startswith('text/plain; version=0.0.4')
+        return response.body.decode()
+
+
+    def test_HTTP_method_GET_counts_requests(self):
+        self.fetch('/test/default/file.ext', method='GET', headers={'Accept-Encoding': 'identity'}, decompress_response=False, )
+        self.fetch('/test/default/file.ext?status=404', method='HEAD', )
+        body = self.metrics()
+        assert 'mock_http_origin_requests_total{method="GET",status="200"} 1' in body
+        assert 'mock_http_origin_requests_total{method="HEAD",status="404"} 1' in body
+        assert 'mock_http_origin_in_flight_requests 0' in body
+
+
+    def test_HTTP_method_GET_counts_bytes_by_encoding(self):
+        response = self.fetch('/test/default/file.ext?content=1000', method='GET', headers={'Accept-Encoding': 'identity'}, decompress_response=False, )
+        assert len(response.body) == 1000
+        response = self.fetch('/test/default/file.ext?content=1000', method='GET', headers={'Accept-Encoding': 'gzip'}, decompress_response=False, )
+        body = self.metrics()
+        assert 'mock_http_origin_response_bytes_total{encoding="identity"} 1000' in body
+        assert f'mock_http_origin_response_bytes_total{{encoding="gzip"}} {len(response.body)}' in body
+
+
+    def test_HTTP_method_GET_stage_histograms(self):
+        self.fetch('/test/default/file.ext?debug', method='GET', )
+        body = self.metrics()
+        for stage in ['set_condition', 'delay_response', 'content_encoding', 'prepare_body_text', 'write']:
+            assert f'mock_http_origin_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} 1' in body
+            assert f'mock_http_origin_stage_seconds_count{{stage="{stage}"}} 1' in body
+        assert 'mock_http_origin_request_seconds_count 1' in body
+        assert '# TYPE mock_http_origin_loop_lag_seconds histogram' in body
+
+
+    def test_merges_worker_snapshots(self):
+        with tempfile.TemporaryDirectory() as metrics_dir:
+            worker = Metrics(metrics_dir, 1)
+            worker.record_request('GET', 200, 'gzip', 10, 0.01, {'write': 0.001})
+            worker.save_snapshot()
+            metrics = Metrics(metrics_dir, 0)
+            metrics.record_request('GET', 200, 'gzip', 5, 0.01, {'write': 0.001})
+            body = metrics.render()
+        assert 'mock_http_origin_requests_total{method="GET",status="200"} 2' in body
+        assert 'mock_http_origin_response_bytes_total{encoding="gzip"} 15' in body
+        assert 'mock_http_origin_stage_seconds_count{stage="write"} 2' in body
+
+
+class SlowRepeaterHandler(RepeaterHandler):
+    def set_condition(self, **kwargs):
+        ## Block the IOLoop the way a large synchronous compress would
+        time.sleep(0.3)
+        return super().set_condition(**kwargs)
+
+
+## https://www.tornadoweb.org/en/stable/testing.html
+class TestRepeaterHandler_LoopMonitorPaths(AsyncHTTPTestCase):
+    def get_app(self):
+        app = make_app(debug=True, autoreload=False, loop_monitor_interval=0.02, slow_callback_threshold=0.1,
+            routes=[
+                (r'/metrics/loop', LoopMonitorHandler),
+                (r'/metrics', MetricsHandler),
+                (r'/slow/.*', SlowRepeaterHandler),
+                (r'/.*', RepeaterHandler),
+            ],
+            )
+        app.settings['loop_monitor'].start()
+        return app
+
+
+    def stats(self):
+        response = self.fetch('/metrics/loop',
+            method='GET',
+            )
+        assert response.code == 200
+        assert response.headers.get('Content-Type') == 'application/json'
+        return json.loads(response.body)
+
+
+    def test_HTTP_method_GET_without_slow_callbacks(self):
+        self.fetch('/test/default/file.ext', method='GET', )
+        stats = self.stats()
+        assert stats['threshold'] == 0.1
+        assert stats['slow_callbacks'] == []
+
+
+    def test_HTTP_method_GET_reports_stage_and_location(self):
+        self.fetch('/slow/test?quiet', method='GET', )
+        ## Let the lag timer run after the blocked request
+        self.io_loop.run_sync(lambda: asyncio.sleep(0.1))
+        stats = self.stats()
+        assert stats['slow_count'] == 1
+        slow = stats['slow_callbacks'][0]
+        assert slow['lag'] >= 0.2
+        assert slow['stage'] == 'set_condition'
+        assert 'uri' not in slow
+        assert 'time.sleep' in slow['location'] or 'set_condition' in slow['location']
+        body = self.fetch('/metrics', method='GET', ).body.decode()
+        assert 'mock_http_origin_loop_lag_seconds_bucket{le="0.5"}' in body
+
+
+## https://www.tornadoweb.org/en/stable/testing.html
+class TestRepeaterHandler_SinkPaths(AsyncHTTPTestCase):
+    def get_app(self):
+        return make_app(debug=True, autoreload=False)
+
+
+    def test_HTTP_method_PUT(self):
+        response = self.fetch('/test/sink',
+            method='PUT',
+            body=b'x' * 1000000,
+            )
+        assert response.code == 200
+        assert response.headers.get('Content-Type') == 'text/plain'
+        text = response.body.decode()
+        assert '* UPLOAD bytes: 1000000' in text
+        assert '* UPLOAD mb_per_sec: ' in text
+        assert 'sha256' not in text
+
+
+    def test_HTTP_method_POST_JSON(self):
+        response = self.fetch('/sink?upload=sha256',
+            method='POST',
+            headers={'Accept': 'application/json'},
+            body='test',
+            )
+        upload = json.loads(response.body)['upload']
+        assert upload['bytes'] == 4
+        assert upload['sha256'] == '9f86d081884c7d659a2feaa0c55ad015a3bf4f1b2b0b822cd15d6c15b0f00a08'
+
+
+    def test_HTTP_method_GET(self):
+        response = self.fetch('/test/sink',
+            method='GET',
+            )
+        assert response.code == 405
+
+
+    def test_HTTP_method_POST_read_rate(self):
+        start = time.monotonic()
+        response = self.fetch('/test/sink?read_rate=1M',
+            method='POST',
+            headers={'Accept': 'application/json'},
+            body=b'x' * 300000,
+            )
+        elapsed = time.monotonic() - start
+        upload = json.loads(response.body)['upload']
+        assert response.headers.get('X-Read-Rate') == '1048576 set by query string'
+        assert upload['bytes'] == 300000
+        ## The first 100KiB burst is read at once, the rest at 1MiB/s
+        assert upload['seconds'] >= 0.1
+        assert elapsed >= 0.15
+
+
+    def test_HTTP_method_POST_invalid_read_rate(self):
+        response = self.fetch('/test/sink?read_rate=fast',
+            method='POST',
+            body='test',
+            )
+        assert response.code == 400
@@ -1,18 +1,28 @@
+import asyncio
+import gzip
+import hashlib
 import json
+import random
 import sys
+import tempfile
+import time
+import zlib
 
 from datetime import datetime
 from pathlib import Path
+from unittest import mock
 
 import pytest
 
-from tornado.httpclient import HTTPError
-from tornado.testing import AsyncHTTPTestCase
+from tornado.httpclient import AsyncHTTPClient, HTTPError
+from tornado.tcpclient import TCPClient
+from tornado.testing import AsyncHTTPTestCase, gen_test
 
 # Append the root directory of this application to system path
 sys.path.append(str(Path(__file__).parent.parent))
 
-from app import make_app
+import app
+from app import DelayDistribution, OffloadExecutor, RequestSnapshot, brotli, delay_random, json_native, json_text, make_app, request_debug_text, request_json, request_text, zstandard
 
 
 ## https://www.tornadoweb.org/en/stable/testing.html
@@ -75,28 +85,827 @@ class TestRepeaterHandler_WithoutParameters(AsyncHTTPTestCase):
         assert boilerplate is True
 
 
-@pytest.mark.skip('Not implemented, yet')
+## https://www.tornadoweb.org/en/stable/testing.html
+class TestRepeaterHandler_WithSeedParameter(AsyncHTTPTestCase):
+    def get_app(self):
+        return make_app(debug=True, autoreload=False)
+
+
+    def test_HTTP_method_GET_with_content_and_seed(self):
+        first = self.fetch('/test/with.ext?content=65536&seed=42',
+            method='GET',
+            decompress_response=False,
+            )
+        second = self.fetch('/test/with.ext?content=65536&seed=42',
+            method='GET',
+            decompress_response=False,
+            )
+        other = self.fetch('/test/with.ext?content=65536&seed=43',
+            method='GET',
+            decompress_response=False,
+            )
+        assert first.code == 200
+        assert len(first.body) == 65536
+        assert first.headers.get('X-Content-Cache') == 'miss'
+        assert second.headers.get('X-Content-Cache') == 'hit'
+        assert first.body == second.body
+        assert first.body != other.body
+
+
+    def test_HTTP_method_GET_with_content_seed_and_multibyte_fill(self):
+        for query in ('content=101', 'content=101&seed=1', 'content=101&seed=1&stream',
+                      'content=70000&seed=1', 'content=70000&seed=1&stream&chunk_size=1000'):
+            response = self.fetch(f'/test/with.ext?{query}&fill=%C3%A9%C3%B8',
+                method='GET',
+                headers={'Accept-Encoding': 'identity'},
+                decompress_response=False,
+                )
+            assert response.code == 200
+            text = response.body.decode()
+            assert len(text) == (70000 if '70000' in query else 101)
+            assert set(text) == {'\u00e9', '\u00f8'}
+        ## Cached and streamed seeded content are the same characters
+        streamed = self.fetch('/test/with.ext?content=70000&seed=1&stream&chunk_size=1000&fill=%C3%A9%C3%B8',
+            method='GET',
+            headers={'Accept-Encoding': 'identity'},
+            decompress_response=False,
+            )
+        whole = self.fetch('/test/with.ext?content=70000&seed=1&fill=%C3%A9%C3%B8',
+            method='GET',
+            headers={'Accept-Encoding': 'identity'},
+            decompress_response=False,
+            )
+        assert whole.headers.get('X-Content-Cache') == 'hit'
+        assert streamed.body == whole.body
+
+
+    def test_HTTP_method_GET_with_content_and_seed_counts_misses(self):
+        cache = self._app.settings['content_cache']
+        assert len(cache) == 0
+        response = self.fetch('/test/with.ext?content=1024&seed=42',
+            method='GET',
+            )
+        assert response.code == 200
+        ## The lookups on the empty cache are counted too
+        assert (cache.hits, cache.misses) == (0, 2)
+
+
+    def test_HTTP_method_GET_with_content_seed_and_gzip(self):
+        first = self.fetch('/test/with.ext?content=65536&seed=42&encoding=gzip',
+            method='GET',
+            decompress_response=False,
+            )
+        second = self.fetch('/test/with.ext?content=65536&seed=42&encoding=gzip',
+            method='GET',
+            decompress_response=False,
+            )
+        assert first.headers.get('Content-Encoding') == 'gzip'
+        assert first.body == second.body
+        assert self._app.settings['content_cache'].hits == 2
+
+
+    def test_HTTP_method_GET_with_content_seed_and_stream(self):
+        response = self.fetch('/test/with.ext?content=200000&seed=7',
+            method='GET',
+            decompress_response=False,
+            )
+        streamed = self.fetch('/test/with.ext?content=200000&seed=7&stream',
+            method='GET',
+            decompress_response=False,
+            )
+        assert response.body == streamed.body
+
+
+## https://www.tornadoweb.org/en/stable/testing.html
+class TestRepeaterHandler_WithRangeHeader(AsyncHTTPTestCase):
+    def get_app(self):
+        return make_app(debug=True, autoreload=False)
+
+
+    def test_HTTP_method_GET_with_content_seed_and_Range(self):
+        full = self.fetch('/test/with.ext?content=200000&seed=5',
+            method='GET',
+            decompress_response=False,
+            )
+        response = self.fetch('/test/with.ext?content=200000&seed=5',
+            method='GET',
+            headers={'Range': 'bytes=65000-66999'},
+            decompress_response=False,
+            )
+        assert full.headers.get('Accept-Ranges') == 'bytes'
+        assert response.code == 206
+        assert response.headers.get('Content-Range') == 'bytes 65000-66999/200000'
+        assert int(response.headers.get('Content-Length')) == 2000
+        assert response.body == full.body[65000:67000]
+
+
+    def test_HTTP_method_GET_with_content_stream_and_suffix_Range(self):
+        # The end of a 1GiB body is generated without the bytes before it
+        response = self.fetch('/test/with.ext?content=1G&stream&seed=5',
+            method='GET',
+            headers={'Range': 'bytes=-1048576'},
+            decompress_response=False,
+            )
+        tail = self.fetch('/test/with.ext?content=1G&stream&seed=5',
+            method='GET',
+            headers={'Range': 'bytes=1073741724-'},
+            decompress_response=False,
+            )
+        assert response.code == 206
+        assert response.headers.get('Content-Range') == 'bytes 1072693248-1073741823/1073741824'
+        assert len(response.body) == 1048576
+        assert response.body[-100:] == tail.body
+
+
+    def test_HTTP_method_GET_with_content_and_multiple_Ranges(self):
+        full = self.fetch('/test/with.ext?content=1024&seed=5',
+            method='GET',
+            decompress_response=False,
+            )
+        response = self.fetch('/test/with.ext?content=1024&seed=5',
+            method='GET',
+            headers={'Range': 'bytes=0-9,-10'},
+            decompress_response=False,
+            )
+        assert response.code == 206
+        content_type = response.headers.get('Content-Type')
+        assert content_type.startswith('multipart/byteranges; boundary=')
+        boundary = content_type.split('boundary=')[-1].encode()
+        assert int(response.headers.get('Content-Length')) == len(response.body)
+        parts = response.body.split(b'--' + boundary)
+        assert parts[-1] == b'--\r\n'
+        assert parts[1].endswith(b'Content-Range: bytes 0-9/1024\r\n\r\n' + full.body[:10] + b'\r\n')
+        assert parts[2].endswith(b'Content-Range: bytes 1014-1023/1024\r\n\r\n' + full.body[-10:] + b'\r\n')
+
+
+    def test_HTTP_method_GET_with_content_and_Range_not_satisfiable(self):
+        response = self.fetch('/test/with.ext?content=1024',
+            method='GET',
+            headers={'Range': 'bytes=1024-'},
+            )
+        assert response.code == 416
+        assert response.headers.get('Content-Range') == 'bytes */1024'
+
+
+    def test_HTTP_method_GET_with_content_and_If_Range(self):
+        full = self.fetch('/test/with.ext?content=1024&seed=5',
+            method='GET',
+            decompress_response=False,
+            )
+        matched = self.fetch('/test/with.ext?content=1024&seed=5',
+            method='GET',
+            headers={'Range': 'bytes=0-9', 'If-Range': full.headers.get('Etag')},
+            decompress_response=False,
+            )
+        changed = self.fetch('/test/with.ext?content=1024&seed=6',
+            method='GET',
+            headers={'Range': 'bytes=0-9', 'If-Range': full.headers.get('Etag')},
+            decompress_response=False,
+            )
+        assert matched.code == 206
+        assert matched.body == full.body[:10]
+        assert changed.code == 200
+        assert len(changed.body) == 1024
+
+
+## https://www.tornadoweb.org/en/stable/testing.html
+class TestRepeaterHandler_WithConditionalRequests(AsyncHTTPTestCase):
+    def get_app(self):
+        return make_app(debug=True, autoreload=False)
+
+
+    def test_HTTP_method_GET_seeded_If_None_Match(self):
+        full = self.fetch('/test/with.ext?content=65536&seed=42',
+            method='GET',
+            headers={'Accept-Encoding': 'identity'},
+            decompress_response=False,
+            )
+        cache = self._app.settings['content_cache']
+        misses = cache.misses
+        response = self.fetch('/test/with.ext?content=65536&seed=42',
+            method='GET',
+            headers={'Accept-Encoding': 'identity', 'If-None-Match': full.headers.get('Etag')},
+            decompress_response=False,
+            )
+        assert full.code == 200
+        assert full.headers.get('Last-Modified')
+        assert response.code == 304
+        assert response.body == b''
+        assert response.headers.get('Etag') == full.headers.get('Etag')
+        ## The body was not generated or looked up again
+        assert cache.misses == misses
+        assert cache.hits == 0
+
+
+    def test_HTTP_method_GET_seeded_If_None_Match_other_encoding(self):
+        identity = self.fetch('/test/with.ext?content=1000&seed=42',
+            method='GET',
+            headers={'Accept-Encoding': 'identity'},
+            decompress_response=False,
+            )
+        response = self.fetch('/test/with.ext?content=1000&seed=42',
+            method='GET',
+            headers={'Accept-Encoding': 'gzip', 'If-None-Match': identity.headers.get('Etag')},
+            decompress_response=False,
+            )
+        assert response.code == 200
+        assert response.headers.get('Content-Encoding') == 'gzip'
+        assert response.headers.get('Etag') != identity.headers.get('Etag')
+
+
+    def test_HTTP_method_GET_seeded_If_None_Match_with_ignored_Range(self):
+        identity = self.fetch('/test/with.ext?content=1000&seed=42',
+            method='GET',
+            headers={'Accept-Encoding': 'identity'},
+            decompress_response=False,
+            )
+        encoded = self.fetch('/test/with.ext?content=1000&seed=42',
+            method='GET',
+            headers={'Accept-Encoding': 'gzip'},
+            decompress_response=False,
+            )
+        ## The whole encoded body is sent for an invalid or If-Range mismatched range
+        for headers in ({'Range': 'bytes=abc'}, {'Range': 'bytes=0-9', 'If-Range': '"other"'}):
+            response = self.fetch('/test/with.ext?content=1000&seed=42',
+                method='GET',
+                headers={'Accept-Encoding': 'gzip', 'If-None-Match': identity.headers.get('Etag'), **headers},
+                decompress_response=False,
+                )
+            assert response.code == 200
+            assert response.headers.get('Etag') == encoded.headers.get('Etag')
+            response = self.fetch('/test/with.ext?content=1000&seed=42',
+                method='GET',
+                headers={'Accept-Encoding': 'gzip', 'If-None-Match': encoded.headers.get('Etag'), **headers},
+                decompress_response=False,
+                )
+            assert response.code == 304
+        ## A range served from the unencoded body is checked against its ETag
+        response = self.fetch('/test/with.ext?content=1000&seed=42',
+            method='GET',
+            headers={'Accept-Encoding': 'gzip', 'If-None-Match': identity.headers.get('Etag'), 'Range': 'bytes=0-9'},
+            decompress_response=False,
+            )
+        assert response.code == 304
+
+
+    def test_HTTP_method_GET_seeded_If_Modified_Since(self):
+        full = self.fetch('/test/with.ext?content=1000&seed=42',
+            method='GET',
+            decompress_response=False,
+            )
+        response = self.fetch('/test/with.ext?content=1000&seed=42',
+            method='GET',
+            headers={'If-Modified-Since': full.headers.get('Last-Modified')},
+            decompress_response=False,
+            )
+        assert response.code == 304
+
+
+    def test_HTTP_method_GET_with_weak_etag_parameter(self):
+        response = self.fetch('/test/with.ext?etag=W/v1',
+            method='GET',
+            )
+        assert response.code == 200
+        assert response.headers.get('Etag') == 'W/"v1"'
+        for if_none_match in ['W/"v1"', '"v1"', '"v0", W/"v1"', '*']:
+            response = self.fetch('/test/with.ext?etag=W/v1',
+                method='GET',
+                headers={'If-None-Match': if_none_match},
+                )
+            assert response.code == 304
+        response = self.fetch('/test/with.ext?etag=W/v1',
+            method='GET',
+            headers={'If-None-Match': '"v2"'},
+            )
+        assert response.code == 200
+
+
+    def test_HTTP_method_GET_with_etag_parameter_and_seed(self):
+        response = self.fetch('/test/with.ext?content=1000&seed=42&etag=v1',
+            method='GET',
+            decompress_response=False,
+            )
+        assert response.headers.get('Etag') == '"v1"'
+
+
+    def test_HTTP_method_GET_with_last_modified_parameter(self):
+        response = self.fetch('/test/with.ext?last_modified=1445412480',
+            method='GET',
+            )
+        assert response.code == 200
+        assert response.headers.get('Last-Modified') == 'Wed, 21 Oct 2015 07:28:00 GMT'
+        response = self.fetch('/test/with.ext?last_modified=Wed,%2021%20Oct%202015%2007:28:00%20GMT',
+            method='GET',
+            headers={'If-Modified-Since': 'Wed, 21 Oct 2015 07:28:00 GMT'},
+            )
+        assert response.code == 304
+        response = self.fetch('/test/with.ext?last_modified=1445412480',
+            method='GET',
+            headers={'If-Modified-Since': 'Tue, 20 Oct 2015 07:28:00 GMT'},
+            )
+        assert response.code == 200
+
+
+    def test_HTTP_method_GET_with_invalid_last_modified_parameter(self):
+        for value in ('99999999999999999', 'yesterday', '-1'):
+            response = self.fetch(f'/test/with.ext?last_modified={value}',
+                method='GET',
+                )
+            assert response.code == 400
+
+
+    def test_HTTP_method_GET_seeded_JSON_is_another_representation(self):
+        text = self.fetch('/test/x?content=100&seed=1',
+            method='GET',
+            headers={'Accept-Encoding': 'identity'},
+            decompress_response=False,
+            )
+        for encoding in ('identity', 'gzip'):
+            response = self.fetch('/test/x.json?content=100&seed=1',
+                method='GET',
+                headers={'Accept-Encoding': encoding, 'If-None-Match': text.headers.get('Etag')},
+                decompress_response=False,
+                )
+            assert response.code == 200
+            assert response.headers.get('Etag') != text.headers.get('Etag')
+            assert response.headers.get('Accept-Ranges') is None
+            assert response.headers.get('Content-Type') == 'text/json'
+
+
+    def test_HTTP_method_GET_with_status_is_not_conditional(self):
+        response = self.fetch('/test/with.ext?etag=v1&status=404',
+            method='GET',
+            headers={'If-None-Match': '"v1"'},
+            )
+        assert response.code == 404
+
+
+    def test_HTTP_method_GET_static_If_Modified_Since(self):
+        full = self.fetch('/test/ping',
+            method='GET',
+            )
+        response = self.fetch('/test/ping',
+            method='GET',
+            headers={'If-Modified-Since': full.headers.get('Last-Modified')},
+            )
+        assert full.code == 200
+        assert response.code == 304
+
+
+    def test_HTTP_method_GET_with_invalid_etag(self):
+        response = self.fetch('/test/with.ext?etag=a%20b',
+            method='GET',
+            )
+        assert response.code == 400
+
+
+## https://www.tornadoweb.org/en/stable/testing.html
+class TestRepeaterHandler_WithUploadParameter(AsyncHTTPTestCase):
+    def get_app(self):
+        return make_app(debug=True, autoreload=False)
+
+
+    def test_HTTP_method_POST_with_upload(self):
+        body = b'0123456789' * 100000
+        response = self.fetch('/test/upload?upload',
+            method='POST',
+            body=body,
+            )
+        assert response.code == 200
+        assert response.headers.get('Content-Type') == 'text/plain'
+        text = response.body.decode()
+        assert '* UPLOAD bytes: 1000000' in text
+        assert f'* UPLOAD sha256: {hashlib.sha256(body).hexdigest()}' in text
+        assert '* UPLOAD mb_per_sec: ' in text
+        ## The upload is not repeated back
+        assert '0123456789' not in text
+
+
+    def test_HTTP_method_POST_with_upload_json(self):
+        response = self.fetch('/test/upload.json?upload=md5',
+            method='POST',
+            body='test',
+            )
+        upload = json.loads(response.body)['upload']
+        assert upload['bytes'] == 4
+        assert upload['md5'] == hashlib.md5(b'test').hexdigest()
+
+
+    def test_HTTP_method_POST_with_upload_count(self):
+        response = self.fetch('/test/upload.json?upload=count',
+            method='POST',
+            body='test',
+            )
+        upload = json.loads(response.body)['upload']
+        assert upload['bytes'] == 4
+        assert 'sha256' not in upload
+
+
+    def test_HTTP_method_POST_with_upload_chunked_body(self):
+        async def body_producer(write):
+            for _ in range(10):
+                await write(b'x' * 65536)
+
+        response = self.fetch('/test/upload.json?upload',
+            method='POST',
+            body_producer=body_producer,
+            )
+        upload = json.loads(response.body)['upload']
+        assert upload['bytes'] == 655360
+        assert upload['sha256'] == hashlib.sha256(b'x' * 655360).hexdigest()
+
+
+    def test_HTTP_method_POST_without_upload(self):
+        response = self.fetch('/test/upload?key=query&debug',
+            method='POST',
+            headers={'Content-Type': 'application/x-www-form-urlencoded'},
+            body='key=body',
+            )
+        text = response.body.decode()
+        assert "* POST DATA b'key=body'" in text
+        assert "request.body_arguments <class 'dict'>: {'key': [b'body']}" in text
+        assert "request.arguments <class 'dict'>: {'key': [b'query', b'body'], 'debug': [b'']}" in text
+
+
+    def test_HTTP_method_POST_with_invalid_upload(self):
+        response = self.fetch('/test/upload?upload=crc',
+            method='POST',
+            body='test',
+            )
+        assert response.code == 400
+
+
+## https://www.tornadoweb.org/en/stable/testing.html
+class TestRepeaterHandler_WithOffloadedContent(AsyncHTTPTestCase):
+    def get_app(self):
+        return make_app(debug=True, autoreload=False, offload_threshold=65536)
+
+
+    def test_HTTP_method_GET_with_offloaded_content_and_seed(self):
+        small = self.fetch('/test/with.ext?content=1024&seed=42',
+            method='GET',
+            decompress_response=False,
+            )
+        large = self.fetch('/test/with.ext?content=3M&seed=42&encoding=gzip',
+            method='GET',
+            decompress_response=False,
+            )
+        assert small.code == 200
+        assert len(gzip.decompress(large.body)) == 3145728
+        assert gzip.decompress(large.body)[:1024] == small.body
+        offload = self._app.settings['offload'].stats()
+        # generated and compressed off the event loop
+        assert offload['offloaded'] == 2
+        assert offload['queued'] == 0
+
+
+    def test_HTTP_method_GET_with_offload_disabled(self):
+        self._app.settings['offload'] = offload = OffloadExecutor(workers=0)
+        response = self.fetch('/test/with.ext?content=3M',
+            method='GET',
+            decompress_response=False,
+            )
+        assert len(response.body) == 3145728
+        assert offload.stats()['offloaded'] == 0
+        assert offload.stats()['inline'] == 1
+
+
+## https://www.tornadoweb.org/en/stable/testing.html
+class TestRepeaterHandler_WithStreamParameter(AsyncHTTPTestCase):
+    def get_app(self):
+        return make_app(debug=True, autoreload=False, max_content_length=1024)
+
+
+    def test_HTTP_method_GET_with_content_and_stream(self):
+        response = self.fetch('/test/with.ext?content=5M&stream&fill=ab',
+            method='GET',
+            decompress_response=False,
+            )
+        assert response.code == 200
+        assert response.headers.get('Content-Encoding') is None
+        assert int(response.headers.get('Content-Length')) == 5242880
+        assert len(response.body) == 5242880
+        assert set(response.body) == set(b'ab')
+
+
+    def test_HTTP_method_HEAD_with_content_and_stream(self):
+        response = self.fetch('/test/with.ext?content=1G&stream',
+            method='HEAD',
+            decompress_response=False,
+            )
+        assert response.code == 200
+        assert int(response.headers.get('Content-Length')) == 1073741824
+
+
+    def test_HTTP_method_GET_with_content_stream_and_multibyte_fill(self):
+        response = self.fetch('/test/with.ext?content=100&stream&fill=%C3%A9',
+            method='GET',
+            decompress_response=False,
+            )
+        assert response.code == 200
+        assert response.headers.get('Content-Length') is None
+        assert response.body.decode() == '\u00e9' * 100
+
+
+    def test_HTTP_method_GET_with_negative_content(self):
+        for query in ('content=-5&stream', 'content=-5', 'set=content:-5,host:localhost'):
+            response = self.fetch(f'/test/with.ext?{query}',
+                method='GET',
+                )
+            assert response.code == 400
+
+
+    def test_HTTP_method_GET_with_overflowing_sizes(self):
+        for query in ('content=1e400K', 'content=1e400K&stream', 'rate=1e400K', 'stall_at=1e400K:1',
+                      'chunk_size=nanK', 'content=1M&chunked&chunk_size=1G'):
+            response = self.fetch(f'/test/with.ext?{query}',
+                method='GET',
+                )
+            assert response.code == 400
+            assert response.body.startswith(b'Invalid `')
+
+
+    def test_HTTP_method_GET_with_content_stream_and_large_chunk_size(self):
+        offload = self._app.settings['offload']
+        response = self.fetch('/test/with.ext?content=8M&stream&chunk_size=4M&fill=ab&encoding=gzip',
+            method='GET',
+            decompress_response=False,
+            )
+        assert response.code == 200
+        content = gzip.decompress(response.body)
+        assert len(content) == 8388608
+        assert set(content) == set(b'ab')
+        ## Each 4MiB chunk was generated and compressed off the event loop
+        assert offload.stats()['offloaded'] == 4
+
+
+    def test_HTTP_method_GET_with_stream_and_status(self):
+        response = self.fetch('/test/with.ext?content=1M&stream&status=404&header=x-test:stream',
+            method='GET',
+            )
+        assert response.code == 404
+        assert response.headers.get('X-Test') == 'stream'
+
+
+    def test_HTTP_method_GET_with_content_stream_and_gzip(self):
+        response = self.fetch('/test/with.ext?content=1M&stream&fill=ab&encoding=gzip',
+            method='GET',
+            decompress_response=False,
+            )
+        assert response.code == 200
+        assert response.headers.get('Content-Encoding') == 'gzip'
+        assert response.headers.get('Content-Length') is None
+        assert response.headers.get('Transfer-Encoding') == 'chunked'
+        body = gzip.decompress(response.body)
+        assert len(body) == 1048576
+        assert set(body) == set(b'ab')
+
+
+## https://www.tornadoweb.org/en/stable/testing.html
+class TestRepeaterHandler_WithGzipParameters(AsyncHTTPTestCase):
+    def get_app(self):
+        return make_app(debug=True, autoreload=False, gzip_level=1)
+
+
+    def test_HTTP_method_GET_with_gzip_level(self):
+        fast = self.fetch('/test/with.ext?content=65536&seed=42&encoding=gzip',
+            method='GET',
+            decompress_response=False,
+            )
+        best = self.fetch('/test/with.ext?content=65536&seed=42&encoding=gzip&gzip_level=9',
+            method='GET',
+            decompress_response=False,
+            )
+        assert gzip.decompress(fast.body) == gzip.decompress(best.body)
+        assert len(best.body) < len(fast.body)
+
+
+    def test_HTTP_method_GET_with_gzip_strategy(self):
+        response = self.fetch('/test/with.ext?content=65536&encoding=gzip&gzip_strategy=huffman',
+            method='GET',
+            decompress_response=False,
+            )
+        assert response.code == 200
+        assert len(gzip.decompress(response.body)) == 65536
+
+
+    def test_HTTP_method_GET_static_with_gzip_level(self):
+        default = self.fetch('/football.svg',
+            method='GET',
+            headers={'Accept-Encoding': 'gzip'},
+            decompress_response=False,
+            )
+        stored = self.fetch('/football.svg?gzip_level=0',
+            method='GET',
+            headers={'Accept-Encoding': 'gzip'},
+            decompress_response=False,
+            )
+        assert gzip.decompress(default.body) == gzip.decompress(stored.body)
+        assert default.headers.get('Etag') != stored.headers.get('Etag')
+        assert len(stored.body) > len(default.body)
+
+
+    def test_HTTP_method_GET_with_invalid_gzip_options(self):
+        for query in ('gzip_level=10', 'gzip_level=fast', 'gzip_strategy=best'):
+            response = self.fetch(f'/test/with.ext?{query}',
+                method='GET',
+                )
+            assert response.code == 400
+
+
+## https://www.tornadoweb.org/en/stable/testing.html
+class TestRepeaterHandler_WithEncodingParameter(AsyncHTTPTestCase):
+    def get_app(self):
+        return make_app(debug=True, autoreload=False)
+
+
+    def fetch_encoded(self, encoding):
+        return self.fetch(f'/test/with.ext?content=4096&fill=ab&encoding={encoding}',
+            method='GET',
+            decompress_response=False,
+            )
+
+
+    def test_HTTP_method_GET_with_encoding_deflate(self):
+        response = self.fetch_encoded('deflate')
+        assert response.headers.get('Content-Encoding') == 'deflate'
+        assert response.headers.get('Vary') == 'Accept-Encoding'
+        assert set(zlib.decompress(response.body)) == set(b'ab')
+
+
+    def test_HTTP_method_GET_with_encoding_quality_values(self):
+        response = self.fetch_encoded('gzip;q=0.5,deflate;q=0.8')
+        assert response.headers.get('Content-Encoding') == 'deflate'
+        response = self.fetch_encoded('gzip;q=0,unknown,*;q=0.1')
+        assert response.headers.get('Content-Encoding') == 'deflate'
+        response = self.fetch_encoded('identity,gzip;q=0.5')
+        assert response.headers.get('Content-Encoding') is None
+        assert len(response.body) == 4096
+
+
+    def test_HTTP_method_GET_with_encoding_identity_refused(self):
+        response = self.fetch_encoded('unknown,identity;q=0')
+        assert response.code == 406
+        response = self.fetch_encoded('*;q=0')
+        assert response.code == 406
+        response = self.fetch_encoded('gzip,identity;q=0')
+        assert response.code == 200
+        assert response.headers.get('Content-Encoding') == 'gzip'
+
+
+    def test_HTTP_method_GET_with_encoding_stream_deflate(self):
+        response = self.fetch('/test/with.ext?content=1M&stream&fill=ab&encoding=deflate',
+            method='GET',
+            decompress_response=False,
+            )
+        assert response.headers.get('Content-Encoding') == 'deflate'
+        assert len(zlib.decompress(response.body)) == 1048576
+
+
+    @pytest.mark.skipif(brotli is None, reason='brotli is not installed')
+    def test_HTTP_method_GET_with_encoding_br(self):
+        response = self.fetch_encoded('br')
+        assert response.headers.get('Content-Encoding') == 'br'
+        assert len(brotli.decompress(response.body)) == 4096
+
+
+    @pytest.mark.skipif(zstandard is None, reason='zstandard is not installed')
+    def test_HTTP_method_GET_with_encoding_zstd(self):
+        response = self.fetch_encoded('zstd')
+        assert response.headers.get('Content-Encoding') == 'zstd'
+        assert len(zstandard.ZstdDecompressor().decompressobj().decompress(response.body)) == 4096
+
+
 ## https://www.tornadoweb.org/en/stable/testing.html
 class TestRepeaterHandler_TransferEncodingchunked(AsyncHTTPTestCase):
     def get_app(self):
         return make_app(debug=True, autoreload=False)
 
-    def test_HTTP_method_GET_with_Transfer_Encoding_chunked(self):
-        """
-        When "content" is combined with a "Transfer-Encoding: chunked" response header 
-        the response body content will be formatted into a chunked response.
-        (Use --raw with curl to view chunked content)
 
-          ?header=transfer-encoding:chunked&content=<int>[&fill=<str>][&chunk_length=<int>][&no_end_of_content=<str>]
+    async def raw_request(self, path):
+        """Return the (head, stream) of a raw HTTP/1.1 GET request for `path'"""
+        stream = await TCPClient().connect('127.0.0.1', self.get_http_port())
+        await stream.write(f'GET {path} HTTP/1.1\r\nHost: test\r\n\r\n'.encode())
+        head = await stream.read_until(b'\r\n\r\n')
+        return head, stream
 
-          chunk_length=<int> (default: 64) controls the length of each chunk in
-            the response generated.
 
-          no_end_of_content=<str> the presence of this attribute will suppress the 
-            end of content lines ('0\r\n\r\n') in the chunked response. The HTTP 
-            client will likely hang waiting on the expected end of content lines.
+    @gen_test
+    async def test_HTTP_method_GET_with_Transfer_Encoding_chunked(self):
         """
-        raise NotImplementedError('...work to do')
+        When "content" is combined with "chunked" the response body content is
+        sent as genuine HTTP/1.1 chunks of "chunk_size" bytes.
+        """
+        head, stream = await self.raw_request('/test?content=1000&chunked&chunk_size=100')
+        body = await stream.read_until(b'0\r\n\r\n')
+        stream.close()
+        assert b'Transfer-Encoding: chunked' in head
+        assert b'Content-Length' not in head
+        chunks = body.split(b'\r\n')
+        assert chunks[0:20:2] == [b'64'] * 10
+        assert [len(chunk) for chunk in chunks[1:20:2]] == [100] * 10
+        assert chunks[20:] == [b'0', b'', b'']
+
+
+    @gen_test
+    async def test_HTTP_method_GET_with_Transfer_Encoding_chunked_no_end_of_content(self):
+        head, stream = await self.raw_request('/test?content=200&chunked&chunk_size=100&no_end_of_content')
+        body = await stream.read_bytes(len(b'64\r\n' + b'x' * 100 + b'\r\n') * 2)
+        assert b'Transfer-Encoding: chunked' in head
+        # The terminating chunk is never sent
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(stream.read_bytes(1), 0.2)
+        stream.close()
+
+
+    def test_HTTP_method_GET_with_chunked_interval_and_no_buffering(self):
+        start = time.monotonic()
+        response = self.fetch('/test?content=300&chunked&chunk_size=100&chunk_interval=50&no_buffering',
+            method='GET',
+            decompress_response=False,
+            )
+        assert time.monotonic() - start >= 0.1
+        assert response.code == 200
+        assert len(response.body) == 300
+        assert response.headers.get('Transfer-Encoding') == 'chunked'
+        assert response.headers.get('X-Accel-Buffering') == 'no'
+
+
+    def test_HTTP_method_GET_with_chunked_request_details(self):
+        response = self.fetch('/test?chunked&chunk_size=16&encoding=gzip',
+            method='GET',
+            decompress_response=False,
+            )
+        assert response.code == 200
+        assert response.headers.get('Transfer-Encoding') == 'chunked'
+        assert response.headers.get('Content-Encoding') == 'gzip'
+        assert b'GET /test?chunked&chunk_size=16&encoding=gzip' in gzip.decompress(response.body)
+
+
+    @gen_test
+    async def test_HTTP_method_GET_with_Transfer_Encoding_chunked_and_gzip(self):
+        head, stream = await self.raw_request('/test?content=300000&chunked&chunk_size=64K&encoding=gzip&fill=ab')
+        body = await stream.read_until(b'\r\n0\r\n\r\n')
+        stream.close()
+        assert b'Transfer-Encoding: chunked' in head
+        assert b'Content-Encoding: gzip' in head
+        chunks, position = [], 0
+        while True:
+            end = body.index(b'\r\n', position)
+            size = int(body[position:end], 16)
+            if size == 0:
+                break
+            chunks.append(body[end + 2:end + 2 + size])
+            position = end + 2 + size + 2
+        ## Each compressed piece is sent as its own chunk
+        assert len(chunks) > 1
+        content = gzip.decompress(b''.join(chunks))
+        assert len(content) == 300000
+        assert set(content) == set(b'ab')
+
+
+## https://www.tornadoweb.org/en/stable/testing.html
+class TestRepeaterHandler_WithRateParameter(AsyncHTTPTestCase):
+    def get_app(self):
+        return make_app(debug=True, autoreload=False)
+
+
+    def test_HTTP_method_GET_with_content_and_rate(self):
+        start = time.monotonic()
+        response = self.fetch('/test/with.ext?content=3000&rate=10000&burst=1000',
+            method='GET',
+            decompress_response=False,
+            )
+        # 2000 bytes beyond the first burst at 10000 bytes/sec
+        assert time.monotonic() - start >= 0.2
+        assert response.code == 200
+        assert response.headers.get('X-Rate') == '10000 set by query string'
+        assert int(response.headers.get('Content-Length')) == 3000
+        assert len(response.body) == 3000
+
+
+    def test_HTTP_method_GET_with_content_stream_and_rate(self):
+        start = time.monotonic()
+        response = self.fetch('/test/with.ext?content=64K&stream&rate=256K',
+            method='GET',
+            decompress_response=False,
+            )
+        # 64KiB less the default burst of 0.1 seconds at 256KiB/sec
+        assert time.monotonic() - start >= 0.15
+        assert len(response.body) == 65536
+
+
+    @gen_test
+    async def test_HTTP_method_GET_with_rate_concurrently(self):
+        client = AsyncHTTPClient(force_instance=True, max_clients=100)
+        url = self.get_url('/test/with.ext?content=2000&rate=10000&burst=1000')
+        start = time.monotonic()
+        responses = await asyncio.gather(*[client.fetch(url) for _ in range(100)])
+        elapsed = time.monotonic() - start
+        client.close()
+        assert all(len(response.body) == 2000 for response in responses)
+        # Paced responses wait on timers side by side, not one after another
+        assert 0.1 <= elapsed < 2
 
 
 ## https://www.tornadoweb.org/en/stable/testing.html
@@ -152,6 +961,38 @@ class TestRepeaterHandler_WithContentParameter(AsyncHTTPTestCase):
         assert response.body.decode().startswith('aaaaaaaaaaaaaaaaaa') is True
 
 
+    def test_HTTP_method_GET_with_content_large(self):
+        response = self.fetch('/test/with.ext?content=4194304&fill=xyz',
+            method='GET',
+            headers={'Accept-Encoding': 'identity'},
+            decompress_response=False,
+            )
+        assert response.code == 200
+        assert len(response.body) == 4194304
+        assert set(response.body) == set(b'xyz')
+
+
+    def test_HTTP_method_GET_with_content_and_fill_uniform(self):
+        response = self.fetch('/test/with.ext?content=4194304&fill=xyz',
+            method='GET',
+            headers={'Accept-Encoding': 'identity'},
+            decompress_response=False,
+            )
+        assert response.code == 200
+        counts = [response.body.count(c) for c in b'xyz']
+        # Mapping 256 byte values onto 3 characters favours `x' by 16384
+        assert max(counts) - min(counts) < 8192
+
+
+    def test_HTTP_method_GET_with_content_max_content_length(self):
+        self._app.settings['max_content_length'] = 2048
+        response = self.fetch('/test/with.ext?content=4096',
+            method='GET',
+            )
+        assert response.code == 200
+        assert len(response.body) == 2048
+
+
     @pytest.mark.skip('Not implemented yet')
     def test_HTTP_method_GET_with_content_and_lipsum(self):
         response = self.fetch('/test/with.ext?content=1024&fill=lipsum',
@@ -171,6 +1012,64 @@ class TestRepeaterHandler_WithContentParameter(AsyncHTTPTestCase):
         assert response.body.decode().startswith('...') is True
 
 
+## https://www.tornadoweb.org/en/stable/testing.html
+class TestRepeaterHandler_WithCompactParameter(AsyncHTTPTestCase):
+    def get_app(self):
+        return make_app(debug=True, autoreload=False)
+
+
+    def test_HTTP_method_GET_JSON_compact(self):
+        pretty = self.fetch('/test/with.json?key=value',
+            method='GET',
+            )
+        compact = self.fetch('/test/with.json?key=value&compact',
+            method='GET',
+            )
+        assert compact.code == 200
+        assert compact.headers.get('Content-Type') == 'text/json'
+        assert compact.body.endswith(b'}\n')
+        assert compact.body.count(b'\n') == 1
+        assert len(compact.body) < len(pretty.body)
+        request = json.loads(compact.body)['request']
+        assert request['query_arguments'] == {'key': ['value'], 'compact': ['']}
+        assert json.loads(pretty.body)['request']['query_arguments'] == {'key': ['value']}
+
+
+    def test_HTTP_method_POST_JSON_compact_gzip(self):
+        response = self.fetch('/test/with.json?compact',
+            method='POST',
+            headers={'Accept-Encoding': 'gzip', 'Cookie': 'name=value'},
+            body='key=value',
+            decompress_response=False,
+            )
+        assert response.headers.get('Content-Encoding') == 'gzip'
+        content = json.loads(gzip.decompress(response.body))
+        assert content['request']['body_length'] == 9
+        assert content['request']['cookies'][0][0] == 'name'
+
+
+    def test_json_native(self):
+        value = {'a': [b'1', (b'2', None)], 'b': datetime(2020, 1, 2, 3, 4, 5), 'c': 1.5}
+        assert json_native(value) == {'a': ['1', ['2', None]], 'b': '2020-01-02T03:04:05', 'c': 1.5}
+        assert json.loads(json_text(value, compact=True)) == json_native(value)
+
+
+    def test_json_compact_backends_agree(self):
+        value = {'headers': [('X-Name', 'caf\u00e9 \u2615'), ('Cookie', b'a=\xc3\xa9')], 'when': datetime(2020, 1, 2), 'n': [1, 2.5, None]}
+        texts = {}
+        for backend in ('orjson', 'ujson', 'json'):
+            if backend != 'json' and getattr(app, backend) is None:
+                continue
+            ## Leave out the other encoders
+            with mock.patch.multiple(app,
+                orjson=app.orjson if backend == 'orjson' else None,
+                ujson=app.ujson if backend == 'ujson' else None,
+                ):
+                texts[backend] = app.json_compact(value)
+        assert 'json' in texts
+        assert set(texts.values()) == {'{"headers":[["X-Name","caf\u00e9 \u2615"],["Cookie","a=\u00e9"]],"when":"2020-01-02T00:00:00","n":[1,2.5,null]}'}
+
+
 ## https://www.tornadoweb.org/en/stable/testing.html
 class TestRepeaterHandler_WithDebugParameter(AsyncHTTPTestCase):
     def get_app(self):
@@ -186,6 +1085,58 @@ class TestRepeaterHandler_WithDebugParameter(AsyncHTTPTestCase):
         assert response.body.decode().find(f"> GET /test/with.ext?debug HTTP/1.1") != -1
 
 
+    def test_HTTP_method_GET_with_debug_and_json(self):
+        response = self.fetch('/test/with.json?debug',
+            method='GET',
+            headers={'Cookie': 'a=b'},
+            )
+        assert response.code == 200
+        request = json.loads(response.body)['request']
+        assert list(request) == sorted(request)
+        assert 'body' not in request and request['body_length'] == 0
+        assert request['cookies'][0][0] == 'a'
+        assert ['Cookie', 'a=b'] in request['headers']
+        assert request['uri'] == '/test/with.json?debug'
+
+
+    def test_HTTP_method_GET_with_json_does_not_generate_content(self):
+        cache = self._app.settings['content_cache']
+        response = self.fetch('/test/with.json?content=1M&seed=1',
+            method='GET',
+            headers={'Accept-Encoding': 'gzip'},
+            )
+        assert response.code == 200
+        assert response.headers.get('X-Content-Cache') is None
+        assert json.loads(response.body)['request']['uri'] == '/test/with.json?content=1M&seed=1'
+        assert (cache.hits, cache.misses, len(cache)) == (0, 0, 0)
+        assert self._app.settings['offload'].stats()['offloaded'] == 0
+
+
+    def test_request_snapshot_shared_by_renderers(self):
+        class Request:
+            method, uri, version, body = 'POST', '/test', 'HTTP/1.1', b'x=1'
+            arguments = body_arguments = files = query_arguments = {}
+            cookies, host, host_name, path, protocol, query, remote_ip = {}, 'h', 'h', '/test', 'http', '', None
+            calls = 0
+            class headers:
+                def get_all():
+                    return [('Zed', '1'), ('Host', 'h'), ('Abc', '2')]
+            def full_url(self):
+                Request.calls += 1
+                return 'http://h/test'
+            def request_time(self):
+                Request.calls += 1
+                return 0.5
+        snapshot = RequestSnapshot(Request())
+        lines = request_debug_text(snapshot)
+        request = request_json(snapshot)
+        assert Request.calls == 2
+        assert len(lines) == len(RequestSnapshot.FIELDS)
+        assert "# DEBUG: request.headers <class 'list'>: [('Zed', '1'), ('Host', 'h'), ('Abc', '2')]" in lines
+        assert request['body_length'] == 3 and request['request_time'] == 0.5
+        assert request_text(snapshot) == ['> POST /test HTTP/1.1', '> Host: h', '> Abc: 2', '> Zed: 1', '>', "* POST DATA b'x=1'\n"]
+
+
 ## https://www.tornadoweb.org/en/stable/testing.html
 class TestRepeaterHandler_WithDelayParameter(AsyncHTTPTestCase):
     def get_app(self):
@@ -207,6 +1158,135 @@ class TestRepeaterHandler_WithDelayParameter(AsyncHTTPTestCase):
         assert delay_delta.total_seconds() >= 1.25
 
 
+## https://www.tornadoweb.org/en/stable/testing.html
+class TestRepeaterHandler_WithDelayDistribution(AsyncHTTPTestCase):
+    def get_app(self):
+        self.histograms = tempfile.TemporaryDirectory()
+        Path(self.histograms.name, 'origin.txt').write_text('# seconds weight\n0.01 90\n0.05 9\n0.1 1\n')
+        return make_app(debug=True, autoreload=False, delay_seed=7, delay_histograms=self.histograms.name)
+
+
+    def tearDown(self):
+        super().tearDown()
+        self.histograms.cleanup()
+
+
+    def delays(self, query, count=3):
+        return [
+            self.fetch(f'/test/with.ext?{query}', method='GET').headers.get('X-Delay')
+            for _ in range(count)
+        ]
+
+
+    def test_HTTP_method_GET_with_delay_distribution_seeded_by_server(self):
+        query = 'delay=dist:lognormal,mu=-5,sigma=1'
+        rng = delay_random(7)
+        distribution = DelayDistribution.parse(query.split('=', 1)[1])
+        expected = [f'{round(distribution.sample(rng), 6)} set by query string' for _ in range(3)]
+        assert self.delays(query) == expected
+
+
+    def test_HTTP_method_GET_with_delay_distribution_seeded_by_request(self):
+        delays = self.delays('delay=dist:uniform,low=0.01,high=0.02,seed=1')
+        assert len(set(delays)) == 1
+        assert 0.01 <= float(delays[0].split()[0]) <= 0.02
+
+
+    def test_HTTP_method_GET_with_delay_distribution_max(self):
+        delays = self.delays('delay=dist:pareto,alpha=1,scale=0.5,max=0.02')
+        assert all(delay == '0.02 set by query string' for delay in delays)
+
+
+    def test_HTTP_method_GET_with_delay_distribution_empirical(self):
+        delays = self.delays('delay=dist:empirical,file=origin.txt', count=5)
+        assert set(float(delay.split()[0]) for delay in delays) <= {0.01, 0.05, 0.1}
+
+
+    def test_HTTP_method_GET_with_invalid_delay_distribution(self):
+        for value in ('dist:bogus', 'dist:exponential,mean=0', 'dist:uniform,size=1',
+                      'dist:uniform,low=1,high=0', 'dist:uniform,max=nan', 'dist:uniform,max=inf',
+                      'dist:uniform,max=-1', 'dist:normal,mu=inf', 'dist:uniform,low=nan',
+                      'dist:empirical', 'dist:empirical,file=../origin.txt',
+                      'dist:empirical,file=missing.txt'):
+            response = self.fetch(f'/test/with.ext?delay={value}',
+                method='GET',
+                )
+            assert response.code == 400
+
+
+    def test_HTTP_method_GET_with_overflowing_delay_distribution(self):
+        for value in ('dist:lognormal,mu=1000', 'dist:pareto,alpha=1e-300'):
+            response = self.fetch(f'/test/with.ext?delay={value}',
+                method='GET',
+                )
+            assert response.code == 400
+        response = self.fetch('/test/with.ext?delay=dist:lognormal,mu=1000,max=0.01',
+            method='GET',
+            )
+        assert response.code == 200
+        assert response.headers.get('X-Delay') == '0.01 set by query string'
+        ## Samples taken per request are checked too
+        params = (('mu', 1000.0), ('sigma', 1.0))
+        with pytest.raises(ValueError):
+            DelayDistribution('lognormal', params).sample(random.Random(1))
+        assert DelayDistribution('lognormal', params, max=2.0).sample(random.Random(1)) == 2.0
+
+
+## https://www.tornadoweb.org/en/stable/testing.html
+class TestRepeaterHandler_WithFirstByteAndBodyDelays(AsyncHTTPTestCase):
+    def get_app(self):
+        return make_app(debug=True, autoreload=False)
+
+
+    async def timed_request(self, path, *sizes):
+        """Return the response head and the seconds until it and each of
+        `sizes' body bytes arrived for a raw HTTP/1.1 GET request of `path'"""
+        stream = await TCPClient().connect('127.0.0.1', self.get_http_port())
+        start = time.monotonic()
+        await stream.write(f'GET {path} HTTP/1.1\r\nHost: test\r\n\r\n'.encode())
+        head = await stream.read_until(b'\r\n\r\n')
+        times = [time.monotonic() - start]
+        for size in sizes:
+            await stream.read_bytes(size)
+            times.append(time.monotonic() - start)
+        stream.close()
+        return head, times
+
+
+    @gen_test
+    async def test_HTTP_method_GET_with_ttfb(self):
+        head, times = await self.timed_request('/test?content=100&ttfb=0.2', 100)
+        assert b'X-Ttfb: 0.2 set by query string' in head
+        assert times[0] >= 0.2
+
+
+    @gen_test
+    async def test_HTTP_method_GET_with_body_delay(self):
+        head, times = await self.timed_request('/test?content=100&body_delay=0.3', 100)
+        assert b'X-Body-Delay: 0.3 set by query string' in head
+        assert b'Content-Length: 100' in head
+        assert times[0] < 0.25
+        assert times[1] - times[0] >= 0.25
+
+
+    @gen_test
+    async def test_HTTP_method_GET_with_stall_at(self):
+        head, times = await self.timed_request('/test?content=1000&stream&stall_at=500:0.3', 500, 500)
+        assert b'X-Stall-At: 500:0.3 set by query string' in head
+        assert times[1] < 0.25
+        assert times[2] - times[1] >= 0.25
+
+
+    def test_HTTP_method_GET_with_invalid_stall_at(self):
+        for query in ('stall_at=500', 'stall_at=a:1', 'ttfb=-1', 'body_delay=x',
+                      'ttfb=inf', 'ttfb=nan', 'body_delay=inf', 'stall_at=10:nan', 'stall_at=10:inf',
+                      'chunk_interval=inf', 'chunk_interval=nan', 'delay=inf', 'delay=nan'):
+            response = self.fetch(f'/test?{query}',
+                method='GET',
+                )
+            assert response.code == 400
+
+
 ## https://www.tornadoweb.org/en/stable/testing.html
 class TestRepeaterHandler_WithHeaderParameter(AsyncHTTPTestCase):
     def get_app(self):
@@ -304,6 +1384,48 @@ class TestRepeaterHandler_WithSetParameter(AsyncHTTPTestCase):
         assert response.headers.get('X-Status-Code') is None
 
 
+## https://www.tornadoweb.org/en/stable/testing.html
+class TestRepeaterHandler_WithInvalidParameter(AsyncHTTPTestCase):
+    def get_app(self):
+        return make_app(debug=True, autoreload=False)
+
+
+    def test_HTTP_method_GET_with_invalid_status(self):
+        response = self.fetch('/test/with.ext?status=teapot',
+            method='GET',
+            )
+        assert response.code == 400
+        assert response.body.decode() == "Invalid `status' option value: 'teapot'\n"
+
+
+    def test_HTTP_method_GET_with_invalid_set_delay(self):
+        response = self.fetch('/test/with.ext?set=delay:soon,host:test',
+            method='GET',
+            )
+        assert response.code == 400
+        assert response.body.decode() == "Invalid `delay' option value: 'soon'\n"
+
+
+    def test_HTTP_method_GET_with_repeated_query(self):
+        parse_options = self._app.settings['parse_options']
+        for _ in range(3):
+            response = self.fetch('/test/with.ext?status=204&header=x-test:cached',
+                method='GET',
+                )
+            assert response.code == 204
+            assert response.headers.get('X-Test') == 'cached'
+        assert parse_options.cache_info().misses == 1
+        assert parse_options.cache_info().hits == 2
+
+
+    def test_HTTP_method_GET_with_set_missing_match(self):
+        response = self.fetch('/test/with.ext?set=delay:1',
+            method='GET',
+            )
+        assert response.code == 200
+        assert response.body.decode().startswith('# DEBUG RepeaterHandler.set_condition - missing arguments')
+
+
 ## https://www.tornadoweb.org/en/stable/testing.html
 class TestRepeaterHandler_WithStatusParameter(AsyncHTTPTestCase):
     def get_app(self):